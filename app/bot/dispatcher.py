@@ -1,13 +1,38 @@
 """Bot dispatcher setup."""
+import asyncio
 import logging
+import sys
+import time
+from contextlib import AsyncExitStack
+from typing import Optional
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.base import BaseSession
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
+from sqlalchemy import text
 
+from app.bot.outbound import close_outbound_scheduler, get_outbound_scheduler
 from app.core.settings import Settings
+from app.core.shutdown import Shutdown, drain_tasks
+from app.db.base import dispose_engine, get_engine
+from app.db.session import get_db_session
 from app.handlers import greetings, karma, moderation, start_help
-from app.bot.middlewares import ChatFilterMiddleware
+from app.services.greeting_service import close_greeting_service, get_greeting_service
+from app.services.karma_buffer import close_karma_buffer
+from app.services.karma_digest import close_karma_digest
+from app.services.member_cache import init_member_cache
+from app.services.karma_service import KarmaService
+from app.services.user_directory import close_user_directory
+from app.bot.middlewares import (
+    DbSessionMiddleware,
+    InFlightUpdatesMiddleware,
+    MemberCacheMiddleware,
+    UpdateFilterMiddleware,
+    UserDirectoryMiddleware,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -15,10 +40,26 @@ logger = logging.getLogger(__name__)
 def setup_dispatcher(bot: Bot, settings: Settings) -> Dispatcher:
     """Setup and configure dispatcher."""
     dp = Dispatcher()
+    init_member_cache(settings)
 
     # Register middlewares
-    dp.message.middleware(ChatFilterMiddleware(settings))
-    dp.callback_query.middleware(ChatFilterMiddleware(settings))
+    # Outermost, so an update is tracked from the start of its task until shutdown drains it
+    in_flight = InFlightUpdatesMiddleware()
+    dp.update.outer_middleware(in_flight)
+    dp["in_flight_updates"] = in_flight
+    if settings.RECORD_UPDATES:
+        from app.bot.recorder import get_update_recorder
+
+        # Recorded as received, before any filtering
+        dp.update.outer_middleware(get_update_recorder(settings))
+    # Updates from other chats are dropped before anything else runs
+    update_filter = UpdateFilterMiddleware(settings)
+    dp.update.outer_middleware(update_filter)
+    dp["update_filter"] = update_filter
+    dp.chat_member.outer_middleware(MemberCacheMiddleware())
+    dp.my_chat_member.outer_middleware(MemberCacheMiddleware())
+    dp.message.middleware(UserDirectoryMiddleware(settings))
+    dp.update.middleware(DbSessionMiddleware(settings))
 
     # Register routers (order matters - commands first, then general handlers)
     dp.include_router(start_help.router)
@@ -26,14 +67,136 @@ def setup_dispatcher(bot: Bot, settings: Settings) -> Dispatcher:
     dp.include_router(greetings.get_greeting_router(settings))
     dp.include_router(karma.get_karma_router(settings))  # General message handler last
 
+    if settings.METRICS_ENABLED:
+        from app.bot.metrics import setup_metrics
+
+        setup_metrics(dp, bot, settings)
+
     logger.info("Dispatcher configured")
     return dp
 
 
-def create_bot(settings: Settings) -> Bot:
-    """Create bot instance."""
-    return Bot(
+async def warm_up(settings: Settings) -> None:
+    """
+    Fill caches and open database connections ahead of the first updates.
+
+    Runs in the background once updates are being received; until it is
+    done, caches are filled on demand as before.
+    """
+    started = time.perf_counter()
+    try:
+        # Open the pool's connections now rather than on the first busy burst
+        engine = get_engine(settings)
+        async with AsyncExitStack() as stack:
+            connections = await asyncio.gather(
+                *(stack.enter_async_context(engine.connect()) for _ in range(settings.DB_POOL_SIZE))
+            )
+            for connection in connections:
+                await connection.execute(text("SELECT 1"))
+
+        await get_greeting_service(settings).ensure_loaded()
+
+        # /top boards of the allowed chats (unbounded otherwise, so left to load on demand)
+        allowed_chat_ids = settings.get_allowed_chat_ids()
+        if allowed_chat_ids:
+            karma_service = KarmaService(settings)
+            async with get_db_session(settings) as session:
+                for chat_id in list(allowed_chat_ids)[: settings.LEADERBOARD_MAX_CHATS]:
+                    await karma_service.get_top_karma(session, chat_id)
+    except Exception as e:
+        logger.error("Warm-up failed: %s", e, exc_info=True)
+        return
+    logger.info("Warm-up finished in %.2fs", time.perf_counter() - started)
+
+
+async def run_polling(bot: Bot, dp: Dispatcher, shutdown: Shutdown) -> None:
+    """Long-poll Telegram until shutdown is requested, then let in-flight updates finish."""
+    polling = asyncio.create_task(
+        dp.start_polling(
+            bot,
+            allowed_updates=get_allowed_updates(dp),
+            # Signals are handled by the caller, and the session is still needed for replies
+            handle_signals=False,
+            close_bot_session=False,
+        )
+    )
+    await shutdown.wait(polling)
+    if not polling.done():
+        try:
+            await dp.stop_polling()
+        except RuntimeError:
+            # Polling had not started yet
+            polling.cancel()
+    try:
+        await polling
+    except asyncio.CancelledError:
+        if not shutdown.requested:
+            raise
+    shutdown.mark("intake")
+    await drain_tasks(dp["in_flight_updates"].tasks, shutdown.remaining(), "updates")
+    shutdown.mark("updates")
+
+
+async def close_services(shutdown: Optional[Shutdown] = None) -> None:
+    """
+    Finish recording, send queued messages, stop background jobs, flush buffered writes and close the database pool.
+
+    Queued messages are sent within what is left of the shutdown budget
+    (10 seconds without one); each phase is timed and the timings are logged.
+    """
+    if shutdown is None:
+        shutdown = Shutdown(10.0)
+    # Starts the clock when shutdown was not requested by a signal (errors, benchmarks)
+    shutdown.request()
+    # Optional features are imported only when enabled, so only loaded ones need closing
+    if "app.bot.recorder" in sys.modules:
+        from app.bot.recorder import close_update_recorder
+
+        await close_update_recorder()
+        shutdown.mark("recorder")
+    try:
+        await close_karma_digest()
+    except Exception as e:
+        logger.error("Error sending karma digests: %s", e, exc_info=True)
+    try:
+        await close_outbound_scheduler(shutdown.remaining())
+    except Exception as e:
+        logger.error("Error sending queued messages: %s", e, exc_info=True)
+    shutdown.mark("outbound")
+    await close_greeting_service()
+    try:
+        await close_karma_buffer()
+    except Exception as e:
+        logger.error("Error flushing karma buffer: %s", e, exc_info=True)
+    try:
+        await close_user_directory()
+    except Exception as e:
+        logger.error("Error flushing user directory: %s", e, exc_info=True)
+    shutdown.mark("buffers")
+    await dispose_engine()
+    shutdown.mark("database")
+    if "app.bot.metrics" in sys.modules:
+        from app.bot.metrics import stop_metrics
+
+        await stop_metrics()
+    logger.info("Shutdown took %.2fs (%s)", shutdown.elapsed(), shutdown.report())
+
+
+def get_allowed_updates(dp: Dispatcher) -> list[str]:
+    """Get update types to subscribe to: handled ones plus member updates used for cache invalidation."""
+    return sorted(set(dp.resolve_used_update_types()) | {"chat_member", "my_chat_member"})
+
+
+def create_bot(settings: Settings, session: Optional[BaseSession] = None) -> Bot:
+    """Create bot instance (an aiohttp session is created unless one is given)."""
+    if session is None and settings.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL))
+    bot = Bot(
         token=settings.BOT_TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
+    if settings.OUTBOUND_ENABLED:
+        bot.session.middleware(get_outbound_scheduler(settings))
+    return bot
 
@@ -0,0 +1,221 @@
+"""Bot instrumentation: handler, update, database and Bot API metrics."""
+import logging
+import time
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.types import TelegramObject, Update
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.metrics import REGISTRY, Counter, Gauge, LoopLagMonitor, Metric, counter, gauge, histogram, start_metrics_server
+from app.core.settings import Settings
+from app.db.base import get_engine
+
+if TYPE_CHECKING:
+    from app.bot.middlewares import UpdateFilterMiddleware
+
+logger = logging.getLogger(__name__)
+
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+UPDATES_IN_FLIGHT = gauge("bot_updates_in_flight", "Updates being processed")
+UPDATE_DURATION = histogram("bot_update_duration_seconds", "Time to process an update", ["type"])
+HANDLER_DURATION = histogram(
+    "bot_handler_duration_seconds", "Handler latency", ["handler", "event", "status"]
+)
+DB_QUERIES = counter("bot_db_queries", "SQL statements executed")
+DB_COMMITS = counter("bot_db_commits", "Database transactions committed")
+DB_QUERIES_PER_UPDATE = histogram(
+    "bot_db_queries_per_update", "SQL statements executed per update", buckets=COUNT_BUCKETS
+)
+DB_COMMITS_PER_UPDATE = histogram(
+    "bot_db_commits_per_update", "Transactions committed per update", buckets=COUNT_BUCKETS
+)
+API_DURATION = histogram("bot_api_request_duration_seconds", "Bot API request latency", ["method"])
+API_ERRORS = counter("bot_api_errors", "Failed Bot API requests", ["method", "error"])
+LOOP_LAG = gauge("bot_event_loop_lag_seconds", "Last measured event loop lag")
+LOOP_LAG_HISTOGRAM = histogram("bot_event_loop_lag_distribution_seconds", "Event loop lag")
+
+# [queries, commits] of the update being processed
+_update_db_calls: ContextVar[Optional[list[int]]] = ContextVar("update_db_calls", default=None)
+
+_runner: Optional[web.AppRunner] = None
+_lag_monitor: Optional[LoopLagMonitor] = None
+# Chat filter of the most recently set up dispatcher (None until setup_metrics)
+_update_filter: Optional["UpdateFilterMiddleware"] = None
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer update middleware tracking in-flight updates, duration and DB calls per update."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        """Measure one update."""
+        calls = [0, 0]
+        token = _update_db_calls.set(calls)
+        update_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        UPDATES_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_DURATION.observe(time.perf_counter() - started, type=update_type)
+            UPDATES_IN_FLIGHT.dec()
+            DB_QUERIES_PER_UPDATE.observe(calls[0])
+            DB_COMMITS_PER_UPDATE.observe(calls[1])
+            _update_db_calls.reset(token)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware recording the latency of the handler that matched an event."""
+
+    def __init__(self, event_name: str) -> None:
+        """Initialize middleware for an event type."""
+        self.event_name = event_name
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        """Time the handler."""
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await handler(event, data)
+            status = "ok"
+            return result
+        finally:
+            HANDLER_DURATION.observe(
+                time.perf_counter() - started, handler=name, event=self.event_name, status=status
+            )
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Bot session middleware recording latency and errors per API method."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[Any],
+        bot: Bot,
+        method: TelegramMethod[Any],
+    ) -> Response[Any]:
+        """Time the request."""
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            API_DURATION.observe(time.perf_counter() - started, method=name)
+
+
+def _count_query(*args: Any) -> None:
+    """Count a statement."""
+    DB_QUERIES.inc()
+    calls = _update_db_calls.get()
+    if calls is not None:
+        calls[0] += 1
+
+
+def _count_commit(*args: Any) -> None:
+    """Count a commit."""
+    DB_COMMITS.inc()
+    calls = _update_db_calls.get()
+    if calls is not None:
+        calls[1] += 1
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Count statements and commits, in total and for the current update (once per engine)."""
+    if event.contains(engine.sync_engine, "before_cursor_execute", _count_query):
+        return
+    event.listen(engine.sync_engine, "before_cursor_execute", _count_query)
+    event.listen(engine.sync_engine, "commit", _count_commit)
+
+
+def _collect_services() -> list[Metric]:
+    """Export counters kept by the services themselves."""
+    from app.bot.outbound import current_outbound_scheduler
+    from app.services.member_cache import get_member_cache
+
+    metrics: list[Metric] = []
+
+    cache = get_member_cache().stats()
+    lookups = Counter("bot_member_cache_lookups", "Chat member lookups", ["result"])
+    for result in ("hits", "misses", "collapsed"):
+        lookups.inc(cache[result], result=result)
+    size = Gauge("bot_member_cache_size", "Chat members cached")
+    size.set(cache["size"])
+    metrics += [lookups, size]
+
+    if _update_filter is not None:
+        filtered = Counter("bot_updates_filtered", "Updates passed or dropped by the chat filter", ["result"])
+        stats = _update_filter.stats()
+        filtered.inc(stats["passed"], result="passed")
+        for reason, count in stats["dropped"].items():
+            filtered.inc(count, result=reason)
+        metrics.append(filtered)
+
+    scheduler = current_outbound_scheduler()
+    if scheduler is not None:
+        outbound = scheduler.stats()
+        queued = Gauge("bot_outbound_queued", "Messages waiting for a send slot", ["priority"])
+        for priority, count in outbound["queued_by_priority"].items():
+            queued.set(count, priority=priority)
+        results = Counter("bot_outbound_messages", "Outbound requests by outcome", ["result"])
+        for result in ("sent", "retried", "failed"):
+            results.inc(outbound[result], result=result)
+        wait = Gauge("bot_outbound_wait_seconds", "Recent time spent waiting for a send slot", ["quantile"])
+        wait.set(outbound["wait_p50"], quantile="0.5")
+        wait.set(outbound["wait_p99"], quantile="0.99")
+        metrics += [queued, results, wait]
+
+    return metrics
+
+
+def setup_metrics(dp: Dispatcher, bot: Bot, settings: Settings) -> None:
+    """Hook metrics into the dispatcher, the bot session and the database engine."""
+    global _update_filter
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(HandlerMetricsMiddleware(name))
+    bot.session.middleware(ApiMetricsMiddleware())
+    instrument_engine(get_engine(settings))
+    if _update_filter is None:
+        REGISTRY.add_collector(_collect_services)
+    _update_filter = dp["update_filter"]
+
+
+async def start_metrics(settings: Settings, port: Optional[int] = None) -> None:
+    """Start the /metrics endpoint and the event loop lag monitor."""
+    global _runner, _lag_monitor
+    _lag_monitor = LoopLagMonitor(settings.METRICS_LOOP_LAG_INTERVAL_SECONDS, LOOP_LAG, LOOP_LAG_HISTOGRAM)
+    _lag_monitor.start()
+    _runner = await start_metrics_server(settings.METRICS_HOST, port or settings.METRICS_PORT)
+
+
+async def stop_metrics() -> None:
+    """Stop the endpoint and the lag monitor if they were started."""
+    global _runner, _lag_monitor
+    if _lag_monitor is not None:
+        await _lag_monitor.stop()
+        _lag_monitor = None
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
@@ -1,21 +1,88 @@
 """Bot middlewares."""
-from typing import Any, Awaitable, Callable
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Optional
 
 from aiogram import BaseMiddleware
-from aiogram.types import CallbackQuery, Message, TelegramObject
+from aiogram.types import CallbackQuery, ChatMemberUpdated, Message, TelegramObject, Update
 
+from app.bot.outbound import Priority, outbound_priority
 from app.core.settings import Settings
+from app.core.startup import StartupTimer
+from app.db.session import get_session_maker, has_writes
+from app.services.member_cache import get_member_cache
+from app.services.user_directory import get_user_directory
 
-logger = __import__("logging").getLogger(__name__)
+logger = logging.getLogger(__name__)
 
 
-class ChatFilterMiddleware(BaseMiddleware):
-    """Middleware to filter messages by allowed chat IDs."""
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Middleware to provide one database session per update.
+
+    The session is injected as ``session``. It only checks out a connection
+    on its first query, and it is committed once after the handler, only if
+    something was written. Services flush but never commit.
+
+    The one exception is handlers that call the Bot API after writing
+    (karma from thanks, ``/warn``, ``/unwarn`` and ``/rebuildwarns``): they
+    commit before the call, so the database write lock is not held during
+    the network round trip. The commit resets the session's write tracking,
+    so the middleware does not commit again and an update still makes at
+    most one commit.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        """Initialize middleware with settings."""
+        self.session_maker = get_session_maker(settings)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        """Run handler in a session and commit its writes."""
+        async with self.session_maker() as session:
+            data["session"] = session
+            try:
+                result = await handler(event, data)
+                if has_writes(session):
+                    await session.commit()
+                return result
+            except Exception:
+                await session.rollback()
+                raise
+
+
+class UpdateFilterMiddleware(BaseMiddleware):
+    """
+    Outer update middleware that drops updates from chats that are not allowed.
+
+    It runs before routing, for every update type, so dropped updates never
+    reach filters, handlers or the database session. The allow-list is a
+    frozenset and can be replaced at runtime with ``reload``. Dropped updates
+    are counted per reason.
+    """
 
     def __init__(self, settings: Settings) -> None:
         """Initialize middleware with settings."""
-        self.settings = settings
         self.allowed_chat_ids = settings.get_allowed_chat_ids()
+        self.passed = 0
+        self.dropped: Counter[str] = Counter()
+
+    def reload(self, settings: Optional[Settings] = None) -> None:
+        """Re-read the allow-list (from the environment and .env unless settings are given)."""
+        if settings is None:
+            settings = Settings()
+        self.allowed_chat_ids = settings.get_allowed_chat_ids()
+        allowed = "all" if self.allowed_chat_ids is None else len(self.allowed_chat_ids)
+        logger.info("Chat allow-list reloaded: %s chats allowed", allowed)
+
+    def stats(self) -> dict[str, Any]:
+        """Get counts of passed and dropped updates."""
+        return {"passed": self.passed, "dropped": dict(self.dropped)}
 
     async def __call__(
         self,
@@ -23,26 +90,135 @@ class ChatFilterMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: dict[str, Any],
     ) -> Any:
-        """Filter events by chat ID."""
-        # Get chat ID from event
-        chat_id = None
-        if isinstance(event, (Message, CallbackQuery)):
-            if isinstance(event, Message):
-                chat = event.chat
-            else:
-                chat = event.message.chat if event.message else None
-
-            if chat:
-                chat_id = chat.id
-
-        # If no chat ID restrictions, allow all
-        if self.allowed_chat_ids is None:
-            return await handler(event, data)
+        """Pass the update on only if it comes from an allowed chat."""
+        allowed_chat_ids = self.allowed_chat_ids
+        if allowed_chat_ids is not None and isinstance(event, Update):
+            chat_id = get_update_chat_id(event)
+            if chat_id is None:
+                self.dropped["no_chat"] += 1
+                return None
+            if chat_id not in allowed_chat_ids:
+                self.dropped["chat_not_allowed"] += 1
+                logger.debug("Update %s from chat %s dropped", event.update_id, chat_id)
+                return None
+
+        self.passed += 1
+        return await handler(event, data)
+
+
+def get_update_chat_id(update: Update) -> Optional[int]:
+    """Get the id of the chat an update belongs to, if any."""
+    event = update.event
+    chat = getattr(event, "chat", None)
+    if chat is None and isinstance(event, CallbackQuery) and event.message is not None:
+        chat = event.message.chat
+    return chat.id if chat is not None else None
+
+
+class UserDirectoryMiddleware(BaseMiddleware):
+    """Middleware to record profiles of message senders in the user directory."""
 
-        # If chat ID is not in allowed list, skip handler
-        if chat_id is None or chat_id not in self.allowed_chat_ids:
-            logger.debug(f"Event from chat {chat_id} filtered out")
-            return None
+    def __init__(self, settings: Settings) -> None:
+        """Initialize middleware with settings."""
+        self.user_directory = get_user_directory(settings)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        """Observe sender and replied-to user profiles."""
+        if isinstance(event, Message):
+            if event.from_user:
+                self.user_directory.observe(event.from_user)
+            if event.reply_to_message and event.reply_to_message.from_user:
+                self.user_directory.observe(event.reply_to_message.from_user)
 
         return await handler(event, data)
 
+
+class MemberCacheMiddleware(BaseMiddleware):
+    """Middleware to invalidate cached chat members on membership updates."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        """Drop the cached status of the member whose status changed."""
+        if isinstance(event, ChatMemberUpdated):
+            get_member_cache().invalidate(event.chat.id, event.new_chat_member.user.id)
+
+        return await handler(event, data)
+
+
+class OutboundPriorityMiddleware(BaseMiddleware):
+    """Middleware to set the outbound priority of messages sent by a router's handlers."""
+
+    def __init__(self, priority: Priority) -> None:
+        """Initialize middleware with priority."""
+        self.priority = priority
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        """Run handler with the priority set."""
+        token = outbound_priority.set(self.priority)
+        try:
+            return await handler(event, data)
+        finally:
+            outbound_priority.reset(token)
+
+
+class InFlightUpdatesMiddleware(BaseMiddleware):
+    """Outer update middleware keeping track of the tasks processing updates, so shutdown can wait for them."""
+
+    def __init__(self) -> None:
+        """Initialize middleware."""
+        self.tasks: set[asyncio.Task] = set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        """Run handler while its task is tracked."""
+        task = asyncio.current_task()
+        if task is None:
+            return await handler(event, data)
+        self.tasks.add(task)
+        try:
+            return await handler(event, data)
+        finally:
+            self.tasks.discard(task)
+
+
+class FirstUpdateMiddleware(BaseMiddleware):
+    """Outer update middleware reporting startup time once the first update has been processed."""
+
+    def __init__(self, startup: StartupTimer) -> None:
+        """Initialize middleware with the startup timer."""
+        self.startup = startup
+        self.done = False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        """Run handler and report the first one to finish."""
+        if self.done:
+            return await handler(event, data)
+        try:
+            return await handler(event, data)
+        finally:
+            if not self.done:
+                self.done = True
+                self.startup.first_update()
@@ -0,0 +1,402 @@
+"""Outbound request scheduler with Telegram rate limits."""
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetUpdates, Response, TelegramMethod
+
+from app.core.settings import Settings
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+logger = logging.getLogger(__name__)
+
+# Methods that post a message to a chat and count against its rate limit
+SHAPED_PREFIXES = ("send", "copy", "forward")
+# Methods with those prefixes that post nothing and must not use up a chat's budget
+UNSHAPED_METHODS = frozenset({"sendChatAction"})
+
+# Latency samples kept for percentiles
+LATENCY_SAMPLES = 1000
+
+
+class Priority(IntEnum):
+    """Outbound priority, lower values are sent first."""
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+# Priority of requests made by the current handler (set by OutboundPriorityMiddleware)
+outbound_priority: ContextVar[Priority] = ContextVar("outbound_priority", default=Priority.NORMAL)
+
+# Set in background sends whose first send slot the scheduler has already granted
+_slot_granted: ContextVar[bool] = ContextVar("outbound_slot_granted", default=False)
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """Initialize a full bucket."""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        """Add tokens for the time passed since the last refill."""
+        if now <= self.updated:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        """Consume a token."""
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until: float) -> None:
+        """Give out no tokens until ``until`` (Telegram asked us to retry later)."""
+        self.blocked_until = max(self.blocked_until, until)
+        # One token becomes available when the pause ends
+        self.tokens = 1.0
+        self.updated = max(self.updated, until)
+
+    def is_idle(self, now: float) -> bool:
+        """Check whether the bucket is full again and can be forgotten."""
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+@dataclass(order=True)
+class _Ticket:
+    """A request waiting for a send slot."""
+
+    priority: int
+    seq: int
+    chat_id: Union[int, str] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    # Request sent by the scheduler itself once granted (see ``send_later``)
+    request: Optional[tuple["Bot", TelegramMethod[Any]]] = field(default=None, compare=False)
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """
+    Bot session middleware that paces messages to Telegram's rate limits.
+
+    Requests that post a message to a chat wait for a token from that chat's
+    bucket (groups and channels: ``group_per_minute``, private chats:
+    ``private_per_second``) and from the global bucket. Waiting requests are
+    granted in priority order, then in arrival order; a request blocked by its
+    chat's limit does not hold back other chats.
+
+    When Telegram answers with ``retry_after``, the chat (or, for requests
+    without a chat, the whole bot) is paused for that long and the request is
+    retried up to ``max_retries`` times.
+
+    Handlers whose reply nobody waits for (such as karma confirmations)
+    use ``send_later``: the request is queued and the handler returns at
+    once, so it does not hold a processing slot while its chat is at the
+    limit.
+    """
+
+    def __init__(
+        self,
+        global_per_second: float,
+        group_per_minute: float,
+        group_burst: int,
+        private_per_second: float,
+        max_retries: int,
+    ) -> None:
+        """Initialize scheduler."""
+        self.group_rate = group_per_minute / 60
+        self.group_burst = group_burst
+        self.private_rate = private_per_second
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_per_second, max(1.0, global_per_second))
+        self._buckets: dict[Union[int, str], TokenBucket] = {}
+        self._queue: list[_Ticket] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._sending: set[asyncio.Task] = set()
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._waits: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._latencies: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[Any],
+        bot: "Bot",
+        method: TelegramMethod[Any],
+    ) -> Response[Any]:
+        """Send a request when its rate limits allow it, retrying on flood wait."""
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+
+        chat_id = self._get_chat_id(method)
+        priority = outbound_priority.get()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            if chat_id is not None and not (attempt == 0 and _slot_granted.get()):
+                queued = time.monotonic()
+                await self._acquire(chat_id, priority)
+                self._waits.append(time.monotonic() - queued)
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                until = time.monotonic() + e.retry_after
+                if chat_id is not None:
+                    self._get_bucket(chat_id).block(until)
+                else:
+                    self._global.block(until)
+                if attempt > self.max_retries:
+                    self.failed += 1
+                    raise
+                self.retried += 1
+                logger.warning(
+                    "Flood wait %ss on %s to chat %s, retry %d/%d",
+                    e.retry_after,
+                    method.__api_method__,
+                    chat_id,
+                    attempt,
+                    self.max_retries,
+                )
+                if chat_id is None:
+                    await asyncio.sleep(e.retry_after)
+                continue
+            self.sent += 1
+            self._latencies.append(time.monotonic() - started)
+            return response
+
+    def send_later(self, bot: "Bot", method: TelegramMethod[Any], priority: Priority = Priority.LOW) -> None:
+        """Queue a request and return at once; it is sent from the scheduler when its limits allow."""
+        chat_id = self._get_chat_id(method)
+        if chat_id is None:
+            self._start_send(bot, method, priority)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(_Ticket(priority, next(self._seq), chat_id, future, (bot, method)))
+
+    @property
+    def pending(self) -> int:
+        """Number of requests waiting for a send slot or being sent in the background."""
+        return len(self._queue) + len(self._sending)
+
+    def stats(self) -> dict[str, Any]:
+        """Get queue depth, counters and latency percentiles (seconds)."""
+        queued = {priority.name.lower(): 0 for priority in Priority}
+        for ticket in self._queue:
+            queued[Priority(ticket.priority).name.lower()] += 1
+        return {
+            "queued": len(self._queue),
+            "queued_by_priority": queued,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "chats_tracked": len(self._buckets),
+            "wait_p50": _percentile(self._waits, 0.5),
+            "wait_p99": _percentile(self._waits, 0.99),
+            "latency_p50": _percentile(self._latencies, 0.5),
+            "latency_p99": _percentile(self._latencies, 0.99),
+        }
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait until queued requests are sent. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self._queue or self._sending:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def close(self) -> None:
+        """Stop the scheduling task and background sends."""
+        for task in list(self._sending):
+            task.cancel()
+        if self._sending:
+            await asyncio.wait(self._sending)
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        self._wakeup = None
+
+    @staticmethod
+    def _get_chat_id(method: TelegramMethod[Any]) -> Optional[Union[int, str]]:
+        """Get the target chat of a message-posting request."""
+        name = method.__api_method__
+        if not name.startswith(SHAPED_PREFIXES) or name in UNSHAPED_METHODS:
+            return None
+        return getattr(method, "chat_id", None)
+
+    def _get_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        """Get or create the bucket of a chat."""
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.private_rate, 1)
+            else:
+                # Groups, supergroups and channels (negative ids or @username)
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id: Union[int, str], priority: int) -> None:
+        """Wait for a send slot in the chat."""
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(_Ticket(priority, next(self._seq), chat_id, future))
+        await future
+
+    def _enqueue(self, ticket: _Ticket) -> None:
+        """Add a ticket to the queue and wake up the scheduling task."""
+        self._queue.append(ticket)
+        self._queue.sort()
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run(), name="outbound-scheduler")
+
+    def _start_send(self, bot: "Bot", method: TelegramMethod[Any], priority: int) -> None:
+        """Send a queued request in a task owned by the scheduler."""
+        task = asyncio.create_task(self._send(bot, method, priority), name="outbound-send")
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    @staticmethod
+    async def _send(bot: "Bot", method: TelegramMethod[Any], priority: int) -> None:
+        """Send a request whose send slot was already granted."""
+        # The task runs in its own context, so these only apply to this request
+        _slot_granted.set(True)
+        outbound_priority.set(Priority(priority))
+        try:
+            await bot(method)
+        except Exception as e:
+            logger.error("Error sending %s: %s", method.__api_method__, e, exc_info=True)
+
+    async def _run(self) -> None:
+        """Grant send slots as buckets allow."""
+        assert self._wakeup is not None
+        while True:
+            self._wakeup.clear()
+            delay = self._grant()
+            if not self._queue:
+                self._prune_buckets()
+                delay = None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _grant(self) -> Optional[float]:
+        """Grant every ticket that can go now. Returns seconds until the next one can."""
+        now = time.monotonic()
+        delay: Optional[float] = None
+        blocked: set[Union[int, str]] = set()
+        remaining: list[_Ticket] = []
+        for index, ticket in enumerate(self._queue):
+            if ticket.future.done():
+                # The caller was cancelled
+                continue
+            if ticket.chat_id in blocked:
+                remaining.append(ticket)
+                continue
+            global_wait = self._global.wait_time(now)
+            if global_wait > 0:
+                remaining.extend(t for t in self._queue[index:] if not t.future.done())
+                delay = global_wait if delay is None else min(delay, global_wait)
+                break
+            bucket = self._get_bucket(ticket.chat_id)
+            wait = bucket.wait_time(now)
+            if wait > 0:
+                # Later tickets of this chat keep their place behind this one
+                blocked.add(ticket.chat_id)
+                remaining.append(ticket)
+                delay = wait if delay is None else min(delay, wait)
+                continue
+            bucket.take(now)
+            self._global.take(now)
+            ticket.future.set_result(None)
+            if ticket.request is not None:
+                self._start_send(*ticket.request, ticket.priority)
+        self._queue = remaining
+        return delay
+
+    def _prune_buckets(self) -> None:
+        """Forget buckets of chats that are quiet again."""
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self._buckets.items() if bucket.is_idle(now)]:
+            del self._buckets[chat_id]
+
+
+def _percentile(values: deque[float], share: float) -> float:
+    """Get a percentile of recent samples (0 if there are none)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+# Global outbound scheduler (will be initialized on first use)
+_outbound_scheduler: Optional[OutboundScheduler] = None
+
+
+def get_outbound_scheduler(settings: Settings) -> OutboundScheduler:
+    """
+    Get or create the outbound scheduler.
+
+    With worker processes every process has its own scheduler; chats are
+    partitioned between workers, and the global rate is split between them.
+    """
+    global _outbound_scheduler
+    if _outbound_scheduler is None:
+        _outbound_scheduler = OutboundScheduler(
+            global_per_second=settings.OUTBOUND_GLOBAL_PER_SECOND / max(1, settings.WORKER_PROCESSES),
+            group_per_minute=settings.OUTBOUND_GROUP_PER_MINUTE,
+            group_burst=settings.OUTBOUND_GROUP_BURST,
+            private_per_second=settings.OUTBOUND_PRIVATE_PER_SECOND,
+            max_retries=settings.OUTBOUND_MAX_RETRIES,
+        )
+    return _outbound_scheduler
+
+
+def current_outbound_scheduler() -> Optional[OutboundScheduler]:
+    """Get the outbound scheduler if it has been created, without creating it."""
+    return _outbound_scheduler
+
+
+async def close_outbound_scheduler(timeout: float = 10.0) -> None:
+    """Send what is still queued (up to ``timeout`` seconds) and stop the scheduler."""
+    if _outbound_scheduler is not None:
+        if not await _outbound_scheduler.drain(timeout):
+            logger.warning("%s outbound messages were not sent", _outbound_scheduler.pending)
+        await _outbound_scheduler.close()
@@ -0,0 +1,223 @@
+"""Recording of incoming updates for offline replay."""
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.core.settings import Settings
+from app.handlers.karma import KARMA_PATTERN
+
+logger = logging.getLogger(__name__)
+
+CHAT_TYPES = {"private", "group", "supergroup", "channel"}
+# Names of users and chats, derived from their pseudonyms
+NAME_FIELDS = {"first_name", "last_name", "title"}
+# Free-form strings that may identify a person wherever they appear (including
+# the fields above outside users and chats), replaced with filler
+FREE_FORM_FIELDS = NAME_FIELDS | {
+    "username",
+    "name",
+    "forward_sender_name",
+    "forward_signature",
+    "author_signature",
+    "sender_user_name",
+}
+# Strings dropped entirely (an object under the same key, such as a
+# ChatInviteLink, is scrubbed field by field instead)
+SECRET_FIELDS = {"bio", "description", "phone_number", "email", "vcard", "invite_link", "query"}
+TEXT_FIELDS = {"text", "caption"}
+# Seconds between flushes of the compressed stream to disk
+FLUSH_INTERVAL_SECONDS = 1.0
+
+
+class UpdateScrubber:
+    """
+    Removes personal data from raw updates while keeping their shape.
+
+    User and chat ids are replaced with keyed pseudonyms, so the same user
+    or chat keeps the same id within a recording (and across recordings made
+    with the same salt), private chats keep the id of their user and groups
+    keep negative ids. Names and usernames of users and chats are derived
+    from the pseudonyms; names anywhere else (contacts, forward signatures,
+    invite link names) are replaced with filler of the same length.
+    Message text is replaced with filler of the same length, except for the
+    command word of commands, numeric command arguments and the karma
+    keyword of thank-you messages, which handlers depend on.
+    """
+
+    def __init__(self, salt: bytes) -> None:
+        """Initialize scrubber."""
+        self.salt = salt
+
+    def pseudonym(self, original: int) -> int:
+        """Map an id to a stable pseudonym of the same sign."""
+        digest = hmac.new(self.salt, str(original).encode(), hashlib.sha256).digest()
+        value = int.from_bytes(digest[:6], "big") % 10**12
+        return -(10**12 + value) if original < 0 else value + 1
+
+    def scrub_text(self, text: str, entities: Optional[list]) -> tuple[str, Optional[list]]:
+        """Replace message text, keeping only what handlers look at."""
+        if text.startswith("/"):
+            command, *args = text.split()
+            kept = [arg if arg.isdigit() else "x" * len(arg) for arg in args]
+            commands = [entity for entity in entities or () if entity.get("type") == "bot_command"]
+            return " ".join([command, *kept]), commands[:1] or None
+        match = KARMA_PATTERN.search(text)
+        if match:
+            return match.group(0), None
+        return "x" * len(text), None
+
+    def scrub(self, value: Any) -> Any:
+        """Scrub a raw update or any part of it."""
+        if isinstance(value, list):
+            return [self.scrub(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+
+        result = {key: self.scrub(item) for key, item in value.items()}
+        is_user = "is_bot" in value
+        is_chat = value.get("type") in CHAT_TYPES and "id" in value
+        if (is_user or is_chat) and isinstance(value.get("id"), int):
+            pseudonym = self.pseudonym(value["id"])
+            result["id"] = pseudonym
+            label = "User" if is_user or pseudonym > 0 else "Chat"
+            for field in NAME_FIELDS & result.keys():
+                result[field] = f"{label} {abs(pseudonym)}"
+            if "username" in result:
+                result["username"] = f"{label.lower()}{abs(pseudonym)}"
+        else:
+            for field in FREE_FORM_FIELDS & result.keys():
+                if isinstance(result[field], str):
+                    result[field] = "x" * len(result[field])
+        for field in ("user_id", "migrate_to_chat_id", "migrate_from_chat_id"):
+            if isinstance(result.get(field), int):
+                result[field] = self.pseudonym(result[field])
+        for field in SECRET_FIELDS & result.keys():
+            if isinstance(result[field], str):
+                result[field] = ""
+        for field in ("latitude", "longitude"):
+            if field in result:
+                result[field] = 0.0
+        for field in TEXT_FIELDS & result.keys():
+            entities_field = "entities" if field == "text" else "caption_entities"
+            result[field], entities = self.scrub_text(result[field], result.get(entities_field))
+            if entities is None:
+                result.pop(entities_field, None)
+            else:
+                result[entities_field] = entities
+        return result
+
+
+class UpdateRecorder(BaseMiddleware):
+    """
+    Outer update middleware appending scrubbed updates to a gzip file.
+
+    The middleware only puts the update on a bounded queue; serialization,
+    scrubbing, compression and disk writes happen on a background thread.
+    Updates are dropped (and counted) when the queue is full, so a slow disk
+    never holds up update processing. Each line of the file is
+    ``{"t": <unix time received>, "update": {...}}``; appending to an existing
+    file adds a new gzip member, which gzip readers handle transparently.
+    """
+
+    def __init__(self, path: Path, salt: bytes, queue_size: int) -> None:
+        """Initialize recorder."""
+        self.path = path
+        self.scrubber = UpdateScrubber(salt)
+        self.recorded = 0
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="update-recorder", daemon=True)
+        self._thread.start()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        """Queue the update for recording and pass it on."""
+        if isinstance(event, Update):
+            try:
+                self._queue.put_nowait((time.time(), event))
+            except queue.Full:
+                self.dropped += 1
+        return await handler(event, data)
+
+    def _run(self) -> None:
+        """Write queued updates until the stop sentinel arrives."""
+        file: Optional[gzip.GzipFile] = None
+        last_flush = time.monotonic()
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=FLUSH_INTERVAL_SECONDS)
+                except queue.Empty:
+                    item = False
+                if item is None:
+                    break
+                if item:
+                    received, update = item
+                    try:
+                        raw = update.model_dump(mode="json", exclude_unset=True, by_alias=True)
+                        line = json.dumps(
+                            {"t": round(received, 3), "update": self.scrubber.scrub(raw)}, ensure_ascii=False
+                        )
+                    except Exception as e:
+                        logger.error("Error recording update %s: %s", update.update_id, e, exc_info=True)
+                        continue
+                    if file is None:
+                        self.path.parent.mkdir(parents=True, exist_ok=True)
+                        file = gzip.open(self.path, "ab")
+                        logger.info("Recording updates to %s", self.path)
+                    file.write(line.encode("utf-8") + b"\n")
+                    self.recorded += 1
+                if file is not None and time.monotonic() - last_flush >= FLUSH_INTERVAL_SECONDS:
+                    file.flush()
+                    last_flush = time.monotonic()
+        except Exception as e:
+            logger.error("Update recorder stopped: %s", e, exc_info=True)
+        finally:
+            if file is not None:
+                file.close()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Write the remaining queued updates and close the file."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self.dropped:
+            logger.warning("%s updates were not recorded because the queue was full", self.dropped)
+
+
+# Global update recorder (will be initialized on first use)
+_update_recorder: Optional[UpdateRecorder] = None
+
+
+def get_update_recorder(settings: Settings) -> UpdateRecorder:
+    """Get or create the update recorder (one file per process)."""
+    global _update_recorder
+    if _update_recorder is None:
+        salt = settings.RECORD_SALT.encode() if settings.RECORD_SALT else secrets.token_bytes(16)
+        path = Path(settings.RECORD_DIR) / f"updates-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl.gz"
+        _update_recorder = UpdateRecorder(path, salt, settings.RECORD_QUEUE_SIZE)
+    return _update_recorder
+
+
+async def close_update_recorder() -> None:
+    """Finish writing if the update recorder was created."""
+    global _update_recorder
+    if _update_recorder is not None:
+        await asyncio.to_thread(_update_recorder.close)
+        _update_recorder = None
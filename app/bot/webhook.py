@@ -0,0 +1,156 @@
+"""Webhook serving mode."""
+import asyncio
+import logging
+from typing import Any, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import BaseRequestHandler, SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from app.bot.dispatcher import get_allowed_updates
+from app.core.settings import Settings
+from app.core.shutdown import Shutdown, drain_tasks
+
+logger = logging.getLogger(__name__)
+
+# How long shutdown waits for accepted updates to finish without a shutdown budget
+DRAIN_TIMEOUT_SECONDS = 10.0
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Webhook request handler with bounded background processing.
+
+    Each update is acknowledged with 200 as soon as its body is read and is
+    processed in a background task. At most ``max_concurrent`` updates are
+    processed at a time. Once ``max_pending`` updates are accepted but not
+    finished, new requests wait for a free slot before they are acknowledged,
+    so Telegram slows down instead of the backlog growing without limit.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        secret_token: str | None,
+        max_concurrent: int,
+        max_pending: int,
+        shutdown: Optional[Shutdown] = None,
+        **data: Any,
+    ) -> None:
+        """Initialize request handler."""
+        super().__init__(
+            dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data
+        )
+        self.shutdown = shutdown
+        self._processing = asyncio.Semaphore(max_concurrent)
+        self._pending = asyncio.Semaphore(max_pending)
+
+    @property
+    def pending(self) -> int:
+        """Number of accepted updates that are not processed yet."""
+        return len(self._background_feed_update_tasks)
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        """Acknowledge the update and process it in the background."""
+        update = await request.json(loads=bot.session.json_loads)
+        await self._pending.acquire()
+        task = asyncio.create_task(self._process(bot, update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _process(self, bot: Bot, update: dict[str, Any]) -> None:
+        """Process one update once a processing slot is free."""
+        try:
+            async with self._processing:
+                await self._background_feed_update(bot, update)
+        except Exception as e:
+            logger.error("Error processing update %s: %s", update.get("update_id"), e, exc_info=True)
+        finally:
+            self._pending.release()
+
+    async def close(self) -> None:
+        """Wait for accepted updates. The bot session is closed by the caller."""
+        timeout = self.shutdown.remaining() if self.shutdown is not None else DRAIN_TIMEOUT_SECONDS
+        await drain_tasks(self._background_feed_update_tasks, timeout, "webhook updates")
+
+
+def get_webhook_url(settings: Settings) -> str:
+    """Get the public URL Telegram should post updates to."""
+    if not settings.WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL is required when BOT_MODE=webhook")
+    return settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH
+
+
+def create_webhook_app(
+    bot: Bot,
+    dp: Dispatcher,
+    settings: Settings,
+    handler: Optional[BaseRequestHandler] = None,
+    shutdown: Optional[Shutdown] = None,
+) -> tuple[web.Application, BaseRequestHandler]:
+    """Create the aiohttp application serving the webhook path."""
+    app = web.Application()
+    if handler is None:
+        handler = BoundedRequestHandler(
+            dp,
+            bot,
+            secret_token=settings.WEBHOOK_SECRET,
+            max_concurrent=settings.WEBHOOK_MAX_CONCURRENT_UPDATES,
+            max_pending=settings.WEBHOOK_MAX_PENDING_UPDATES,
+            shutdown=shutdown,
+        )
+    handler.register(app, path=settings.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app, handler
+
+
+async def run_webhook(
+    bot: Bot,
+    dp: Dispatcher,
+    settings: Settings,
+    handler: Optional[BaseRequestHandler] = None,
+    shutdown: Optional[Shutdown] = None,
+) -> None:
+    """
+    Serve updates over a webhook (with the bounded handler unless one is given).
+
+    Serves until shutdown is requested (or the task is cancelled), then stops
+    accepting requests and lets accepted updates finish.
+    """
+    url = get_webhook_url(settings)
+    if not settings.WEBHOOK_SECRET:
+        logger.warning("WEBHOOK_SECRET is not set, webhook requests are not authenticated")
+
+    app, _ = create_webhook_app(bot, dp, settings, handler, shutdown)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+        await site.start()
+        logger.info("Webhook server listening on %s:%s", settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+
+        await bot.set_webhook(
+            url=url,
+            secret_token=settings.WEBHOOK_SECRET,
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=get_allowed_updates(dp),
+        )
+        logger.info("Webhook set to %s", url)
+
+        if shutdown is not None:
+            await shutdown.wait()
+        else:
+            # Serve until the task is cancelled
+            await asyncio.Event().wait()
+    finally:
+        # Stop listening first; the handler then waits for accepted updates on cleanup.
+        # Telegram keeps updates it could not deliver and retries them after a restart.
+        for running_site in list(runner.sites):
+            await running_site.stop()
+        if shutdown is not None:
+            shutdown.mark("intake")
+        await runner.cleanup()
+        if shutdown is not None:
+            shutdown.mark("updates")
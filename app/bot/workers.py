@@ -0,0 +1,514 @@
+"""Multi-process update workers partitioned by chat."""
+import asyncio
+import ctypes
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from multiprocessing.context import SpawnProcess
+from typing import Any, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import GetUpdates, TelegramMethod
+from aiogram.utils.backoff import Backoff, BackoffConfig
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+from app.bot.dispatcher import close_services, create_bot, get_allowed_updates, setup_dispatcher, warm_up
+from app.bot.middlewares import FirstUpdateMiddleware
+from app.core.logging import setup_logging, stop_logging
+from app.core.metrics import REGISTRY, Gauge, Metric
+from app.core.profiling import start_profiling
+from app.core.settings import Settings
+from app.core.shutdown import Shutdown, drain_tasks
+from app.core.startup import StartupTimer
+
+logger = logging.getLogger(__name__)
+
+# Updates a worker holds in memory beyond the ones being processed
+WORKER_INBOX_SIZE = 100
+
+# Long polling in the ingress process (same values as aiogram's own polling)
+POLLING_TIMEOUT = 30
+POLLING_BACKOFF = BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1)
+
+WORKER_LOG_FORMAT = "%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def get_routing_key(update: dict[str, Any]) -> int:
+    """
+    Get the key an update is partitioned by.
+
+    This is the chat id for anything that happens in a chat (messages,
+    member updates, callback queries on messages), otherwise the id of the
+    user who caused the update, otherwise the update id.
+    """
+    for key, payload in update.items():
+        if key == "update_id" or not isinstance(payload, dict):
+            continue
+        chat = payload.get("chat")
+        if chat is None and isinstance(payload.get("message"), dict):
+            chat = payload["message"].get("chat")
+        if chat is not None:
+            return chat["id"]
+        user = payload.get("from") or payload.get("user")
+        if user is not None:
+            return user["id"]
+    return update["update_id"]
+
+
+class ChatSequencer:
+    """
+    Run updates concurrently across chats but in arrival order within a chat.
+
+    Each update waits for the previous update with the same key to finish,
+    and only then for one of ``slots`` (if given), so updates queued behind
+    a busy chat do not take the slots other chats need.
+    """
+
+    def __init__(self, slots: Optional[asyncio.Semaphore] = None) -> None:
+        """Initialize sequencer."""
+        self._slots = slots
+        self._tails: dict[int, asyncio.Task] = {}
+
+    def submit(self, key: int, coro: Any) -> asyncio.Task:
+        """Schedule ``coro`` after the last task submitted for ``key``."""
+        previous = self._tails.get(key)
+        task = asyncio.create_task(self._run_after(previous, coro))
+        self._tails[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return task
+
+    async def _run_after(self, previous: Optional[asyncio.Task], coro: Any) -> None:
+        """Wait for the previous task (whatever its outcome) and a free slot, then run."""
+        if previous is not None:
+            await asyncio.wait([previous])
+        if self._slots is None:
+            await coro
+            return
+        async with self._slots:
+            await coro
+
+    def _forget(self, key: int, task: asyncio.Task) -> None:
+        """Drop the tail once the last task of a key is done."""
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+
+async def _process_update(dp: Dispatcher, bot: Bot, update: dict[str, Any]) -> None:
+    """Feed one raw update to the dispatcher."""
+    try:
+        result = await dp.feed_raw_update(bot, update)
+        if isinstance(result, TelegramMethod):
+            await dp.silent_call_request(bot, result)
+    except Exception as e:
+        logger.error("Error processing update %s: %s", update.get("update_id"), e, exc_info=True)
+
+
+async def _run_worker(
+    index: int,
+    settings: Settings,
+    inbox_queue: multiprocessing.Queue,
+    heartbeat: ctypes.c_double,
+    startup: StartupTimer,
+) -> None:
+    """Process updates from the inbox queue until the stop sentinel arrives."""
+    bot = create_bot(settings)
+    shutdown = Shutdown(settings.SHUTDOWN_TIMEOUT_SECONDS)
+    dp = setup_dispatcher(bot, settings)
+    # Updates are processed here, so this is where the first one is timed
+    dp.update.outer_middleware(FirstUpdateMiddleware(startup))
+    startup.mark("dispatcher")
+    if settings.METRICS_ENABLED:
+        from app.bot.metrics import start_metrics
+
+        await start_metrics(settings, settings.METRICS_PORT + 1 + index)
+    loop = asyncio.get_running_loop()
+    inbox: asyncio.Queue = asyncio.Queue(maxsize=WORKER_INBOX_SIZE)
+
+    def read_queue() -> None:
+        # Blocking reads happen off the loop; a full inbox holds the reader back
+        while True:
+            item = inbox_queue.get()
+            asyncio.run_coroutine_threadsafe(inbox.put(item), loop).result()
+            if item is None:
+                return
+
+    async def beat() -> None:
+        # Beats stop if the loop is blocked, which the supervisor treats as stuck
+        while True:
+            heartbeat.value = time.time()
+            await asyncio.sleep(settings.WORKER_HEARTBEAT_SECONDS)
+
+    if hasattr(signal, "SIGHUP"):
+        loop.add_signal_handler(signal.SIGHUP, dp["update_filter"].reload)
+    if hasattr(signal, "SIGUSR1"):
+        loop.add_signal_handler(signal.SIGUSR1, start_profiling, settings)
+    threading.Thread(target=read_queue, name="update-reader", daemon=True).start()
+    beater = asyncio.create_task(beat())
+    warmer = asyncio.create_task(warm_up(settings))
+    sequencer = ChatSequencer(asyncio.Semaphore(settings.WORKER_MAX_CONCURRENT_UPDATES))
+    # Updates taken in but not finished, including those waiting for their chat
+    admitted = asyncio.Semaphore(settings.WORKER_MAX_CONCURRENT_UPDATES + WORKER_INBOX_SIZE)
+    running: set[asyncio.Task] = set()
+
+    try:
+        while True:
+            update = await inbox.get()
+            if update is None:
+                break
+            await admitted.acquire()
+            task = sequencer.submit(get_routing_key(update), _process_update(dp, bot, update))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: admitted.release())
+        # Updates queued before the sentinel have been taken in; let them finish
+        shutdown.request()
+        await drain_tasks(running, shutdown.remaining(), "updates")
+        shutdown.mark("updates")
+    finally:
+        beater.cancel()
+        warmer.cancel()
+        # Let the warm-up unwind before the engine it uses is disposed
+        await asyncio.gather(beater, warmer, return_exceptions=True)
+        await close_services(shutdown)
+        await bot.session.close()
+
+
+def worker_main(
+    index: int, settings_data: dict[str, Any], inbox_queue: multiprocessing.Queue, heartbeat: ctypes.c_double
+) -> None:
+    """Entry point of a worker process."""
+    startup = StartupTimer()
+    # The ingress process coordinates shutdown; Ctrl+C reaches the whole process group,
+    # and so may SIGTERM from a service manager
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    # Forwarded signals must not kill a worker that is still starting up
+    for signum in ("SIGHUP", "SIGUSR1"):
+        if hasattr(signal, signum):
+            signal.signal(getattr(signal, signum), signal.SIG_IGN)
+    settings = Settings(**settings_data)
+    setup_logging(settings, WORKER_LOG_FORMAT)
+    startup.mark("settings")
+    logger.info("Worker %d started", index)
+    try:
+        asyncio.run(_run_worker(index, settings, inbox_queue, heartbeat, startup))
+        logger.info("Worker %d stopped", index)
+    finally:
+        stop_logging()
+
+
+class WorkerPool:
+    """
+    Pool of worker processes, each with its own dispatcher and database pool.
+
+    Updates are routed by ``get_routing_key`` modulo the pool size, so a chat
+    is always served by the same worker. That keeps per-chat ordering and
+    lets the in-memory caches (members, leaderboards, greeting cooldowns) stay
+    consistent without sharing state between processes.
+
+    Workers report a heartbeat from their event loop. The supervisor restarts
+    workers that exited or whose heartbeat is older than
+    ``WORKER_STALL_SECONDS``.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        """Initialize worker pool."""
+        self.settings = settings
+        self.size = settings.WORKER_PROCESSES
+        self._context = multiprocessing.get_context("spawn")
+        self._settings_data = settings.model_dump()
+        self._queues: list[multiprocessing.Queue] = []
+        self._processes: list[Optional[SpawnProcess]] = []
+        self._heartbeats: list[ctypes.c_double] = []
+        self._restarting: set[int] = set()
+        self.restarts = 0
+
+    def start(self) -> None:
+        """Start all workers."""
+        for index in range(self.size):
+            self._queues.append(self._new_queue())
+            self._heartbeats.append(self._context.Value("d", time.time(), lock=False))
+            self._processes.append(None)
+            self._spawn(index)
+        logger.info("Started %s update workers", self.size)
+
+    def route(self, update: dict[str, Any]) -> int:
+        """Get the index of the worker serving an update."""
+        return get_routing_key(update) % self.size
+
+    async def submit(self, update: dict[str, Any]) -> None:
+        """Queue an update for its worker, waiting while that worker's queue is full."""
+        await self._put(self.route(update), update)
+
+    async def _put(self, index: int, item: Optional[dict[str, Any]], timeout: Optional[float] = None) -> bool:
+        """
+        Queue an item for a worker without blocking the event loop.
+
+        Waits while the queue is full, for at most ``timeout`` seconds if given.
+
+        Returns:
+            False if the queue stayed full until the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                self._queues[index].put_nowait(item)
+                return True
+            except queue.Full:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                await asyncio.sleep(0.01)
+
+    async def supervise(self) -> None:
+        """Restart dead or stuck workers until cancelled."""
+        while True:
+            await asyncio.sleep(self.settings.WORKER_HEARTBEAT_SECONDS)
+            for index, process in enumerate(self._processes):
+                if index in self._restarting or process is None:
+                    continue
+                silent = time.time() - self._heartbeats[index].value
+                if not process.is_alive():
+                    logger.error("Worker %s exited with code %s, restarting", index, process.exitcode)
+                    await self._replace(index, kill=False)
+                elif silent > self.settings.WORKER_STALL_SECONDS:
+                    logger.error("Worker %s sent no heartbeat for %.0fs, restarting", index, silent)
+                    await self._replace(index, kill=True)
+
+    async def restart(self, index: int) -> None:
+        """
+        Gracefully restart one worker.
+
+        The worker finishes the updates queued before the stop sentinel, then
+        a new worker takes over the same queue, so no update is lost or
+        reordered.
+        """
+        if index in self._restarting:
+            return
+        self._restarting.add(index)
+        try:
+            process = self._processes[index]
+            if not await self._put(index, None, self.settings.WORKER_STALL_SECONDS):
+                # A worker that stopped reading cannot be asked to stop
+                logger.warning("Worker %s queue stayed full, killing it", index)
+                await self._replace(index, kill=True)
+                return
+            if process is not None:
+                await asyncio.to_thread(process.join, self.settings.WORKER_STALL_SECONDS)
+                if process.is_alive():
+                    logger.warning("Worker %s did not stop in time, killing it", index)
+                    process.kill()
+                    await asyncio.to_thread(process.join)
+            self._spawn(index)
+        finally:
+            self._restarting.discard(index)
+
+    async def restart_all(self) -> None:
+        """Gracefully restart workers one at a time."""
+        logger.info("Restarting update workers")
+        for index in range(self.size):
+            await self.restart(index)
+
+    async def stop(self) -> None:
+        """Let workers finish queued updates, flush their buffers and exit."""
+        alive = [index for index, process in enumerate(self._processes) if process is not None and process.is_alive()]
+        queued = await asyncio.gather(
+            *(self._put(index, None, self.settings.WORKER_STALL_SECONDS) for index in alive)
+        )
+        for index, stopping in zip(alive, queued):
+            if not stopping:
+                logger.warning("Worker %s queue stayed full, killing it", index)
+                self._processes[index].kill()
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            await asyncio.to_thread(process.join, self.settings.WORKER_STALL_SECONDS)
+            if process.is_alive():
+                logger.warning("Worker %s did not stop in time, killing it", index)
+                process.kill()
+        logger.info("Update workers stopped")
+
+    def send_signal(self, signum: int) -> None:
+        """Send a signal to every running worker."""
+        for process in self._processes:
+            if process is not None and process.is_alive() and process.pid is not None:
+                os.kill(process.pid, signum)
+
+    def stats(self) -> list[dict[str, Any]]:
+        """Get per-worker state: liveness, heartbeat age and queued updates."""
+        now = time.time()
+        result = []
+        for index, process in enumerate(self._processes):
+            try:
+                queued = self._queues[index].qsize()
+            except NotImplementedError:  # macOS
+                queued = -1
+            result.append(
+                {
+                    "worker": index,
+                    "alive": process is not None and process.is_alive(),
+                    "heartbeat_age": now - self._heartbeats[index].value,
+                    "queued": queued,
+                }
+            )
+        return result
+
+    def _new_queue(self) -> multiprocessing.Queue:
+        """Create a bounded update queue."""
+        return self._context.Queue(maxsize=self.settings.WORKER_QUEUE_SIZE)
+
+    def _spawn(self, index: int) -> None:
+        """Start a worker process on its queue."""
+        self._heartbeats[index].value = time.time()
+        process = self._context.Process(
+            target=worker_main,
+            args=(index, self._settings_data, self._queues[index], self._heartbeats[index]),
+            name=f"worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+
+    async def _replace(self, index: int, kill: bool) -> None:
+        """Start a new worker in place of a dead or stuck one."""
+        self._restarting.add(index)
+        try:
+            process = self._processes[index]
+            if process is not None:
+                if kill:
+                    process.kill()
+                await asyncio.to_thread(process.join)
+
+            # A process killed while reading can leave the queue unusable, so
+            # move what is left to a fresh queue
+            old_queue, new_queue = self._queues[index], self._new_queue()
+            moved = 0
+            while True:
+                try:
+                    item = old_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    new_queue.put(item)
+                    moved += 1
+            self._queues[index] = new_queue
+            old_queue.close()
+            if moved:
+                logger.info("Moved %s queued updates to the new worker %s", moved, index)
+
+            self.restarts += 1
+            self._spawn(index)
+        finally:
+            self._restarting.discard(index)
+
+
+class ForwardingRequestHandler(SimpleRequestHandler):
+    """Webhook handler that acknowledges updates and queues them for workers."""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, pool: WorkerPool, secret_token: Optional[str]) -> None:
+        """Initialize request handler."""
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token)
+        self.pool = pool
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        """Queue the update for its worker and acknowledge it."""
+        await self.pool.submit(await request.json(loads=bot.session.json_loads))
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def close(self) -> None:
+        """The bot session is closed by the caller."""
+
+
+async def _poll_into(pool: WorkerPool, bot: Bot, dp: Dispatcher) -> None:
+    """
+    Long-poll Telegram and queue every update for its worker.
+
+    Calls getUpdates directly instead of ``Dispatcher.start_polling``, which
+    would feed updates to this process's dispatcher. Failed calls are
+    retried with backoff.
+    """
+    backoff = Backoff(POLLING_BACKOFF)
+    get_updates = GetUpdates(timeout=POLLING_TIMEOUT, allowed_updates=get_allowed_updates(dp))
+    # Wait longer than Telegram holds the request open
+    request_timeout = int(bot.session.timeout + POLLING_TIMEOUT)
+    while True:
+        try:
+            updates = await bot(get_updates, request_timeout=request_timeout)
+        except Exception as e:
+            logger.error("Failed to fetch updates: %s, retrying in %.1fs", e, backoff.next_delay)
+            await backoff.asleep()
+            continue
+        backoff.reset()
+        for update in updates:
+            await pool.submit(update.model_dump(mode="json", exclude_unset=True, by_alias=True))
+            # Confirmed on the next call
+            get_updates.offset = update.update_id + 1
+
+
+def _collect_pool(pool: WorkerPool) -> list[Metric]:
+    """Export worker liveness and queue depth."""
+    alive = Gauge("bot_worker_alive", "Whether a worker process is running", ["worker"])
+    heartbeat_age = Gauge("bot_worker_heartbeat_age_seconds", "Time since a worker's last heartbeat", ["worker"])
+    queued = Gauge("bot_worker_queued_updates", "Updates waiting in a worker's queue", ["worker"])
+    for worker in pool.stats():
+        index = str(worker["worker"])
+        alive.set(int(worker["alive"]), worker=index)
+        heartbeat_age.set(worker["heartbeat_age"], worker=index)
+        queued.set(worker["queued"], worker=index)
+    return [alive, heartbeat_age, queued]
+
+
+async def run_with_workers(bot: Bot, dp: Dispatcher, settings: Settings, shutdown: Shutdown) -> None:
+    """
+    Receive updates in this process and process them in worker processes.
+
+    Updates come from long polling or, with BOT_MODE=webhook, from the
+    webhook server, until shutdown is requested; the workers then finish
+    what is queued for them and flush their own buffers. SIGUSR2 restarts the workers one by one; SIGHUP and
+    SIGUSR1 are passed on to the workers to reload the chat allow-list and
+    to record a profile.
+    """
+    pool = WorkerPool(settings)
+    pool.start()
+    supervisor = asyncio.create_task(pool.supervise(), name="worker-supervisor")
+    if settings.METRICS_ENABLED:
+        REGISTRY.add_collector(lambda: _collect_pool(pool))
+
+    loop = asyncio.get_running_loop()
+    if hasattr(signal, "SIGUSR2"):
+        loop.add_signal_handler(
+            signal.SIGUSR2, lambda: asyncio.create_task(pool.restart_all())
+        )
+    if hasattr(signal, "SIGHUP"):
+        # Workers own the dispatchers, so they reload the chat allow-list
+        loop.add_signal_handler(signal.SIGHUP, pool.send_signal, signal.SIGHUP)
+    if hasattr(signal, "SIGUSR1"):
+        # Handlers run in the workers, so that is where profiles are recorded
+        loop.add_signal_handler(signal.SIGUSR1, pool.send_signal, signal.SIGUSR1)
+
+    try:
+        if settings.BOT_MODE == "webhook":
+            from app.bot.webhook import run_webhook
+
+            handler = ForwardingRequestHandler(dp, bot, pool, settings.WEBHOOK_SECRET)
+            await run_webhook(bot, dp, settings, handler, shutdown)
+        else:
+            polling = asyncio.create_task(_poll_into(pool, bot, dp))
+            await shutdown.wait(polling)
+            polling.cancel()
+            try:
+                await polling
+            except asyncio.CancelledError:
+                if not shutdown.requested:
+                    raise
+            shutdown.mark("intake")
+    finally:
+        if hasattr(signal, "SIGUSR2"):
+            loop.remove_signal_handler(signal.SIGUSR2)
+        supervisor.cancel()
+        await pool.stop()
+        shutdown.mark("workers")
@@ -0,0 +1,160 @@
+"""Logging setup: queue-backed handlers, rate limiting and JSON output."""
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+from app.core.settings import Settings
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Attributes every LogRecord has; anything else was passed in ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format a record as JSON."""
+        entry: dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.processName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most ``limit`` records per message template per ``interval`` seconds.
+
+    Records are grouped by logger, level and unformatted message, so
+    per-update messages logged with lazy %-formatting ("Update %s dropped")
+    count as one message no matter their arguments. The first record let
+    through after a suppressed stretch says how many similar ones were
+    dropped. Records at ``exempt_level`` and above (by default warnings and
+    errors) are always let through.
+    """
+
+    def __init__(self, limit: int, interval: float, exempt_level: int = logging.WARNING) -> None:
+        """Initialize filter."""
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.exempt_level = exempt_level
+        # (logger, level, template) -> [window start, records in window, suppressed]
+        self._windows: dict[tuple[str, int, Any], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Decide whether to emit a record."""
+        if record.levelno >= self.exempt_level:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                if window is None and len(self._windows) >= 10000:
+                    self._windows.clear()
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < self.limit:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.msg, record.args = "%s (%d similar messages suppressed)", (record.getMessage(), suppressed)
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Queue handler that leaves formatting to the listener thread.
+
+    The stock QueueHandler formats the message before queueing it, which
+    would keep string building on the event loop. Records stay in this
+    process, so they can be queued as they are.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Queue the record unformatted."""
+        return record
+
+
+def setup_logging(settings: Settings, text_format: str = TEXT_FORMAT) -> None:
+    """
+    Route all logging through a queue to a stdout handler on a background thread.
+
+    Level, format (text or JSON) and rate limiting come from settings. The
+    listener is stopped, writing out queued records, by ``stop_logging`` or
+    at interpreter exit.
+    """
+    global _listener, _queue_handler
+    stop_logging()
+
+    stream = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter(text_format))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    if settings.LOG_RATE_LIMIT > 0:
+        handler.addFilter(
+            RateLimitFilter(
+                settings.LOG_RATE_LIMIT,
+                settings.LOG_RATE_LIMIT_SECONDS,
+                logging.getLevelNamesMapping()[settings.LOG_RATE_LIMIT_EXEMPT_LEVEL.upper()],
+            )
+        )
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    _queue_handler = handler
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the listener thread; later records are written directly."""
+    global _listener, _queue_handler
+    if _listener is None or _queue_handler is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        for log_filter in _queue_handler.filters:
+            handler.addFilter(log_filter)
+        root.addHandler(handler)
+    _listener = _queue_handler = None
+
+
+atexit.register(stop_logging)
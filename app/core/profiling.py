@@ -0,0 +1,200 @@
+"""On-demand sampling profiler writing collapsed stacks."""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Any, Optional
+
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# Frames kept per stack, innermost last
+MAX_STACK_DEPTH = 128
+
+
+def _frame_label(frame: FrameType) -> str:
+    """Get a "module:function" label for a frame."""
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{frame.f_code.co_qualname}"
+
+
+def _thread_stack(frame: Optional[FrameType]) -> list[str]:
+    """Get the labels of a thread's call stack, outermost first."""
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_stack(task: asyncio.Task) -> list[str]:
+    """Get the labels of the coroutines a suspended task is awaiting, outermost first."""
+    stack = []
+    awaitable: Any = task.get_coro()
+    while awaitable is not None and len(stack) < MAX_STACK_DEPTH:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            # A future or another non-coroutine awaitable at the bottom of the chain
+            stack.append(type(awaitable).__name__)
+            break
+        stack.append(_frame_label(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return stack
+
+
+class SamplingProfiler:
+    """
+    Samples stacks of a running bot for a fixed window.
+
+    While a profile is running, a background thread wakes up every
+    ``interval`` seconds and records the call stack of every thread (the
+    event loop thread under ``loop``, others such as the aiosqlite
+    connection threads under their thread name) and the await chain of
+    every suspended task under ``tasks``, so time spent waiting on the
+    database or the Bot API is attributed to the handler awaiting it.
+    Samples are written in the collapsed stack format ("frame;frame;frame
+    count" per line) read by speedscope, flamegraph.pl and inferno.
+
+    Nothing is installed while no profile is running.
+    """
+
+    def __init__(self, output_dir: Path, interval: float) -> None:
+        """Initialize profiler."""
+        self.output_dir = output_dir
+        self.interval = interval
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether a profile is being recorded."""
+        return self._thread is not None
+
+    def start(self, duration: float) -> "asyncio.Future[Path]":
+        """
+        Start profiling the running loop for ``duration`` seconds.
+
+        Must be called from the event loop thread. Returns a future resolved
+        with the path of the written profile. Raises RuntimeError if a
+        profile is already being recorded.
+        """
+        if self._thread is not None:
+            raise RuntimeError("Profiling is already running")
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[Path] = loop.create_future()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(loop, threading.get_ident(), duration, future),
+            name="profiler",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info("Profiling started for %.0fs", duration)
+        return future
+
+    def _run(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        loop_thread_id: int,
+        duration: float,
+        future: "asyncio.Future[Path]",
+    ) -> None:
+        """Sample until the window closes, then write the profile."""
+        path: Optional[Path] = None
+        error: Optional[Exception] = None
+        try:
+            samples: Counter[str] = Counter()
+            loop_busy = loop_total = 0
+            deadline = time.monotonic() + duration
+            while time.monotonic() < deadline:
+                busy = self._sample(samples, loop, loop_thread_id)
+                loop_total += 1
+                loop_busy += busy
+                time.sleep(self.interval)
+            path = self._write(samples)
+            busy_share = loop_busy / loop_total if loop_total else 0.0
+            logger.info(
+                "Profile written to %s: %d samples, event loop busy %.0f%%", path, loop_total, busy_share * 100
+            )
+        except Exception as e:
+            logger.error("Profiling failed: %s", e, exc_info=True)
+            error = e
+        finally:
+            self._thread = None
+        try:
+            loop.call_soon_threadsafe(_resolve, future, path, error)
+        except RuntimeError:
+            pass  # The loop was closed while profiling
+
+    def _sample(self, samples: Counter, loop: asyncio.AbstractEventLoop, loop_thread_id: int) -> bool:
+        """Record one sample of all threads and suspended tasks. Returns whether the loop was busy."""
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        loop_busy = False
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = _thread_stack(frame)
+            if thread_id == loop_thread_id:
+                # An idle loop sits in the selector waiting for I/O
+                loop_busy = not stack or not stack[-1].startswith("selectors:")
+                root = "loop"
+            else:
+                root = names.get(thread_id, f"thread-{thread_id}")
+            samples[";".join([root, *stack])] += 1
+
+        for task in asyncio.all_tasks(loop):
+            if task.done():
+                continue
+            stack = _await_stack(task)
+            if stack:
+                samples[";".join(["tasks", *stack])] += 1
+        return loop_busy
+
+    def _write(self, samples: Counter) -> Path:
+        """Write samples in the collapsed stack format."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.folded"
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in samples.most_common():
+                file.write(f"{stack} {count}\n")
+        return path
+
+
+def _resolve(future: "asyncio.Future[Path]", path: Optional[Path], error: Optional[Exception]) -> None:
+    """Complete a profile future in the loop thread."""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(path)
+
+
+# Global profiler (will be initialized on first use)
+_profiler: Optional[SamplingProfiler] = None
+
+
+def get_profiler(settings: Settings) -> SamplingProfiler:
+    """Get or create the profiler."""
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler(Path(settings.PROFILE_DIR), settings.PROFILE_INTERVAL_SECONDS)
+    return _profiler
+
+
+def start_profiling(settings: Settings) -> None:
+    """Start a profile of the default length, e.g. from a signal handler."""
+    try:
+        future = get_profiler(settings).start(settings.PROFILE_SECONDS)
+    except RuntimeError as e:
+        logger.warning(str(e))
+        return
+    # The result is only logged; retrieve it so errors are not reported as unhandled
+    future.add_done_callback(lambda done: done.cancelled() or done.exception())
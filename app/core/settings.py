@@ -1,5 +1,5 @@
 """Application settings."""
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -10,14 +10,92 @@ class Settings(BaseSettings):
     # Bot token (required)
     BOT_TOKEN: str
 
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Literal["text", "json"] = "text"
+    LOG_RATE_LIMIT: int = 20  # Records per message template per window (0 = no limit)
+    LOG_RATE_LIMIT_SECONDS: float = 60.0
+    LOG_RATE_LIMIT_EXEMPT_LEVEL: str = "WARNING"  # Records at this level and above are never rate limited
+
+    # Update delivery
+    TELEGRAM_API_URL: Optional[str] = None  # Bot API server base URL, e.g. a local telegram-bot-api (default: api.telegram.org)
+    BOT_MODE: Literal["polling", "webhook"] = "polling"
+    WEBHOOK_URL: Optional[str] = None  # Public HTTPS base URL, e.g. https://bot.example.com
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: Optional[str] = None  # Checked against X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_MAX_CONNECTIONS: int = 40  # setWebhook max_connections (1-100)
+    WEBHOOK_MAX_CONCURRENT_UPDATES: int = 100  # Updates processed at the same time
+    WEBHOOK_MAX_PENDING_UPDATES: int = 1000  # Accepted but unfinished updates before acks are delayed
+    SHUTDOWN_TIMEOUT_SECONDS: float = 25.0  # Wait for in-flight updates and queued messages on SIGTERM/SIGINT
+
+    # Worker processes (0 = handle updates in the main process)
+    WORKER_PROCESSES: int = 0
+    WORKER_QUEUE_SIZE: int = 1000  # Updates queued per worker before ingress waits
+    WORKER_MAX_CONCURRENT_UPDATES: int = 100  # Updates processed at the same time per worker
+    WORKER_HEARTBEAT_SECONDS: float = 5.0
+    WORKER_STALL_SECONDS: float = 60.0  # Workers silent for this long are restarted
+
     # Database
     DATABASE_URL: Optional[str] = None
+    DB_AUTO_MIGRATE: bool = True  # Apply pending migrations on startup
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_PRE_PING: bool = False  # Check connections before use (for flaky networks)
+    DB_STATEMENT_CACHE_SIZE: int = 100  # asyncpg prepared statements per connection (0 for PgBouncer)
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # Wait for locks instead of failing with "database is locked"
+    SQLITE_MMAP_SIZE: int = 268435456  # Bytes of the database file to memory-map (0 to disable)
+
+    # Outbound rate limits (Telegram allows ~30 msg/s overall, ~20 msg/min per group)
+    OUTBOUND_ENABLED: bool = True  # Pace outgoing messages and retry on flood wait
+    OUTBOUND_GLOBAL_PER_SECOND: float = 30.0
+    OUTBOUND_GROUP_PER_MINUTE: float = 20.0
+    OUTBOUND_GROUP_BURST: int = 3  # Messages a quiet group may get at once
+    OUTBOUND_PRIVATE_PER_SECOND: float = 1.0
+    OUTBOUND_MAX_RETRIES: int = 3  # Retries after retry_after before giving up
+
+    # Prometheus metrics (workers listen on METRICS_PORT + 1 + worker index)
+    METRICS_ENABLED: bool = False
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9100
+    METRICS_LOOP_LAG_INTERVAL_SECONDS: float = 0.5  # How often event loop lag is sampled
+
+    # On-demand profiling (/profile command or SIGUSR1)
+    PROFILE_DIR: str = "profiles"  # Where collapsed-stack profiles are written
+    PROFILE_SECONDS: float = 30.0  # Default profile length
+    PROFILE_MAX_SECONDS: float = 300.0  # Longest profile /profile may request
+    PROFILE_INTERVAL_SECONDS: float = 0.005  # Time between samples
+
+    # Update recording for offline replay (personal data is scrubbed)
+    RECORD_UPDATES: bool = False
+    RECORD_DIR: str = "recordings"  # One gzip file per process start
+    RECORD_QUEUE_SIZE: int = 10000  # Updates waiting to be written before new ones are dropped
+    RECORD_SALT: Optional[str] = None  # Keeps pseudonymous ids stable across restarts (random if unset)
 
     # Chat filtering
     ALLOWED_CHAT_IDS: Optional[str] = None  # Comma-separated list of chat IDs
 
     # Karma settings
     KARMA_COOLDOWN_MINUTES: int = 60
+    KARMA_DIGEST_SECONDS: float = 0  # Merge confirmations per chat over this window (0 = reply to each)
+    KARMA_WRITE_BEHIND: bool = False  # Buffer karma increments and flush them in bulk
+    KARMA_FLUSH_INTERVAL_SECONDS: float = 5.0
+    KARMA_FLUSH_MAX_PENDING: int = 500  # Flush early once this many increments are buffered
+    LEADERBOARD_MAX_CHATS: int = 1000  # In-memory /top boards kept at most
+    LEADERBOARD_IDLE_MINUTES: int = 60  # Boards unused for this long are evicted
+    LEADERBOARD_WINDOW_MAX_CHATS: int = 200  # Chats with in-memory /top week and /top month counts
+    TIMEZONE: str = "UTC"  # Days in /karmastats start at midnight in this timezone
+    KARMA_STATS_BACKFILL_BATCH_SIZE: int = 5000  # Earlier transactions rolled up per database transaction
+
+    # User directory settings
+    USER_CACHE_SIZE: int = 10000  # Profiles kept in memory
+    USER_FLUSH_INTERVAL_SECONDS: float = 10.0
+    USER_FLUSH_MAX_PENDING: int = 500
+
+    # Chat member cache settings (admin checks, bot checks)
+    MEMBER_CACHE_TTL_SECONDS: float = 60.0
+    MEMBER_CACHE_MAX_SIZE: int = 10000
 
     # Warning system settings
     WARN_LIMIT: int = 3
@@ -26,6 +104,8 @@ class Settings(BaseSettings):
     # Greeting settings
     GREETING_COOLDOWN_MINUTES: int = 10
     GREETING_CHAT_IDS: Optional[str] = None  # Comma-separated list of chat IDs for greetings
+    GREETING_PRUNE_INTERVAL_MINUTES: int = 60  # How often expired greeting rows are deleted
+    GREETING_PRUNE_BATCH_SIZE: int = 1000  # Rows deleted per transaction
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -34,21 +114,21 @@ class Settings(BaseSettings):
         extra="ignore",  # Ignore extra fields in .env
     )
 
-    def get_allowed_chat_ids(self) -> Optional[list[int]]:
-        """Parse ALLOWED_CHAT_IDS into a list of integers."""
+    def get_allowed_chat_ids(self) -> Optional[frozenset[int]]:
+        """Parse ALLOWED_CHAT_IDS into a set of integers."""
         if not self.ALLOWED_CHAT_IDS:
             return None
         try:
-            return [int(chat_id.strip()) for chat_id in self.ALLOWED_CHAT_IDS.split(",")]
+            return frozenset(int(chat_id.strip()) for chat_id in self.ALLOWED_CHAT_IDS.split(","))
         except ValueError:
             return None
 
-    def get_greeting_chat_ids(self) -> Optional[list[int]]:
-        """Parse GREETING_CHAT_IDS into a list of integers."""
+    def get_greeting_chat_ids(self) -> Optional[frozenset[int]]:
+        """Parse GREETING_CHAT_IDS into a set of integers."""
         if not self.GREETING_CHAT_IDS:
             return None
         try:
-            return [int(chat_id.strip()) for chat_id in self.GREETING_CHAT_IDS.split(",")]
+            return frozenset(int(chat_id.strip()) for chat_id in self.GREETING_CHAT_IDS.split(","))
         except ValueError:
             return None
 
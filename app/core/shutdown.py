@@ -0,0 +1,92 @@
+"""Graceful shutdown coordination."""
+import asyncio
+import logging
+import time
+from collections.abc import Collection
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Shutdown:
+    """
+    Stop request, time budget and per-phase timings of a graceful shutdown.
+
+    ``request`` (usually called from a SIGTERM/SIGINT handler) starts the
+    clock. Phases that wait for something (in-flight updates, queued
+    messages) share ``timeout`` seconds and ask ``remaining`` how much is
+    left; flushing buffered writes always runs, so the total can exceed the
+    budget by the time those writes take. ``mark`` closes the current phase.
+    """
+
+    def __init__(self, timeout: float) -> None:
+        """Initialize shutdown."""
+        self.timeout = timeout
+        self.started: Optional[float] = None
+        self.phases: list[tuple[str, float]] = []
+        self._last = 0.0
+        self._requested = asyncio.Event()
+
+    @property
+    def requested(self) -> bool:
+        """Whether shutdown has been requested."""
+        return self._requested.is_set()
+
+    def request(self) -> None:
+        """Start shutting down (repeated requests are ignored)."""
+        if self.requested:
+            return
+        self.started = self._last = time.perf_counter()
+        self._requested.set()
+        logger.info("Shutting down, waiting up to %.1fs for in-flight work", self.timeout)
+
+    async def wait(self, task: Optional[asyncio.Task] = None) -> None:
+        """Wait until shutdown is requested or, if given, ``task`` finishes."""
+        if task is None:
+            await self._requested.wait()
+            return
+        waiter = asyncio.create_task(self._requested.wait())
+        try:
+            await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+
+    def remaining(self) -> float:
+        """Seconds left of the waiting budget."""
+        if self.started is None:
+            return self.timeout
+        return max(0.0, self.started + self.timeout - time.perf_counter())
+
+    def mark(self, phase: str) -> None:
+        """Close the current phase under the given name."""
+        if self.started is None:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def elapsed(self) -> float:
+        """Seconds since shutdown was requested."""
+        if self.started is None:
+            return 0.0
+        return time.perf_counter() - self.started
+
+    def report(self) -> str:
+        """Format the phases as one line."""
+        return ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases)
+
+
+async def drain_tasks(tasks: Collection[asyncio.Task], timeout: float, what: str) -> None:
+    """Wait up to ``timeout`` seconds for tasks to finish, then cancel the rest."""
+    unfinished = set(tasks)
+    if not unfinished:
+        return
+    logger.info("Waiting for %d %s to finish", len(unfinished), what)
+    if timeout > 0:
+        _, unfinished = await asyncio.wait(unfinished, timeout=timeout)
+    if unfinished:
+        for task in unfinished:
+            task.cancel()
+        # Let cancelled handlers roll back their transactions before the pool is closed
+        await asyncio.wait(unfinished)
+        logger.warning("Cancelled %d %s on shutdown", len(unfinished), what)
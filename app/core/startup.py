@@ -0,0 +1,64 @@
+"""Startup timing report."""
+import logging
+import os
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def get_process_age() -> Optional[float]:
+    """Get seconds since this process was started by the OS (Linux only)."""
+    try:
+        with open("/proc/self/stat", encoding="ascii") as file:
+            # The command name may contain spaces; fields after it are fixed
+            fields = file.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", encoding="ascii") as file:
+            uptime = float(file.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """
+    Records how long each startup phase took.
+
+    ``mark`` closes the current phase. The report includes the time the
+    interpreter spent before the timer was created (when the OS exposes the
+    process start time) and, once ``first_update`` is called, the time until
+    the first update was processed.
+    """
+
+    def __init__(self) -> None:
+        """Start timing."""
+        self.started = time.perf_counter()
+        self.interpreter = get_process_age()
+        self.phases: list[tuple[str, float]] = []
+        self._last = self.started
+        self._first_update: Optional[float] = None
+
+    def mark(self, phase: str) -> None:
+        """Close the current phase under the given name."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def elapsed(self) -> float:
+        """Seconds since the process started (or since the timer was created)."""
+        return (self.interpreter or 0.0) + time.perf_counter() - self.started
+
+    def report(self) -> str:
+        """Format the phases as one line."""
+        parts = []
+        if self.interpreter is not None:
+            parts.append(f"interpreter {self.interpreter:.2f}s")
+        parts += [f"{phase} {seconds:.2f}s" for phase, seconds in self.phases]
+        return ", ".join(parts)
+
+    def first_update(self) -> None:
+        """Log the full report when the first update has been processed."""
+        if self._first_update is not None:
+            return
+        self._first_update = self.elapsed()
+        logger.info("First update processed %.2fs after start (%s)", self._first_update, self.report())
@@ -1,11 +1,37 @@
 """Database base configuration."""
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+import logging
+import re
+import sqlite3
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional
+
+from sqlalchemy import AsyncAdaptedQueuePool, Connection, event, inspect, make_url, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 
 from app.core.settings import Settings
 
+if TYPE_CHECKING:
+    from alembic.config import Config
+
+logger = logging.getLogger(__name__)
+
 Base = declarative_base()
 
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+# `revision = "..."` and `down_revision = "..."` lines of migration files
+REVISION_PATTERN = re.compile(r"""^(revision|down_revision)\b[^=\n]*=\s*(?:["']([^"']+)["']|None)""", re.MULTILINE)
+
+# Bound parameters allowed in one statement (SQLite before 3.32 allows only 999)
+MAX_BOUND_PARAMETERS = {
+    "sqlite": 32766 if sqlite3.sqlite_version_info >= (3, 32) else 999,
+    "postgresql": 32767,
+}
+
+# Global engine shared by the whole process (will be initialized on first use)
+_engine: Optional[AsyncEngine] = None
+
 
 def get_database_url(settings: Settings) -> str:
     """Get database URL from settings."""
@@ -17,22 +43,188 @@ def get_database_url(settings: Settings) -> str:
         return "sqlite+aiosqlite:///./data/app.db"
 
 
+def create_engine(settings: Settings) -> AsyncEngine:
+    """
+    Create an engine tuned for the configured database.
+
+    Pool size, overflow and pre-ping come from settings. SQLite connections get
+    WAL journaling, synchronous=NORMAL, a busy timeout and memory-mapped I/O;
+    asyncpg gets a prepared statement cache.
+    """
+    url = make_url(get_database_url(settings))
+    kwargs: dict[str, Any] = {"echo": False, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+
+    is_sqlite = url.get_backend_name() == "sqlite"
+    in_memory = is_sqlite and url.database in (None, "", ":memory:")
+    if not in_memory:
+        # In-memory SQLite uses a single static connection without a pool
+        kwargs["pool_size"] = settings.DB_POOL_SIZE
+        kwargs["max_overflow"] = settings.DB_MAX_OVERFLOW
+        if is_sqlite:
+            # aiosqlite defaults to NullPool: a new connection (and PRAGMAs) per checkout
+            kwargs["poolclass"] = AsyncAdaptedQueuePool
+    if url.get_driver_name() == "asyncpg" and "prepared_statement_cache_size" not in url.query:
+        url = url.update_query_dict(
+            {"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)}
+        )
+
+    engine = create_async_engine(url, **kwargs)
+
+    if is_sqlite:
+        pragmas = [
+            f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+            "PRAGMA synchronous=NORMAL",
+            f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        ]
+        if not in_memory:
+            pragmas.insert(0, "PRAGMA journal_mode=WAL")
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    return engine
+
+
+def get_engine(settings: Settings) -> AsyncEngine:
+    """Get or create the process-wide engine."""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(settings)
+    return _engine
+
+
+async def dispose_engine() -> None:
+    """Close all pooled connections of the process-wide engine."""
+    if _engine is not None:
+        await _engine.dispose()
+
+
+def dialect_insert(session: AsyncSession, model: Any) -> Any:
+    """
+    Build an INSERT for the session's dialect.
+
+    The dialect-specific insert supports ON CONFLICT ... DO UPDATE, which is
+    spelled the same way on SQLite and PostgreSQL.
+
+    Args:
+        session: Session whose bind determines the dialect
+        model: Mapped class or table to insert into
+
+    Returns:
+        Dialect-specific Insert construct
+    """
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported for dialect {dialect_name}")
+    return insert(model)
+
+
+def chunk_rows(session: AsyncSession, rows: list[dict]) -> Iterator[list[dict]]:
+    """
+    Split the rows of a multi-row INSERT into statements that fit the bound parameter limit.
+
+    Every value of a row is one bound parameter, so a statement takes as
+    many rows as fit in the dialect's limit given the number of columns.
+
+    Args:
+        session: Session whose bind determines the dialect
+        rows: Rows with the same keys
+
+    Yields:
+        Consecutive slices of ``rows``
+    """
+    if not rows:
+        return
+    limit = MAX_BOUND_PARAMETERS[session.get_bind().dialect.name]
+    size = max(1, limit // len(rows[0]))
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def get_alembic_config() -> "Config":
+    """Get Alembic config pointing at the bundled migrations."""
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    return config
+
+
+def get_head_revision() -> Optional[str]:
+    """
+    Get the latest migration revision.
+
+    Read from the migration files without importing Alembic, which keeps
+    startup fast when the schema is up to date; branched histories are left
+    to Alembic.
+    """
+    revisions: set[str] = set()
+    parents: set[str] = set()
+    for path in (MIGRATIONS_DIR / "versions").glob("*.py"):
+        for match in REVISION_PATTERN.finditer(path.read_text(encoding="utf-8")):
+            name, value = match.group(1), match.group(2)
+            if value:
+                (revisions if name == "revision" else parents).add(value)
+    heads = revisions - parents
+    if len(heads) == 1:
+        return heads.pop()
+
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(get_alembic_config()).get_current_head()
+
+
+def _get_current_revision(conn: Connection) -> Optional[str]:
+    """Get the revision the database is stamped with."""
+    if not inspect(conn).has_table("alembic_version"):
+        return None
+    versions = conn.execute(text("SELECT version_num FROM alembic_version")).scalars().all()
+    return versions[0] if len(versions) == 1 else None
+
+
+def _upgrade_to_head(conn: Connection) -> None:
+    """Apply pending migrations on an open connection."""
+    from alembic import command
+
+    config = get_alembic_config()
+    config.attributes["connection"] = conn
+    command.upgrade(config, "head")
+
+
 async def init_db(settings: Settings) -> None:
-    """Initialize database."""
-    database_url = get_database_url(settings)
-    engine = create_async_engine(database_url, echo=False)
+    """
+    Initialize database.
 
-    # Create tables
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    Only compares the database revision with the latest migration. Pending
+    migrations are applied when DB_AUTO_MIGRATE is enabled; otherwise startup
+    fails until ``alembic upgrade head`` has been run.
+    """
+    engine = get_engine(settings)
 
-    # Close engine (it will be recreated when needed)
-    await engine.dispose()
+    async with engine.connect() as conn:
+        current = await conn.run_sync(_get_current_revision)
+    head = get_head_revision()
+    if current == head:
+        return
+
+    if not settings.DB_AUTO_MIGRATE:
+        raise RuntimeError(
+            f"Database schema is at revision {current}, expected {head}. "
+            "Run `alembic upgrade head`."
+        )
+    logger.info("Migrating database from revision %s to %s", current, head)
+    async with engine.begin() as conn:
+        await conn.run_sync(_upgrade_to_head)
 
 
 def create_session_maker(settings: Settings) -> async_sessionmaker[AsyncSession]:
     """Create session maker for database."""
-    database_url = get_database_url(settings)
-    engine = create_async_engine(database_url, echo=False)
-    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
+    return async_sessionmaker(get_engine(settings), class_=AsyncSession, expire_on_commit=False)
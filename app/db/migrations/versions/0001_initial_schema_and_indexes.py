@@ -0,0 +1,180 @@
+"""Initial schema and indexes for hot queries
+
+Creates the tables on a fresh database. Databases created earlier by
+``Base.metadata.create_all`` already have the tables; for them only the
+index plan is applied:
+
+- karma: unique (chat_id, user_id) for get_karma and the karma UPSERT
+  (duplicate rows are merged first), (chat_id, karma) for get_top_karma
+- warnings: (chat_id, user_id, created_at) for get_warn_count and
+  remove_warning
+- greetings: created_at for the cooldown preload and pruning
+
+Single-column indexes covered by the new ones are dropped.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Indexes created by create_all for index=True columns that are now redundant
+LEGACY_INDEXES = {
+    "karma": ["ix_karma_user_id", "ix_karma_chat_id"],
+    "warnings": ["ix_warnings_user_id", "ix_warnings_chat_id"],
+    "greetings": ["ix_greetings_user_id", "ix_greetings_chat_id"],
+}
+
+
+def _timestamps() -> list[sa.Column]:
+    """created_at / updated_at columns."""
+    return [
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    ]
+
+
+def _create_missing_tables(existing: set[str]) -> None:
+    """Create tables that do not exist yet."""
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.BigInteger(), nullable=False),
+            sa.Column("username", sa.String(length=255), nullable=True),
+            sa.Column("first_name", sa.String(length=255), nullable=True),
+            sa.Column("last_name", sa.String(length=255), nullable=True),
+            *_timestamps(),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if "chats" not in existing:
+        op.create_table(
+            "chats",
+            sa.Column("id", sa.BigInteger(), nullable=False),
+            sa.Column("title", sa.String(length=255), nullable=True),
+            sa.Column("type", sa.String(length=50), nullable=False),
+            *_timestamps(),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if "karma" not in existing:
+        op.create_table(
+            "karma",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_id", sa.BigInteger(), nullable=False),
+            sa.Column("chat_id", sa.BigInteger(), nullable=False),
+            sa.Column("karma", sa.Integer(), nullable=False),
+            *_timestamps(),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("chat_id", "user_id", name="uq_karma_chat_user"),
+            sqlite_autoincrement=True,
+        )
+    if "karma_transactions" not in existing:
+        op.create_table(
+            "karma_transactions",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("from_user_id", sa.BigInteger(), nullable=False),
+            sa.Column("to_user_id", sa.BigInteger(), nullable=False),
+            sa.Column("chat_id", sa.BigInteger(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sqlite_autoincrement=True,
+        )
+        for column in ("from_user_id", "to_user_id", "chat_id"):
+            op.create_index(f"ix_karma_transactions_{column}", "karma_transactions", [column])
+    if "warnings" not in existing:
+        op.create_table(
+            "warnings",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_id", sa.BigInteger(), nullable=False),
+            sa.Column("chat_id", sa.BigInteger(), nullable=False),
+            sa.Column("admin_id", sa.BigInteger(), nullable=False),
+            sa.Column("reason", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sqlite_autoincrement=True,
+        )
+    if "greetings" not in existing:
+        op.create_table(
+            "greetings",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("user_id", sa.BigInteger(), nullable=False),
+            sa.Column("chat_id", sa.BigInteger(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sqlite_autoincrement=True,
+        )
+
+
+def _ensure_karma_unique_key(inspector: sa.Inspector) -> None:
+    """Merge duplicate karma rows and add the unique key on databases from create_all."""
+    unique_names = {c["name"] for c in inspector.get_unique_constraints("karma")}
+    unique_names.update(i["name"] for i in inspector.get_indexes("karma") if i["unique"])
+    if "uq_karma_chat_user" in unique_names:
+        return
+
+    bind = op.get_bind()
+    karma = sa.table(
+        "karma",
+        sa.column("id", sa.Integer),
+        sa.column("user_id", sa.BigInteger),
+        sa.column("chat_id", sa.BigInteger),
+        sa.column("karma", sa.Integer),
+    )
+    duplicates = bind.execute(
+        sa.select(karma.c.chat_id, karma.c.user_id, sa.func.min(karma.c.id), sa.func.sum(karma.c.karma))
+        .group_by(karma.c.chat_id, karma.c.user_id)
+        .having(sa.func.count(karma.c.id) > 1)
+    ).all()
+    for chat_id, user_id, keep_id, total in duplicates:
+        bind.execute(karma.update().where(karma.c.id == keep_id).values(karma=total))
+        bind.execute(
+            karma.delete().where(
+                karma.c.chat_id == chat_id, karma.c.user_id == user_id, karma.c.id != keep_id
+            )
+        )
+    op.create_index("uq_karma_chat_user", "karma", ["chat_id", "user_id"], unique=True)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    existing = set(inspector.get_table_names())
+    _create_missing_tables(existing)
+
+    if "karma" in existing:
+        _ensure_karma_unique_key(inspector)
+
+    for table, names in LEGACY_INDEXES.items():
+        if table not in existing:
+            continue
+        present = {index["name"] for index in inspector.get_indexes(table)}
+        for name in names:
+            if name in present:
+                op.drop_index(name, table_name=table)
+
+    op.create_index("ix_karma_chat_karma", "karma", ["chat_id", "karma"])
+    op.create_index(
+        "ix_warnings_chat_user_created", "warnings", ["chat_id", "user_id", "created_at"]
+    )
+    op.create_index("ix_greetings_created_at", "greetings", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_greetings_created_at", table_name="greetings")
+    op.drop_index("ix_warnings_chat_user_created", table_name="warnings")
+    op.drop_index("ix_karma_chat_karma", table_name="karma")
+    op.drop_table("greetings")
+    op.drop_table("warnings")
+    op.drop_table("karma_transactions")
+    op.drop_table("karma")
+    op.drop_table("chats")
+    op.drop_table("users")
@@ -0,0 +1,39 @@
+"""Denormalized warning counters
+
+Adds ``warn_counters`` with one row per (chat_id, user_id) holding the number
+of warnings, and fills it from the existing warnings.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "warn_counters",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("chat_id", "user_id"),
+    )
+    op.execute(
+        "INSERT INTO warn_counters (chat_id, user_id, count) "
+        "SELECT chat_id, user_id, COUNT(id) FROM warnings GROUP BY chat_id, user_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("warn_counters")
@@ -0,0 +1,52 @@
+"""Daily karma rollups
+
+Adds ``karma_daily_stats`` with karma given and received per (chat_id, day,
+user_id), and ``rollup_watermarks`` tracking the backfill of existing karma
+transactions. Transactions written from now on are rolled up as they are
+written; the ones already present (ids up to the current maximum) are rolled
+up in chunks by a background job after startup.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "karma_daily_stats",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("given", sa.Integer(), nullable=False),
+        sa.Column("received", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("chat_id", "day", "user_id"),
+    )
+    op.create_table(
+        "rollup_watermarks",
+        sa.Column("name", sa.String(length=64), nullable=False),
+        sa.Column("position", sa.BigInteger(), nullable=False),
+        sa.Column("target", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.execute(
+        "INSERT INTO rollup_watermarks (name, position, target) "
+        "SELECT 'karma_daily_stats', 0, COALESCE(MAX(id), 0) FROM karma_transactions"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rollup_watermarks")
+    op.drop_table("karma_daily_stats")
@@ -0,0 +1,34 @@
+"""Index karma transactions by chat and time
+
+Adds (chat_id, created_at) on ``karma_transactions`` so the sliding-window
+leaderboards (/top week, /top month) load a chat's last month of
+transactions with a range scan. The single-column chat_id index is covered
+by the new one and dropped.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_karma_transactions_chat_created", "karma_transactions", ["chat_id", "created_at"]
+    )
+    op.drop_index("ix_karma_transactions_chat_id", table_name="karma_transactions")
+
+
+def downgrade() -> None:
+    op.create_index("ix_karma_transactions_chat_id", "karma_transactions", ["chat_id"])
+    op.drop_index("ix_karma_transactions_chat_created", table_name="karma_transactions")
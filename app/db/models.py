@@ -1,8 +1,8 @@
 """Database models."""
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
-from sqlalchemy import BigInteger, DateTime, Integer, String, Text, func
+from sqlalchemy import BigInteger, Date, DateTime, Index, Integer, String, Text, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.base import Base
@@ -43,15 +43,19 @@ class Karma(Base):
     __tablename__ = "karma"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
-    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     karma: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.now(), onupdate=func.now()
     )
 
-    __table_args__ = ({"sqlite_autoincrement": True},)
+    __table_args__ = (
+        UniqueConstraint("chat_id", "user_id", name="uq_karma_chat_user"),
+        Index("ix_karma_chat_karma", "chat_id", "karma"),
+        {"sqlite_autoincrement": True},
+    )
 
 
 class KarmaTransaction(Base):
@@ -62,10 +66,36 @@ class KarmaTransaction(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     from_user_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
     to_user_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
-    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
-    __table_args__ = ({"sqlite_autoincrement": True},)
+    __table_args__ = (
+        Index("ix_karma_transactions_chat_created", "chat_id", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class KarmaDailyStat(Base):
+    """Karma daily rollup model (karma given and received per user in chat per day)."""
+
+    __tablename__ = "karma_daily_stats"
+
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    given: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    received: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class RollupWatermark(Base):
+    """Rollup backfill progress model (source rows up to ``position`` are rolled up)."""
+
+    __tablename__ = "rollup_watermarks"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    position: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+    # Rows above this were rolled up when they were written
+    target: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
 
 
 class Warning(Base):
@@ -74,13 +104,16 @@ class Warning(Base):
     __tablename__ = "warnings"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
-    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     admin_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     reason: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
-    __table_args__ = ({"sqlite_autoincrement": True},)
+    __table_args__ = (
+        Index("ix_warnings_chat_user_created", "chat_id", "user_id", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
 
 
 class Greeting(Base):
@@ -89,9 +122,18 @@ class Greeting(Base):
     __tablename__ = "greetings"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
-    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), index=True)
 
     __table_args__ = ({"sqlite_autoincrement": True},)
 
+
+class WarnCounter(Base):
+    """Warning counter model (denormalized count of warnings per user in chat)."""
+
+    __tablename__ = "warn_counters"
+
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
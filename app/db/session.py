@@ -1,8 +1,10 @@
 """Database session management."""
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Callable
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session, SessionTransaction, UOWTransaction
 
 from app.core.settings import Settings
 from app.db.base import create_session_maker
@@ -33,3 +35,65 @@ async def get_db_session(settings: Settings) -> AsyncGenerator[AsyncSession, Non
         finally:
             await session.close()
 
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement_writes(orm_execute_state: ORMExecuteState) -> None:
+    """Mark the session as written to when it executes INSERT/UPDATE/DELETE."""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush_writes(session: Session, flush_context: UOWTransaction) -> None:
+    """Mark the session as written to when it flushes ORM changes."""
+    session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _reset_writes(session: Session) -> None:
+    """Forget writes that were committed or rolled back."""
+    session.info.pop("has_writes", None)
+
+
+def has_writes(session: AsyncSession) -> bool:
+    """Check if the session wrote anything that needs a commit."""
+    return bool(
+        session.info.get("has_writes") or session.new or session.dirty or session.deleted
+    )
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """
+    Run ``callback`` once the session's current transaction is committed.
+
+    Used to publish writes to in-memory caches only when they are durable;
+    callbacks are dropped if the transaction is rolled back.
+    """
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+def after_transaction_end(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """Run ``callback`` once the session's current transaction ends: committed, rolled back or closed."""
+    session.info.setdefault("after_transaction_end", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session: Session) -> None:
+    """Run the callbacks registered for the committed transaction."""
+    if session.in_nested_transaction():
+        # A savepoint was released; the transaction may still roll back
+        return
+    for callback in session.info.pop("after_commit", ()):
+        callback()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _end_transaction(session: Session, transaction: SessionTransaction) -> None:
+    """Drop the commit callbacks of a transaction that did not commit and run its end callbacks."""
+    if transaction.parent is not None:
+        return
+    session.info.pop("after_commit", None)
+    for callback in session.info.pop("after_transaction_end", ()):
+        callback()
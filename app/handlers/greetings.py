@@ -1,24 +1,22 @@
 """Greeting handlers."""
-from datetime import datetime, timedelta
-
 from aiogram import Router
 from aiogram.filters import ChatMemberUpdatedFilter, KICKED, LEFT, MEMBER, RESTRICTED
 from aiogram.types import ChatMemberUpdated, Message
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.settings import Settings
-from app.db.models import Greeting
-from app.db.session import get_db_session
+from app.services.greeting_service import get_greeting_service
 
 router = Router()
 
 
 def get_greeting_router(settings: Settings) -> Router:
     """Get greeting router with settings."""
-    cooldown_minutes = settings.GREETING_COOLDOWN_MINUTES
+    greeting_service = get_greeting_service(settings)
     greeting_chat_ids = settings.get_greeting_chat_ids()
 
     @router.chat_member(ChatMemberUpdatedFilter(member_status_changed=(LEFT | KICKED) >> MEMBER))
-    async def greet_new_member(event: ChatMemberUpdated) -> None:
+    async def greet_new_member(event: ChatMemberUpdated, session: AsyncSession) -> None:
         """Greet new member."""
         if not event.new_chat_member.user:
             return
@@ -34,26 +32,13 @@ def get_greeting_router(settings: Settings) -> Router:
         if user.is_bot:
             return
 
-        # Check cooldown
-        async with get_db_session(settings) as session:
-            cooldown_time = datetime.utcnow() - timedelta(minutes=cooldown_minutes)
-            from sqlalchemy import select
-
-            stmt = select(Greeting).where(
-                Greeting.user_id == user.id,
-                Greeting.chat_id == chat.id,
-                Greeting.created_at >= cooldown_time,
-            )
-
-            result = await session.execute(stmt)
-            existing = result.scalar_one_or_none()
-            if existing:
-                return  # Cooldown active
+        # Check cooldown (in memory, rebuilt from the database after restarts)
+        await greeting_service.ensure_loaded()
+        if not greeting_service.try_start_cooldown(chat.id, user.id):
+            return  # Cooldown active
 
-            # Add greeting record
-            greeting = Greeting(user_id=user.id, chat_id=chat.id)
-            session.add(greeting)
-            await session.commit()
+        # Add greeting record
+        await greeting_service.record(session, chat.id, user.id)
 
         # Send greeting
         greeting_text = f"👋 Добро пожаловать, {user.first_name or 'пользователь'}!"
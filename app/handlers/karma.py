@@ -1,14 +1,22 @@
 """Karma handlers."""
+import asyncio
+import html
 import re
 
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.bot.middlewares import OutboundPriorityMiddleware
+from app.bot.outbound import Priority, get_outbound_scheduler
 from app.bot.utils import get_topic_reply_kwargs
 from app.core.settings import Settings
-from app.db.session import get_db_session
+from app.services.karma_digest import get_karma_digest
 from app.services.karma_service import KarmaService
+from app.services.karma_stats import KarmaStatsService
+from app.services.member_cache import get_chat_member
+from app.services.user_directory import get_user_directory
 
 router = Router()
 
@@ -46,12 +54,75 @@ KARMA_KEYWORDS = [
 ]
 
 
+def compile_keyword_pattern(keywords: list[str]) -> re.Pattern[str]:
+    """
+    Compile keywords into a single case-insensitive alternation regex.
+
+    Keywords match only as whole words, so "thank" no longer fires on
+    "thankless". Words inside multi-word phrases may be separated by any run of
+    punctuation or whitespace ("спасибо, большое"), which replaces the old
+    punctuation-stripping normalization pass.
+
+    Args:
+        keywords: Keywords and phrases to match
+
+    Returns:
+        Compiled pattern that finds any keyword in one pass over the text
+    """
+    alternatives = sorted(
+        {r"\W+".join(re.escape(word) for word in keyword.lower().split()) for keyword in keywords},
+        key=len,
+        reverse=True,
+    )
+    return re.compile(r"(?<!\w)(?:" + "|".join(alternatives) + r")(?!\w)", re.IGNORECASE)
+
+
+KARMA_PATTERN = compile_keyword_pattern(KARMA_KEYWORDS)
+
+# /top arguments -> sliding window
+TOP_WINDOWS = {
+    "week": "week",
+    "неделя": "week",
+    "month": "month",
+    "месяц": "month",
+}
+TOP_WINDOW_TITLES = {"week": "неделю", "month": "месяц"}
+
+
+def has_karma_keyword(text: str) -> bool:
+    """Check if text contains any karma keyword as a whole word."""
+    return KARMA_PATTERN.search(text) is not None
+
+
 def get_karma_router(settings: Settings) -> Router:
     """Get karma router with settings."""
     karma_service = KarmaService(settings)
+    karma_stats_service = KarmaStatsService(settings)
+    user_directory = get_user_directory(settings)
+    karma_digest = get_karma_digest(settings)
+    outbound = get_outbound_scheduler(settings) if settings.OUTBOUND_ENABLED else None
+    # Karma replies yield to moderation replies when a chat hits its rate limit
+    router.message.middleware(OutboundPriorityMiddleware(Priority.LOW))
+
+    async def get_names(message: Message, session: AsyncSession, user_ids: list[int]) -> dict[int, str]:
+        """Get first names from the user directory, asking Telegram only about missing users."""
+        user_names = await user_directory.get_names(session, user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in user_names]
+        if missing:
+            members = await asyncio.gather(
+                *(get_chat_member(message.bot, message.chat.id, user_id) for user_id in missing),
+                return_exceptions=True,
+            )
+            for user_id, member in zip(missing, members):
+                if isinstance(member, BaseException):
+                    continue
+                user_directory.observe(member.user)
+                if member.user.first_name:
+                    user_names[user_id] = member.user.first_name
+        return user_names
 
     @router.message(Command("karma"))
-    async def cmd_karma(message: Message) -> None:
+    async def cmd_karma(message: Message, session: AsyncSession) -> None:
         """Handle /karma command."""
         if not message.from_user or not message.chat:
             return
@@ -70,10 +141,9 @@ def get_karma_router(settings: Settings) -> Router:
                 # For now, just use current user
                 pass
 
-        async with get_db_session(settings) as session:
-            karma = await karma_service.get_karma(
-                session, target_user_id, message.chat.id
-            )
+        karma = await karma_service.get_karma(
+            session, target_user_id, message.chat.id
+        )
 
         target_name = message.from_user.first_name or "пользователь"
         if message.reply_to_message and message.reply_to_message.from_user:
@@ -81,39 +151,87 @@ def get_karma_router(settings: Settings) -> Router:
                 message.reply_to_message.from_user.first_name or "пользователь"
             )
 
-        await message.answer(f"📊 Карма {target_name}: {karma}", **get_topic_reply_kwargs(message))
+        await message.answer(f"📊 Карма {html.escape(target_name)}: {karma}", **get_topic_reply_kwargs(message))
 
     @router.message(Command("top"))
-    async def cmd_top(message: Message) -> None:
-        """Handle /top command."""
+    async def cmd_top(message: Message, session: AsyncSession) -> None:
+        """Handle /top command (/top week and /top month rank karma received within the window)."""
         if not message.chat:
             return
 
-        async with get_db_session(settings) as session:
-            top_users = await karma_service.get_top_karma(
-                session, message.chat.id, limit=10
-            )
+        window = None
+        parts = message.text.split() if message.text else []
+        if len(parts) > 1:
+            window = TOP_WINDOWS.get(parts[1].lower())
+            if window is None:
+                await message.answer(
+                    "❌ Использование: /top, /top week или /top month", **get_topic_reply_kwargs(message)
+                )
+                return
 
+        top_users = await karma_service.get_top_karma(
+            session, message.chat.id, limit=10, window=window
+        )
         if not top_users:
-            await message.answer("📊 Пока нет данных о карме в этом чате.", **get_topic_reply_kwargs(message))
+            if window is None:
+                await message.answer("📊 Пока нет данных о карме в этом чате.", **get_topic_reply_kwargs(message))
+            else:
+                await message.answer(
+                    f"📊 За {TOP_WINDOW_TITLES[window]} в этом чате не начисляли карму.",
+                    **get_topic_reply_kwargs(message),
+                )
             return
 
+        user_names = await get_names(message, session, [user_id for user_id, _ in top_users])
+
         # Build top list
-        top_text = "🏆 <b>Топ-10 по карме:</b>\n\n"
+        if window is None:
+            top_text = "🏆 <b>Топ-10 по карме:</b>\n\n"
+        else:
+            top_text = f"🏆 <b>Топ-10 по карме за {TOP_WINDOW_TITLES[window]}:</b>\n\n"
         for idx, (user_id, karma) in enumerate(top_users, 1):
-            # Try to get user info
-            try:
-                member = await message.bot.get_chat_member(message.chat.id, user_id)
-                user_name = member.user.first_name or f"User {user_id}"
-            except Exception:
-                user_name = f"User {user_id}"
-
+            user_name = html.escape(user_names.get(user_id) or f"User {user_id}")
             top_text += f"{idx}. {user_name}: {karma} 🎯\n"
 
         await message.answer(top_text, **get_topic_reply_kwargs(message))
 
+    @router.message(Command("karmastats"))
+    async def cmd_karmastats(message: Message, session: AsyncSession) -> None:
+        """Handle /karmastats command."""
+        if not message.chat:
+            return
+
+        stats = await karma_stats_service.get_stats(session, message.chat.id)
+        if not any(period.karma for period in stats.periods):
+            await message.answer(
+                "📈 За последний месяц в этом чате не начисляли карму.", **get_topic_reply_kwargs(message)
+            )
+            return
+
+        text = "📈 <b>Статистика кармы</b>\n\n"
+        for period in stats.periods:
+            text += f"За {period.days} дн.: +{period.karma}"
+            if period.previous_karma:
+                change = round((period.karma - period.previous_karma) * 100 / period.previous_karma)
+                text += f" ({change:+d}% к предыдущим {period.days} дн.)"
+            text += f", благодарили {period.givers} уч.\n"
+
+        if stats.top_givers:
+            user_names = await get_names(message, session, [user_id for user_id, _ in stats.top_givers])
+            text += f"\n🤝 <b>Чаще всех благодарят ({stats.periods[-1].days} дн.):</b>\n"
+            for idx, (user_id, given) in enumerate(stats.top_givers, 1):
+                user_name = html.escape(user_names.get(user_id) or f"User {user_id}")
+                text += f"{idx}. {user_name}: {given}\n"
+
+        if stats.busiest_days:
+            text += "\n📅 <b>Самые активные дни:</b>\n"
+            for day, karma in stats.busiest_days:
+                text += f"{day:%d.%m.%Y}: +{karma}\n"
+
+        await message.answer(text, **get_topic_reply_kwargs(message))
+
     @router.message()
-    async def handle_karma_message(message: Message) -> None:
+    async def handle_karma_message(message: Message, session: AsyncSession) -> None:
         """Handle karma from messages."""
         if not message.from_user or not message.chat or not message.text:
             return
@@ -126,23 +244,8 @@ def get_karma_router(settings: Settings) -> Router:
         if message.text.startswith("/"):
             return
 
-        text_lower = message.text.lower()
-        
-        # Normalize text (remove extra spaces, punctuation for better matching)
-        text_normalized = re.sub(r'[^\w\s]', ' ', text_lower)  # Replace punctuation with spaces
-        text_normalized = ' '.join(text_normalized.split())  # Normalize multiple spaces to single
-
         # Check if message contains karma keywords (including multi-word phrases)
-        # Check both original and normalized text for better matching
-        has_keyword = False
-        for keyword in KARMA_KEYWORDS:
-            keyword_lower = keyword.lower()
-            # Check in both original and normalized text
-            if keyword_lower in text_lower or keyword_lower in text_normalized:
-                has_keyword = True
-                break
-        
-        if not has_keyword:
+        if not has_karma_keyword(message.text):
             return
 
         # Determine target user
@@ -169,8 +272,8 @@ def get_karma_router(settings: Settings) -> Router:
 
         # Can't give karma to bots
         try:
-            target_member = await message.bot.get_chat_member(
-                message.chat.id, target_user_id
+            target_member = await get_chat_member(
+                message.bot, message.chat.id, target_user_id
             )
             if target_member.user.is_bot:
                 return
@@ -178,13 +281,14 @@ def get_karma_router(settings: Settings) -> Router:
             return
 
         # Add karma
-        async with get_db_session(settings) as session:
-            success = await karma_service.add_karma(
-                session,
-                message.from_user.id,
-                target_user_id,
-                message.chat.id,
-            )
+        success = await karma_service.add_karma(
+            session,
+            message.from_user.id,
+            target_user_id,
+            message.chat.id,
+        )
+        # Committed before calling Telegram, see DbSessionMiddleware
+        await session.commit()
 
         if success:
             target_name = (
@@ -192,7 +296,19 @@ def get_karma_router(settings: Settings) -> Router:
                 if message.reply_to_message
                 else "пользователю"
             )
-            await message.reply(f"✅ Карма начислена {target_name}! (+1)", **get_topic_reply_kwargs(message))
+            if karma_digest:
+                karma_digest.add(
+                    message.bot, message.chat.id, message.message_thread_id, target_user_id, target_name
+                )
+            else:
+                confirmation = message.reply(
+                    f"✅ Карма начислена {html.escape(target_name)}! (+1)", **get_topic_reply_kwargs(message)
+                )
+                if outbound:
+                    # Sent once the chat's rate limit allows, without holding up the handler
+                    outbound.send_later(message.bot, confirmation)
+                else:
+                    await confirmation
 
     return router
 
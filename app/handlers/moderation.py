@@ -1,30 +1,46 @@
 """Moderation handlers."""
+import asyncio
+import html
+import logging
 from datetime import timedelta
 
 from aiogram import Bot, Router
 from aiogram.filters import Command
 from aiogram.types import Message
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.bot.middlewares import OutboundPriorityMiddleware
+from app.bot.outbound import Priority
 from app.bot.utils import get_topic_reply_kwargs
+from app.core.profiling import get_profiler
 from app.core.settings import Settings
-from app.db.session import get_db_session
 from app.services.admin_service import can_restrict_members, check_message_from_admin
+from app.services.member_cache import get_chat_member, get_member_cache
 from app.services.warn_service import WarnService
 
+logger = logging.getLogger(__name__)
+
 router = Router()
 
+# Tasks that report finished profiles back to the chat
+_profile_reports: set[asyncio.Task] = set()
+
 
 def get_moderation_router(bot: Bot, settings: Settings) -> Router:
     """Get moderation router with bot and settings."""
     warn_service = WarnService(settings)
+    # Moderation replies go out before karma confirmations
+    router.message.middleware(OutboundPriorityMiddleware(Priority.HIGH))
 
     @router.message(Command("warn"))
-    async def cmd_warn(message: Message) -> None:
+    async def cmd_warn(message: Message, session: AsyncSession) -> None:
         """Handle /warn command. Usage: /warn [reply]"""
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info(f"/warn command received from user {message.from_user.id if message.from_user else 'unknown'} in chat {message.chat.id if message.chat else 'unknown'}")
-        
+        logger.debug(
+            "/warn command received from user %s in chat %s",
+            message.from_user.id if message.from_user else "unknown",
+            message.chat.id if message.chat else "unknown",
+        )
+
         if not message.from_user or not message.chat:
             logger.warning("No from_user or chat in message")
             return
@@ -32,12 +48,12 @@ def get_moderation_router(bot: Bot, settings: Settings) -> Router:
         # Check admin rights
         try:
             is_admin = await check_message_from_admin(message)
-            logger.info(f"Admin check result: {is_admin}")
+            logger.debug("Admin check result: %s", is_admin)
             if not is_admin:
                 await message.reply("❌ Эта команда доступна только администраторам!", **get_topic_reply_kwargs(message))
                 return
         except Exception as e:
-            logger.error(f"Error checking admin: {e}", exc_info=True)
+            logger.error("Error checking admin: %s", e, exc_info=True)
             await message.reply("❌ Ошибка при проверке прав администратора.", **get_topic_reply_kwargs(message))
             return
 
@@ -73,14 +89,15 @@ def get_moderation_router(bot: Bot, settings: Settings) -> Router:
 
         # Add warning
         try:
-            async with get_db_session(settings) as session:
-                warn_count = await warn_service.add_warning(
-                    session,
-                    target_user_id,
-                    message.chat.id,
-                    message.from_user.id,
-                    None,  # No reason
-                )
+            warn_count = await warn_service.add_warning(
+                session,
+                target_user_id,
+                message.chat.id,
+                message.from_user.id,
+                None,  # No reason
+            )
+            # Committed before calling Telegram, see DbSessionMiddleware
+            await session.commit()
 
             # Beautiful response message
             remaining = settings.WARN_LIMIT - warn_count
@@ -137,20 +154,21 @@ def get_moderation_router(bot: Bot, settings: Settings) -> Router:
                             until_date=int(mute_until),
                             permissions=mute_permissions,
                         )
+                        get_member_cache().invalidate(message.chat.id, target_user_id)
                         response += f"\n\n🔇 Пользователь получил мут на {settings.MUTE_HOURS} часов."
                     except Exception as e:
-                        logger.error(f"Failed to mute user: {e}", exc_info=True)
+                        logger.error("Failed to mute user: %s", e, exc_info=True)
                         response += f"\n\n⚠️ Не удалось замутить пользователя: {str(e)}"
                 else:
                     response += "\n\n⚠️ У бота нет прав для ограничения участников."
 
             await message.reply(response, **get_topic_reply_kwargs(message))
         except Exception as e:
-            logger.error(f"Error in /warn: {e}", exc_info=True)
+            logger.error("Error in /warn: %s", e, exc_info=True)
             await message.reply(f"❌ Ошибка при выдаче предупреждения: {str(e)}", **get_topic_reply_kwargs(message))
 
     @router.message(Command("warns"))
-    async def cmd_warns(message: Message) -> None:
+    async def cmd_warns(message: Message, session: AsyncSession) -> None:
         """Handle /warns command."""
         if not message.from_user or not message.chat:
             return
@@ -174,10 +192,9 @@ def get_moderation_router(bot: Bot, settings: Settings) -> Router:
         if not target_user_id:
             target_user_id = message.from_user.id
 
-        async with get_db_session(settings) as session:
-            warn_count = await warn_service.get_warn_count(
-                session, target_user_id, message.chat.id
-            )
+        warn_count = await warn_service.get_warn_count(
+            session, target_user_id, message.chat.id
+        )
 
         target_name = message.from_user.first_name or "пользователь"
         if message.reply_to_message and message.reply_to_message.from_user:
@@ -191,7 +208,7 @@ def get_moderation_router(bot: Bot, settings: Settings) -> Router:
         )
 
     @router.message(Command("unwarn"))
-    async def cmd_unwarn(message: Message) -> None:
+    async def cmd_unwarn(message: Message, session: AsyncSession) -> None:
         """Handle /unwarn command."""
         if not message.from_user or not message.chat:
             return
@@ -220,10 +237,11 @@ def get_moderation_router(bot: Bot, settings: Settings) -> Router:
             return
 
         # Remove warning
-        async with get_db_session(settings) as session:
-            warn_count = await warn_service.remove_warning(
-                session, target_user_id, message.chat.id
-            )
+        warn_count = await warn_service.remove_warning(
+            session, target_user_id, message.chat.id
+        )
+        # Committed before calling Telegram, see DbSessionMiddleware
+        await session.commit()
 
         target_name = "пользователю"
         if message.reply_to_message and message.reply_to_message.from_user:
@@ -236,6 +254,25 @@ def get_moderation_router(bot: Bot, settings: Settings) -> Router:
             **get_topic_reply_kwargs(message)
         )
 
+    @router.message(Command("rebuildwarns"))
+    async def cmd_rebuildwarns(message: Message, session: AsyncSession) -> None:
+        """Handle /rebuildwarns command. Recounts warning counters of the chat."""
+        if not message.from_user or not message.chat:
+            return
+
+        # Check admin rights
+        if not await check_message_from_admin(message):
+            await message.reply("❌ Эта команда доступна только администраторам!", **get_topic_reply_kwargs(message))
+            return
+
+        users = await warn_service.rebuild_counters(session, message.chat.id)
+        # Committed before calling Telegram, see DbSessionMiddleware
+        await session.commit()
+        await message.reply(
+            f"✅ Счётчики предупреждений пересчитаны. Пользователей с предупреждениями: {users}",
+            **get_topic_reply_kwargs(message)
+        )
+
     @router.message(Command("mute"))
     async def cmd_mute(message: Message) -> None:
         """Handle /mute command. Usage: /mute [reply] [hours] or /mute @username [hours]"""
@@ -321,7 +358,7 @@ def get_moderation_router(bot: Bot, settings: Settings) -> Router:
 
         # Can't mute bots
         try:
-            target_member = await bot.get_chat_member(message.chat.id, target_user_id)
+            target_member = await get_chat_member(bot, message.chat.id, target_user_id)
             if target_member.user.is_bot:
                 await message.reply("❌ Нельзя замутить бота!", **get_topic_reply_kwargs(message))
                 return
@@ -357,6 +394,7 @@ def get_moderation_router(bot: Bot, settings: Settings) -> Router:
                 until_date=int(mute_until),
                 permissions=mute_permissions,
             )
+            get_member_cache().invalidate(message.chat.id, target_user_id)
 
             hours_text = (
                 "час"
@@ -375,9 +413,7 @@ def get_moderation_router(bot: Bot, settings: Settings) -> Router:
 
             await message.reply(response, **get_topic_reply_kwargs(message))
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error muting user: {e}", exc_info=True)
+            logger.error("Error muting user: %s", e, exc_info=True)
             await message.reply(f"❌ Не удалось замутить пользователя: {str(e)}", **get_topic_reply_kwargs(message))
 
     @router.message(Command("unmute"))
@@ -441,6 +477,7 @@ def get_moderation_router(bot: Bot, settings: Settings) -> Router:
                 target_user_id,
                 permissions=permissions,
             )
+            get_member_cache().invalidate(message.chat.id, target_user_id)
 
             target_name = "пользователю"
             if message.reply_to_message and message.reply_to_message.from_user:
@@ -452,5 +489,49 @@ def get_moderation_router(bot: Bot, settings: Settings) -> Router:
         except Exception as e:
             await message.reply(f"❌ Не удалось снять мут: {e}", **get_topic_reply_kwargs(message))
 
+    @router.message(Command("profile"))
+    async def cmd_profile(message: Message) -> None:
+        """Handle /profile command. Usage: /profile [seconds]"""
+        if not message.from_user or not message.chat:
+            return
+
+        # Check admin rights
+        if not await check_message_from_admin(message):
+            await message.reply("❌ Эта команда доступна только администраторам!", **get_topic_reply_kwargs(message))
+            return
+
+        seconds = settings.PROFILE_SECONDS
+        parts = (message.text or "").split()
+        if len(parts) > 1:
+            try:
+                seconds = float(parts[1])
+            except ValueError:
+                await message.reply("❌ Использование: /profile [секунды]", **get_topic_reply_kwargs(message))
+                return
+        seconds = max(1.0, min(seconds, settings.PROFILE_MAX_SECONDS))
+
+        try:
+            future = get_profiler(settings).start(seconds)
+        except RuntimeError:
+            await message.reply("⏳ Профилирование уже запущено.", **get_topic_reply_kwargs(message))
+            return
+        await message.reply(f"🔬 Профилирование запущено на {seconds:.0f} с.", **get_topic_reply_kwargs(message))
+
+        async def report() -> None:
+            # The handler returns right away; the result is sent when the window closes
+            try:
+                path = await future
+                text = f"✅ Профиль сохранён: <code>{html.escape(str(path))}</code>"
+            except Exception:
+                text = "❌ Не удалось записать профиль."
+            try:
+                await message.answer(text, **get_topic_reply_kwargs(message))
+            except Exception as e:
+                logger.error("Error reporting profile: %s", e, exc_info=True)
+
+        task = asyncio.create_task(report())
+        _profile_reports.add(task)
+        task.add_done_callback(_profile_reports.discard)
+
     return router
 
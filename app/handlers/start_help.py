@@ -19,6 +19,8 @@ async def cmd_start_help(message: Message) -> None:
 /karma [reply] — показать карму пользователя
 /karma @username — показать карму пользователя
 /top — топ-10 по карме
+/top week, /top month — топ-10 за неделю или месяц
+/karmastats — статистика кармы за 7 и 30 дней
 
 <b>Модерация (только для админов):</b>
 /warn [reply] [причина] — выдать предупреждение
@@ -27,8 +29,10 @@ async def cmd_start_help(message: Message) -> None:
 /warns @username — показать предупреждения
 /unwarn [reply] — снять предупреждение
 /unwarn @username — снять предупреждение
+/rebuildwarns — пересчитать счётчики предупреждений
 /mute [reply] [часы 1-24] [причина] — замутить пользователя
 /unmute [reply] — снять мут с пользователя
+/profile [секунды] — записать профиль производительности бота
 
 <b>Как работает карма:</b>
 • Ответьте на сообщение со словами "спасибо", "спс", "thx" и т.д.
@@ -1,16 +1,36 @@
 """Main entry point for the bot."""
-import asyncio
-import logging
-import sys
+from app.core.startup import StartupTimer
 
-from aiogram import Bot
-from aiogram.client.session.aiohttp import AiohttpSession
+# Created before the imports below so their cost shows up in the startup report
+startup = StartupTimer()
 
-from app.bot.dispatcher import create_bot, setup_dispatcher
-from app.core.settings import Settings
-from app.db.base import init_db
+import asyncio  # noqa: E402
+import logging  # noqa: E402
+import signal  # noqa: E402
+import sys  # noqa: E402
+from contextlib import suppress  # noqa: E402
+from typing import Optional  # noqa: E402
 
-# Configure logging
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+
+from app.bot.dispatcher import (  # noqa: E402
+    close_services,
+    create_bot,
+    run_polling,
+    setup_dispatcher,
+    warm_up,
+)
+from app.bot.middlewares import FirstUpdateMiddleware  # noqa: E402
+from app.core.logging import setup_logging, stop_logging  # noqa: E402
+from app.core.profiling import start_profiling  # noqa: E402
+from app.core.settings import Settings  # noqa: E402
+from app.core.shutdown import Shutdown  # noqa: E402
+from app.db.base import init_db  # noqa: E402
+from app.services.karma_stats import backfill_daily_stats  # noqa: E402
+
+startup.mark("imports")
+
+# Plain logging until settings are loaded, then setup_logging takes over
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -22,14 +42,20 @@ logger = logging.getLogger(__name__)
 
 async def main() -> None:
     """Main function to start the bot."""
+    warm_up_task = None
+    backfill_task = None
+    shutdown: Optional[Shutdown] = None
     try:
         # Load settings
         settings = Settings()
+        setup_logging(settings)
         logger.info("Settings loaded")
+        startup.mark("settings")
 
         # Initialize database
         await init_db(settings)
         logger.info("Database initialized")
+        startup.mark("database")
 
         # Create bot
         bot = create_bot(settings)
@@ -37,16 +63,61 @@ async def main() -> None:
 
         # Setup dispatcher
         dp = setup_dispatcher(bot, settings)
-        logger.info("Dispatcher configured")
+        if settings.WORKER_PROCESSES == 0:
+            # Worker processes time their own first update
+            dp.update.outer_middleware(FirstUpdateMiddleware(startup))
+
+        if settings.METRICS_ENABLED:
+            from app.bot.metrics import start_metrics
+
+            await start_metrics(settings)
+        startup.mark("dispatcher")
+        logger.info("Startup took %.2fs (%s)", startup.elapsed(), startup.report())
 
-        # Start polling
-        logger.info("Starting bot...")
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        # Caches fill in the background while updates are already being received
+        # (by the workers themselves when there are worker processes)
+        if settings.WORKER_PROCESSES == 0:
+            warm_up_task = asyncio.create_task(warm_up(settings))
+        # Karma transactions older than the daily stats are rolled up in chunks
+        backfill_task = asyncio.create_task(backfill_daily_stats(settings))
+
+        # SIGTERM/SIGINT stop intake and let in-flight work finish,
+        # SIGHUP re-reads the chat allow-list, SIGUSR1 records a profile
+        loop = asyncio.get_running_loop()
+        shutdown = Shutdown(settings.SHUTDOWN_TIMEOUT_SECONDS)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            with suppress(NotImplementedError):  # Windows
+                loop.add_signal_handler(signum, shutdown.request)
+        if hasattr(signal, "SIGHUP"):
+            loop.add_signal_handler(signal.SIGHUP, dp["update_filter"].reload)
+        if hasattr(signal, "SIGUSR1") and settings.WORKER_PROCESSES == 0:
+            loop.add_signal_handler(signal.SIGUSR1, start_profiling, settings)
+
+        if settings.WORKER_PROCESSES > 0:
+            from app.bot.workers import run_with_workers
+
+            logger.info("Starting bot with %d worker processes...", settings.WORKER_PROCESSES)
+            await run_with_workers(bot, dp, settings, shutdown)
+        elif settings.BOT_MODE == "webhook":
+            from app.bot.webhook import run_webhook
+
+            logger.info("Starting bot in webhook mode...")
+            await run_webhook(bot, dp, settings, shutdown=shutdown)
+        else:
+            # Start polling
+            logger.info("Starting bot...")
+            await run_polling(bot, dp, shutdown)
 
     except Exception as e:
-        logger.error(f"Error starting bot: {e}", exc_info=True)
+        logger.error("Error starting bot: %s", e, exc_info=True)
         raise
     finally:
+        background = [task for task in (warm_up_task, backfill_task) if task is not None]
+        for task in background:
+            task.cancel()
+        # Let them unwind before the engine they use is disposed
+        await asyncio.gather(*background, return_exceptions=True)
+        await close_services(shutdown)
         if "bot" in locals():
             try:
                 session: AiohttpSession = bot.session
@@ -63,6 +134,8 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
-        logger.error(f"Fatal error: {e}", exc_info=True)
+        logger.error("Fatal error: %s", e, exc_info=True)
         sys.exit(1)
+    finally:
+        stop_logging()
 
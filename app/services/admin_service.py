@@ -2,11 +2,13 @@
 from aiogram import Bot
 from aiogram.types import ChatMemberAdministrator, ChatMemberOwner, Message
 
+from app.services.member_cache import get_chat_member
+
 
 async def is_admin(bot: Bot, chat_id: int, user_id: int) -> bool:
     """Check if user is admin in chat."""
     try:
-        member = await bot.get_chat_member(chat_id, user_id)
+        member = await get_chat_member(bot, chat_id, user_id)
         return isinstance(member, (ChatMemberAdministrator, ChatMemberOwner))
     except Exception:
         return False
@@ -15,7 +17,7 @@ async def is_admin(bot: Bot, chat_id: int, user_id: int) -> bool:
 async def can_restrict_members(bot: Bot, chat_id: int, user_id: int) -> bool:
     """Check if user can restrict members in chat."""
     try:
-        member = await bot.get_chat_member(chat_id, user_id)
+        member = await get_chat_member(bot, chat_id, user_id)
         if isinstance(member, ChatMemberOwner):
             return True
         if isinstance(member, ChatMemberAdministrator):
@@ -0,0 +1,148 @@
+"""Greeting service."""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.settings import Settings
+from app.db.models import Greeting
+from app.db.session import get_db_session
+
+logger = logging.getLogger(__name__)
+
+
+class GreetingService:
+    """
+    Service for greeting cooldowns.
+
+    Cooldowns are checked against an in-memory map of (chat_id, user_id) to
+    expiry time. Greetings are still written to the database so the map can
+    be rebuilt after a restart, and a background job deletes rows older than
+    the cooldown in batches.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        """Initialize greeting service."""
+        self.settings = settings
+        self.cooldown = timedelta(minutes=settings.GREETING_COOLDOWN_MINUTES)
+        self.prune_interval = settings.GREETING_PRUNE_INTERVAL_MINUTES * 60
+        self.prune_batch_size = settings.GREETING_PRUNE_BATCH_SIZE
+        self._expires: dict[tuple[int, int], datetime] = {}
+        self._loaded = False
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._pruner: Optional[asyncio.Task] = None
+
+    async def ensure_loaded(self) -> None:
+        """Load cooldowns that are still active from the database once."""
+        if self._loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._loaded:
+                return
+            since = datetime.utcnow() - self.cooldown
+            async with get_db_session(self.settings) as session:
+                result = await session.execute(
+                    select(Greeting.chat_id, Greeting.user_id, Greeting.created_at).where(
+                        Greeting.created_at >= since
+                    )
+                )
+                for chat_id, user_id, created_at in result.all():
+                    key = (chat_id, user_id)
+                    expires = created_at + self.cooldown
+                    if key not in self._expires or expires > self._expires[key]:
+                        self._expires[key] = expires
+            self._loaded = True
+            if self._pruner is None:
+                self._pruner = asyncio.create_task(self._run_pruner(), name="greeting-pruner")
+
+    def try_start_cooldown(self, chat_id: int, user_id: int) -> bool:
+        """
+        Start a cooldown for a user unless one is active.
+
+        Returns:
+            True if the user should be greeted
+        """
+        now = datetime.utcnow()
+        key = (chat_id, user_id)
+        expires = self._expires.get(key)
+        if expires is not None and expires > now:
+            return False
+        self._expires[key] = now + self.cooldown
+        return True
+
+    async def record(self, session: AsyncSession, chat_id: int, user_id: int) -> None:
+        """Persist a greeting so its cooldown survives restarts."""
+        session.add(Greeting(user_id=user_id, chat_id=chat_id, created_at=datetime.utcnow()))
+
+    def purge_memory(self) -> int:
+        """Drop expired cooldowns from memory. Returns number of entries removed."""
+        now = datetime.utcnow()
+        expired = [key for key, expires in self._expires.items() if expires <= now]
+        for key in expired:
+            del self._expires[key]
+        return len(expired)
+
+    async def prune_expired(self) -> int:
+        """Delete greeting rows older than the cooldown in batches. Returns rows deleted."""
+        cutoff = datetime.utcnow() - self.cooldown
+        total = 0
+        while True:
+            async with get_db_session(self.settings) as session:
+                batch = (
+                    select(Greeting.id)
+                    .where(Greeting.created_at < cutoff)
+                    .limit(self.prune_batch_size)
+                )
+                result = await session.execute(delete(Greeting).where(Greeting.id.in_(batch)))
+            total += result.rowcount
+            if result.rowcount < self.prune_batch_size:
+                return total
+            # Let other handlers run between batches
+            await asyncio.sleep(0)
+
+    async def _run_pruner(self) -> None:
+        """Prune expired cooldowns and greeting rows periodically."""
+        while True:
+            try:
+                self.purge_memory()
+                deleted = await self.prune_expired()
+                if deleted:
+                    logger.info("Pruned %s expired greeting rows", deleted)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Greeting pruning failed: %s", e, exc_info=True)
+            await asyncio.sleep(self.prune_interval)
+
+    async def close(self) -> None:
+        """Stop the pruning job."""
+        if self._pruner is not None:
+            self._pruner.cancel()
+            try:
+                await self._pruner
+            except asyncio.CancelledError:
+                pass
+            self._pruner = None
+
+
+# Global greeting service (will be initialized on first use)
+_greeting_service: Optional[GreetingService] = None
+
+
+def get_greeting_service(settings: Settings) -> GreetingService:
+    """Get or create the greeting service."""
+    global _greeting_service
+    if _greeting_service is None:
+        _greeting_service = GreetingService(settings)
+    return _greeting_service
+
+
+async def close_greeting_service() -> None:
+    """Stop the greeting service if it was created."""
+    if _greeting_service is not None:
+        await _greeting_service.close()
@@ -0,0 +1,169 @@
+"""Write-behind buffer for karma increments."""
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.settings import Settings
+from app.db.base import chunk_rows, dialect_insert
+from app.db.models import Karma, KarmaTransaction
+from app.services.karma_stats import add_daily_counts, count_daily, get_timezone
+from app.services.leaderboard import epoch_hour, get_leaderboards, get_window_leaderboards
+from app.services.write_behind import WriteBehindBuffer
+
+KarmaBatch = tuple[dict[tuple[int, int], int], list[dict]]
+
+
+class KarmaBuffer(WriteBehindBuffer):
+    """
+    Coalesces karma increments in memory and flushes them in bulk.
+
+    Increments are merged per (chat_id, user_id) and written with one bulk
+    UPSERT; transactions are appended to a list and written with one bulk
+    INSERT, and their daily rollups with one more bulk UPSERT. Deltas stay visible through ``pending_karma`` and
+    ``pending_for_chat`` until their flush has been committed.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        """Initialize karma buffer."""
+        super().__init__(
+            settings,
+            flush_interval=settings.KARMA_FLUSH_INTERVAL_SECONDS,
+            max_pending=settings.KARMA_FLUSH_MAX_PENDING,
+        )
+        self._deltas: dict[tuple[int, int], int] = defaultdict(int)
+        self._transactions: list[dict] = []
+        self._flushing: Optional[KarmaBatch] = None
+
+    def add(self, from_user_id: int, to_user_id: int, chat_id: int) -> None:
+        """Buffer one karma increment."""
+        self._deltas[(chat_id, to_user_id)] += 1
+        self._transactions.append(
+            {
+                "from_user_id": from_user_id,
+                "to_user_id": to_user_id,
+                "chat_id": chat_id,
+                "created_at": datetime.utcnow(),
+            }
+        )
+        self._notify()
+
+    def pending_karma(self, chat_id: int, user_id: int) -> int:
+        """Get karma not yet committed to the database for a user."""
+        key = (chat_id, user_id)
+        pending = self._deltas.get(key, 0)
+        if self._flushing is not None:
+            pending += self._flushing[0].get(key, 0)
+        return pending
+
+    def pending_for_chat(self, chat_id: int) -> dict[int, int]:
+        """Get uncommitted karma deltas of a chat as {user_id: delta}."""
+        pending: dict[int, int] = defaultdict(int)
+        sources = [self._deltas]
+        if self._flushing is not None:
+            sources.append(self._flushing[0])
+        for deltas in sources:
+            for (delta_chat_id, user_id), delta in deltas.items():
+                if delta_chat_id == chat_id:
+                    pending[user_id] += delta
+        return dict(pending)
+
+    def _pending_count(self) -> int:
+        """Number of buffered transactions."""
+        return len(self._transactions)
+
+    def _take(self) -> Optional[KarmaBatch]:
+        """Detach buffered deltas and transactions."""
+        if not self._transactions:
+            return None
+        self._flushing = (dict(self._deltas), self._transactions)
+        self._deltas = defaultdict(int)
+        self._transactions = []
+        # Window counts of these chats are added in _done, after the commit
+        get_window_leaderboards(self.settings).begin_write(_chat_ids(self._flushing))
+        return self._flushing
+
+    async def _write(self, session: AsyncSession, batch: KarmaBatch) -> list[tuple[int, int, int]]:
+        """
+        Write deltas and daily rollups with bulk UPSERTs and transactions with one bulk INSERT.
+
+        Returns:
+            New karma values as (chat_id, user_id, karma)
+        """
+        deltas, transactions = batch
+        scores = []
+        rows = [
+            {"chat_id": chat_id, "user_id": user_id, "karma": delta}
+            for (chat_id, user_id), delta in deltas.items()
+        ]
+        for chunk in chunk_rows(session, rows):
+            upsert = dialect_insert(session, Karma).values(chunk)
+            result = await session.execute(
+                upsert.on_conflict_do_update(
+                    index_elements=[Karma.chat_id, Karma.user_id],
+                    set_={
+                        "karma": Karma.karma + upsert.excluded.karma,
+                        "updated_at": func.now(),
+                    },
+                ).returning(Karma.chat_id, Karma.user_id, Karma.karma)
+            )
+            scores.extend(result.all())
+        await session.execute(insert(KarmaTransaction), transactions)
+        await add_daily_counts(
+            session,
+            count_daily(
+                (
+                    (row["chat_id"], row["from_user_id"], row["to_user_id"], row["created_at"])
+                    for row in transactions
+                ),
+                get_timezone(self.settings.TIMEZONE),
+            ),
+        )
+        return scores
+
+    def _restore(self, batch: KarmaBatch) -> None:
+        """Put a failed batch back in front of newer increments."""
+        deltas, transactions = batch
+        for key, delta in deltas.items():
+            self._deltas[key] += delta
+        self._transactions = transactions + self._transactions
+        self._flushing = None
+        get_window_leaderboards(self.settings).end_write(_chat_ids(batch))
+
+    def _done(self, batch: KarmaBatch, scores: list[tuple[int, int, int]]) -> None:
+        """Forget a committed batch and publish the new scores and transactions to the leaderboards."""
+        leaderboards = get_leaderboards(self.settings)
+        for chat_id, user_id, karma in scores:
+            leaderboards.update(chat_id, user_id, karma)
+        window_leaderboards = get_window_leaderboards(self.settings)
+        for row in batch[1]:
+            window_leaderboards.add(row["chat_id"], row["to_user_id"], epoch_hour(row["created_at"]))
+        window_leaderboards.end_write(_chat_ids(batch))
+        self._flushing = None
+
+
+def _chat_ids(batch: KarmaBatch) -> set[int]:
+    """Get the chats a batch writes to."""
+    return {chat_id for chat_id, _ in batch[0]}
+
+
+# Global karma buffer (created on first use when write-behind is enabled)
+_karma_buffer: Optional[KarmaBuffer] = None
+
+
+def get_karma_buffer(settings: Settings) -> Optional[KarmaBuffer]:
+    """Get or create the karma buffer. Returns None if write-behind is disabled."""
+    global _karma_buffer
+    if not settings.KARMA_WRITE_BEHIND:
+        return None
+    if _karma_buffer is None:
+        _karma_buffer = KarmaBuffer(settings)
+    return _karma_buffer
+
+
+async def close_karma_buffer() -> None:
+    """Flush and stop the karma buffer if it was created."""
+    if _karma_buffer is not None:
+        await _karma_buffer.close()
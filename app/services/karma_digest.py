@@ -0,0 +1,112 @@
+"""Karma confirmation digests."""
+import asyncio
+import html
+import logging
+from typing import Optional
+
+from aiogram import Bot
+
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# Users listed in one digest; the rest are summarized
+DIGEST_MAX_USERS = 20
+
+DigestKey = tuple[int, Optional[int]]
+
+
+class KarmaDigest:
+    """
+    Collects karma confirmations per chat topic and sends them as one message.
+
+    The first confirmation in a chat topic opens a window of ``window``
+    seconds. Confirmations that arrive during the window are merged per
+    receiving user, and when it closes a single message like
+    "+3 Ivan, +1 Olga" is sent instead of one reply per thank-you.
+    """
+
+    def __init__(self, window: float) -> None:
+        """Initialize karma digest."""
+        self.window = window
+        # (chat_id, thread_id) -> user_id -> [name, points]
+        self._pending: dict[DigestKey, dict[int, list]] = {}
+        self._timers: dict[DigestKey, asyncio.Task] = {}
+        self._bots: dict[DigestKey, Bot] = {}
+        # Timers whose window has closed and whose digest is being sent
+        self._sending: set[asyncio.Task] = set()
+
+    def add(self, bot: Bot, chat_id: int, thread_id: Optional[int], user_id: int, name: str) -> None:
+        """Add one karma point for a user to the chat topic's digest."""
+        key = (chat_id, thread_id)
+        entries = self._pending.setdefault(key, {})
+        entry = entries.setdefault(user_id, [name, 0])
+        entry[0] = name
+        entry[1] += 1
+        if key not in self._timers:
+            self._bots[key] = bot
+            self._timers[key] = asyncio.create_task(self._send_later(key))
+
+    async def flush(self) -> None:
+        """Send all open digests now and wait for those already being sent."""
+        for key in list(self._timers):
+            self._timers.pop(key).cancel()
+            await self._send(key)
+        if self._sending:
+            await asyncio.wait(self._sending)
+
+    async def _send_later(self, key: DigestKey) -> None:
+        """Send a digest when its window closes."""
+        await asyncio.sleep(self.window)
+        self._timers.pop(key, None)
+        task = asyncio.current_task()
+        self._sending.add(task)
+        try:
+            await self._send(key)
+        finally:
+            self._sending.discard(task)
+
+    async def _send(self, key: DigestKey) -> None:
+        """Send and forget a chat topic's digest."""
+        entries = self._pending.pop(key, None)
+        bot = self._bots.pop(key, None)
+        if not entries or bot is None:
+            return
+        chat_id, thread_id = key
+        try:
+            await bot.send_message(chat_id, format_digest(entries), message_thread_id=thread_id)
+        except Exception as e:
+            logger.error("Error sending karma digest to chat %s: %s", chat_id, e, exc_info=True)
+
+
+def format_digest(entries: dict[int, list]) -> str:
+    """Format merged confirmations, most thanked users first."""
+    ranked = sorted(entries.values(), key=lambda entry: -entry[1])
+    if len(ranked) == 1 and ranked[0][1] == 1:
+        return f"✅ Карма начислена {html.escape(ranked[0][0])}! (+1)"
+
+    parts = [f"+{points} {html.escape(name)}" for name, points in ranked[:DIGEST_MAX_USERS]]
+    text = "✅ Карма начислена: " + ", ".join(parts)
+    if len(ranked) > DIGEST_MAX_USERS:
+        text += f" и ещё {len(ranked) - DIGEST_MAX_USERS}"
+    return text
+
+
+# Global karma digest (will be initialized on first use)
+_karma_digest: Optional[KarmaDigest] = None
+
+
+def get_karma_digest(settings: Settings) -> Optional[KarmaDigest]:
+    """Get the karma digest, or None if confirmations are sent one by one."""
+    global _karma_digest
+    if not settings.KARMA_DIGEST_SECONDS:
+        return None
+    if _karma_digest is None:
+        _karma_digest = KarmaDigest(settings.KARMA_DIGEST_SECONDS)
+    return _karma_digest
+
+
+async def close_karma_digest() -> None:
+    """Send open digests if the karma digest was created."""
+    if _karma_digest is not None:
+        await _karma_digest.flush()
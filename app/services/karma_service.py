@@ -1,9 +1,18 @@
 """Karma service."""
-from sqlalchemy import select
+from datetime import datetime
+
+from typing import Optional
+
+from sqlalchemy import func, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.settings import Settings
+from app.db.base import dialect_insert
 from app.db.models import Karma, KarmaTransaction
+from app.db.session import after_commit, after_transaction_end
+from app.services.karma_buffer import get_karma_buffer
+from app.services.karma_stats import add_daily_counts, count_daily, get_timezone
+from app.services.leaderboard import LEADERBOARD_SIZE, epoch_hour, get_leaderboards, get_window_leaderboards
 
 
 class KarmaService:
@@ -12,6 +21,10 @@ class KarmaService:
     def __init__(self, settings: Settings) -> None:
         """Initialize karma service."""
         self.settings = settings
+        self.buffer = get_karma_buffer(settings)
+        self.leaderboards = get_leaderboards(settings)
+        self.window_leaderboards = get_window_leaderboards(settings)
+        self.timezone = get_timezone(settings.TIMEZONE)
         # Cooldown removed - karma can be given without restrictions
 
     async def get_karma(
@@ -23,7 +36,10 @@ class KarmaService:
         )
         result = await session.execute(stmt)
         karma = result.scalar_one_or_none()
-        return karma.karma if karma else 0
+        value = karma.karma if karma else 0
+        if self.buffer:
+            value += self.buffer.pending_karma(chat_id, user_id)
+        return value
 
     async def add_karma(
         self,
@@ -34,35 +50,145 @@ class KarmaService:
     ) -> bool:
         """Add karma to user. Returns True if successful."""
         # No cooldown - always allow karma
-        
+        if self.buffer:
+            self.buffer.add(from_user_id, to_user_id, chat_id)
+            return True
+
+        created_at = datetime.utcnow()
+        # Window counts are incremented rather than replaced, so a load that
+        # overlaps this transaction must not be cached or it may count it twice
+        self.window_leaderboards.begin_write([chat_id])
+        after_transaction_end(session, lambda: self.window_leaderboards.end_write([chat_id]))
+        karma = await self._increment_karma(session, from_user_id, to_user_id, chat_id, created_at)
+        # Published on commit, so /top never shows a score that was rolled back
+        after_commit(session, lambda: self.leaderboards.update(chat_id, to_user_id, karma))
+        after_commit(session, lambda: self.window_leaderboards.add(chat_id, to_user_id, epoch_hour(created_at)))
+        return True
+
+    async def _increment_karma(
+        self,
+        session: AsyncSession,
+        from_user_id: int,
+        to_user_id: int,
+        chat_id: int,
+        created_at: datetime,
+    ) -> int:
+        """
+        Record a karma transaction, atomically increment karma and update the daily rollups.
+
+        The increment is a single INSERT ... ON CONFLICT DO UPDATE on the
+        (chat_id, user_id) unique key, so concurrent thanks cannot create
+        duplicate rows. Nothing is committed here; the caller owns the
+        transaction.
+
+        Returns:
+            New karma value of the receiving user
+        """
         # Add karma transaction (for history, but not checking cooldown)
-        transaction = KarmaTransaction(
-            from_user_id=from_user_id,
-            to_user_id=to_user_id,
-            chat_id=chat_id,
+        await session.execute(
+            insert(KarmaTransaction).values(
+                from_user_id=from_user_id,
+                to_user_id=to_user_id,
+                chat_id=chat_id,
+                created_at=created_at,
+            )
+        )
+        await add_daily_counts(
+            session, count_daily([(chat_id, from_user_id, to_user_id, created_at)], self.timezone)
         )
-        session.add(transaction)
 
         # Update or create karma
-        stmt = select(Karma).where(
-            Karma.user_id == to_user_id, Karma.chat_id == chat_id
+        upsert = dialect_insert(session, Karma).values(
+            user_id=to_user_id, chat_id=chat_id, karma=1
         )
+        stmt = upsert.on_conflict_do_update(
+            index_elements=[Karma.chat_id, Karma.user_id],
+            set_={
+                "karma": Karma.karma + upsert.excluded.karma,
+                "updated_at": func.now(),
+            },
+        ).returning(Karma.karma)
         result = await session.execute(stmt)
-        karma = result.scalar_one_or_none()
+        return result.scalar_one()
+
+    async def get_top_karma(
+        self, session: AsyncSession, chat_id: int, limit: int = 10, window: Optional[str] = None
+    ) -> list[tuple[int, int]]:
+        """
+        Get top users by karma in chat. Returns list of (user_id, karma).
 
-        if karma:
-            karma.karma += 1
+        With ``window`` ("week" or "month"), karma received within that
+        window is ranked instead of all-time karma.
+        """
+        if window is not None:
+            return await self._get_window_top(session, chat_id, limit, window)
+        if limit <= LEADERBOARD_SIZE:
+            board = self.leaderboards.get(chat_id)
+            if board is None:
+                token = self.leaderboards.begin_load(chat_id)
+                try:
+                    entries = await self._query_top_karma(session, chat_id, LEADERBOARD_SIZE)
+                except BaseException:
+                    self.leaderboards.cancel_load(chat_id)
+                    raise
+                board = self.leaderboards.finish_load(chat_id, token, entries)
+            top = board.top(limit)
         else:
-            karma = Karma(user_id=to_user_id, chat_id=chat_id, karma=1)
-            session.add(karma)
+            top = await self._query_top_karma(session, chat_id, limit)
 
-        await session.commit()
-        return True
+        pending = self.buffer.pending_for_chat(chat_id) if self.buffer else {}
+        if not pending:
+            return top
 
-    async def get_top_karma(
-        self, session: AsyncSession, chat_id: int, limit: int = 10
+        # Users with buffered karma may climb into the top; merge their deltas
+        scores = dict(top)
+        missing = [user_id for user_id in pending if user_id not in scores]
+        if missing:
+            result = await session.execute(
+                select(Karma.user_id, Karma.karma).where(
+                    Karma.chat_id == chat_id, Karma.user_id.in_(missing)
+                )
+            )
+            scores.update(result.all())
+        for user_id, delta in pending.items():
+            scores[user_id] = scores.get(user_id, 0) + delta
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    async def _get_window_top(
+        self, session: AsyncSession, chat_id: int, limit: int, window: str
+    ) -> list[tuple[int, int]]:
+        """Get top users by karma received within a sliding window, from the in-memory counts."""
+        counts = self.window_leaderboards.get(chat_id)
+        if counts is None:
+            token = self.window_leaderboards.begin_load(chat_id)
+            try:
+                result = await session.execute(
+                    select(KarmaTransaction.to_user_id, KarmaTransaction.created_at).where(
+                        KarmaTransaction.chat_id == chat_id,
+                        KarmaTransaction.created_at >= self.window_leaderboards.since(),
+                    )
+                )
+                rows = result.all()
+            except BaseException:
+                self.window_leaderboards.cancel_load(chat_id)
+                raise
+            counts = self.window_leaderboards.finish_load(chat_id, token, rows)
+        counts.advance(epoch_hour())
+        top = counts.top(window, limit)
+
+        # Buffered karma is recent, so it falls within every window
+        pending = self.buffer.pending_for_chat(chat_id) if self.buffer else {}
+        if not pending:
+            return top
+        scores = dict(top)
+        for user_id, delta in pending.items():
+            scores[user_id] = counts.get(window, user_id) + delta
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    async def _query_top_karma(
+        self, session: AsyncSession, chat_id: int, limit: int
     ) -> list[tuple[int, int]]:
-        """Get top users by karma in chat. Returns list of (user_id, karma)."""
+        """Query top users by karma in chat from the database."""
         stmt = (
             select(Karma.user_id, Karma.karma)
             .where(Karma.chat_id == chat_id)
@@ -70,5 +196,5 @@ class KarmaService:
             .limit(limit)
         )
         result = await session.execute(stmt)
-        return list(result.all())
+        return [tuple(row) for row in result.all()]
 
@@ -0,0 +1,224 @@
+"""Daily karma rollups and chat statistics."""
+import asyncio
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import and_, case, distinct, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.settings import Settings
+from app.db.base import chunk_rows, dialect_insert
+from app.db.models import KarmaDailyStat, KarmaTransaction, RollupWatermark
+from app.db.session import get_db_session
+
+logger = logging.getLogger(__name__)
+
+# Row of rollup_watermarks tracking the backfill of karma_daily_stats
+ROLLUP_NAME = "karma_daily_stats"
+
+# Pause between backfill chunks so handlers get the database in between
+BACKFILL_PAUSE_SECONDS = 0.05
+
+# Rows shown by /karmastats
+TOP_GIVERS = 5
+BUSIEST_DAYS = 3
+
+# (chat_id, day, user_id) -> [given, received]
+DailyCounts = dict[tuple[int, date, int], list[int]]
+
+
+@lru_cache
+def get_timezone(name: str) -> tzinfo:
+    """Get the timezone days are counted in (UTC if the name is unknown)."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning("Unknown timezone %s, counting days in UTC", name)
+        return timezone.utc
+
+
+def count_daily(transactions: Iterable[tuple[int, int, int, datetime]], tz: tzinfo) -> DailyCounts:
+    """Count karma given and received per user and day from (chat_id, from_user_id, to_user_id, created_at)."""
+    counts: DailyCounts = defaultdict(lambda: [0, 0])
+    for chat_id, from_user_id, to_user_id, created_at in transactions:
+        # Transactions are stored in naive UTC
+        day = created_at.replace(tzinfo=timezone.utc).astimezone(tz).date()
+        counts[(chat_id, day, from_user_id)][0] += 1
+        counts[(chat_id, day, to_user_id)][1] += 1
+    return counts
+
+
+async def add_daily_counts(session: AsyncSession, counts: DailyCounts) -> None:
+    """Add counts to the daily rollups with bulk UPSERTs. Nothing is committed here."""
+    rows = [
+        {"chat_id": chat_id, "day": day, "user_id": user_id, "given": given, "received": received}
+        for (chat_id, day, user_id), (given, received) in counts.items()
+    ]
+    for chunk in chunk_rows(session, rows):
+        upsert = dialect_insert(session, KarmaDailyStat).values(chunk)
+        await session.execute(
+            upsert.on_conflict_do_update(
+                index_elements=[KarmaDailyStat.chat_id, KarmaDailyStat.day, KarmaDailyStat.user_id],
+                set_={
+                    "given": KarmaDailyStat.given + upsert.excluded.given,
+                    "received": KarmaDailyStat.received + upsert.excluded.received,
+                },
+            )
+        )
+
+
+async def backfill_daily_stats(settings: Settings) -> None:
+    """
+    Roll up karma transactions written before the rollups existed.
+
+    Transactions are read in id order, ``KARMA_STATS_BACKFILL_BATCH_SIZE`` at
+    a time, and each chunk is added in the same transaction that advances the
+    watermark. The watermark only moves if nobody else moved it first, so a
+    restart mid-chunk or several processes backfilling at once never count a
+    transaction twice.
+    """
+    tz = get_timezone(settings.TIMEZONE)
+    rolled_up = 0
+    try:
+        while True:
+            async with get_db_session(settings) as session:
+                watermark = await session.get(RollupWatermark, ROLLUP_NAME)
+                if watermark is None or watermark.position >= watermark.target:
+                    break
+                position, target = watermark.position, watermark.target
+                result = await session.execute(
+                    select(
+                        KarmaTransaction.id,
+                        KarmaTransaction.chat_id,
+                        KarmaTransaction.from_user_id,
+                        KarmaTransaction.to_user_id,
+                        KarmaTransaction.created_at,
+                    )
+                    .where(KarmaTransaction.id > position, KarmaTransaction.id <= target)
+                    .order_by(KarmaTransaction.id)
+                    .limit(settings.KARMA_STATS_BACKFILL_BATCH_SIZE)
+                )
+                rows = result.all()
+                moved = await session.execute(
+                    update(RollupWatermark)
+                    .where(RollupWatermark.name == ROLLUP_NAME, RollupWatermark.position == position)
+                    .values(position=rows[-1].id if rows else target)
+                )
+                if moved.rowcount != 1:
+                    # Another process took this chunk
+                    await session.rollback()
+                    continue
+                await add_daily_counts(session, count_daily((row[1:] for row in rows), tz))
+            rolled_up += len(rows)
+            await asyncio.sleep(BACKFILL_PAUSE_SECONDS)
+    except Exception as e:
+        # Resumed from the watermark on the next start
+        logger.error("Karma stats backfill failed: %s", e, exc_info=True)
+        return
+    if rolled_up:
+        logger.info("Rolled up %d earlier karma transactions into daily stats", rolled_up)
+
+
+@dataclass
+class PeriodStats:
+    """Karma activity over the last ``days`` days."""
+
+    days: int
+    karma: int
+    previous_karma: int  # In the ``days`` days before
+    givers: int
+
+
+@dataclass
+class KarmaStats:
+    """Karma activity of a chat."""
+
+    periods: list[PeriodStats]
+    top_givers: list[tuple[int, int]]  # (user_id, karma given) over the longest period
+    busiest_days: list[tuple[date, int]]  # (day, karma in the chat) over the longest period
+
+
+class KarmaStatsService:
+    """
+    Service for chat karma statistics.
+
+    Reads only the daily rollups, so the cost depends on the number of
+    active users and days in the window, not on the number of transactions.
+    Karma still waiting in the write-behind buffer is not included.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        """Initialize karma stats service."""
+        self.settings = settings
+        self.timezone = get_timezone(settings.TIMEZONE)
+
+    async def get_stats(
+        self, session: AsyncSession, chat_id: int, periods: tuple[int, ...] = (7, 30)
+    ) -> KarmaStats:
+        """Get karma totals per period (with the period before) plus top givers and busiest days."""
+        today = datetime.now(self.timezone).date()
+        longest = max(periods)
+        columns = []
+        for days in periods:
+            start = today - timedelta(days=days - 1)
+            previous_start = start - timedelta(days=days)
+            columns += [
+                func.coalesce(func.sum(case((KarmaDailyStat.day >= start, KarmaDailyStat.received), else_=0)), 0),
+                func.coalesce(
+                    func.sum(
+                        case(
+                            (
+                                and_(KarmaDailyStat.day >= previous_start, KarmaDailyStat.day < start),
+                                KarmaDailyStat.received,
+                            ),
+                            else_=0,
+                        )
+                    ),
+                    0,
+                ),
+                func.count(
+                    distinct(
+                        case((and_(KarmaDailyStat.day >= start, KarmaDailyStat.given > 0), KarmaDailyStat.user_id))
+                    )
+                ),
+            ]
+        in_chat = KarmaDailyStat.chat_id == chat_id
+        totals = (
+            await session.execute(
+                select(*columns).where(in_chat, KarmaDailyStat.day >= today - timedelta(days=2 * longest - 1))
+            )
+        ).one()
+        stats = [
+            PeriodStats(days, totals[index * 3], totals[index * 3 + 1], totals[index * 3 + 2])
+            for index, days in enumerate(periods)
+        ]
+
+        window = and_(in_chat, KarmaDailyStat.day >= today - timedelta(days=longest - 1))
+        given = func.sum(KarmaDailyStat.given)
+        top_givers = await session.execute(
+            select(KarmaDailyStat.user_id, given)
+            .where(window)
+            .group_by(KarmaDailyStat.user_id)
+            .having(given > 0)
+            .order_by(given.desc(), KarmaDailyStat.user_id)
+            .limit(TOP_GIVERS)
+        )
+        received = func.sum(KarmaDailyStat.received)
+        busiest_days = await session.execute(
+            select(KarmaDailyStat.day, received)
+            .where(window)
+            .group_by(KarmaDailyStat.day)
+            .having(received > 0)
+            .order_by(received.desc(), KarmaDailyStat.day.desc())
+            .limit(BUSIEST_DAYS)
+        )
+        return KarmaStats(
+            periods=stats,
+            top_givers=[tuple(row) for row in top_givers.all()],
+            busiest_days=[tuple(row) for row in busiest_days.all()],
+        )
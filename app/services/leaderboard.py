@@ -0,0 +1,327 @@
+"""In-memory per-chat karma leaderboards."""
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from datetime import datetime, timezone
+from typing import Generic, Optional, TypeVar
+
+from app.core.settings import Settings
+
+# Number of entries kept per chat (the size of /top)
+LEADERBOARD_SIZE = 10
+
+# Sliding windows of /top week and /top month, in hours
+WINDOW_HOURS = {"week": 7 * 24, "month": 30 * 24}
+
+
+class ChatLeaderboard:
+    """
+    Top-N karma scores of one chat.
+
+    Only the N best users are kept. Karma only grows, so a user outside the
+    board can enter it only by beating the lowest score on it, and the new
+    score is known from the UPSERT that changed it.
+    """
+
+    def __init__(self, size: int, entries: list[tuple[int, int]]) -> None:
+        """Initialize leaderboard from (user_id, karma) rows sorted by karma."""
+        self.size = size
+        self.scores: dict[int, int] = dict(entries[:size])
+        self.last_used = time.monotonic()
+        self._sorted: Optional[list[tuple[int, int]]] = None
+
+    def top(self, limit: int) -> list[tuple[int, int]]:
+        """Get top users as (user_id, karma), best first."""
+        if self._sorted is None:
+            self._sorted = sorted(self.scores.items(), key=lambda item: item[1], reverse=True)
+        return self._sorted[:limit]
+
+    def update(self, user_id: int, score: int) -> bool:
+        """
+        Apply a user's new score.
+
+        Returns:
+            False if the board can no longer be kept exact and must be reloaded
+        """
+        current = self.scores.get(user_id)
+        if current is not None:
+            if score < current and len(self.scores) >= self.size:
+                # Someone outside the board may now rank higher
+                return False
+            self.scores[user_id] = score
+        elif len(self.scores) < self.size:
+            self.scores[user_id] = score
+        else:
+            lowest = min(self.scores, key=self.scores.__getitem__)
+            if score <= self.scores[lowest]:
+                return True
+            del self.scores[lowest]
+            self.scores[user_id] = score
+        self._sorted = None
+        return True
+
+
+class ChatWindowCounts:
+    """
+    Karma received per user over sliding windows (such as a week and a month) in one chat.
+
+    Counts are kept in a ring of hourly buckets as long as the longest
+    window; bucket ``hour % len(ring)`` holds the karma of that hour. Each
+    window also keeps running per-user totals: when the clock moves to a
+    new hour, the buckets that fall out of a window are subtracted from its
+    totals, and the oldest bucket is cleared for reuse. A window covers the
+    current hour and the ``hours - 1`` before it.
+    """
+
+    def __init__(self, windows: dict[str, int], hour: int, rows: list[tuple[int, int]]) -> None:
+        """Initialize counts for windows {name: hours} at ``hour`` from (user_id, hour) rows."""
+        self.windows = windows
+        self.length = max(windows.values())
+        self.hour = hour
+        self.buckets: list[Optional[dict[int, int]]] = [None] * self.length
+        self.totals: dict[str, dict[int, int]] = {name: {} for name in windows}
+        self.last_used = time.monotonic()
+        self._sorted: dict[str, list[tuple[int, int]]] = {}
+        for user_id, row_hour in rows:
+            self.add(user_id, row_hour)
+
+    def add(self, user_id: int, hour: int, count: int = 1) -> None:
+        """Add karma a user received during ``hour`` (hours since the epoch)."""
+        self.advance(hour)
+        if hour <= self.hour - self.length:
+            return
+        index = hour % self.length
+        bucket = self.buckets[index]
+        if bucket is None:
+            bucket = self.buckets[index] = {}
+        bucket[user_id] = bucket.get(user_id, 0) + count
+        for name, hours in self.windows.items():
+            if hour > self.hour - hours:
+                totals = self.totals[name]
+                totals[user_id] = totals.get(user_id, 0) + count
+                self._sorted.pop(name, None)
+
+    def advance(self, hour: int) -> None:
+        """Move the windows forward to end at ``hour``."""
+        if hour <= self.hour:
+            return
+        if hour - self.hour >= self.length:
+            # Everything has expired
+            self.buckets = [None] * self.length
+            self.totals = {name: {} for name in self.windows}
+        else:
+            for new_hour in range(self.hour + 1, hour + 1):
+                for name, hours in self.windows.items():
+                    # The longest window's expired bucket is the one reused for new_hour
+                    expired = self.buckets[(new_hour - hours) % self.length]
+                    if expired:
+                        totals = self.totals[name]
+                        for user_id, count in expired.items():
+                            left = totals[user_id] - count
+                            if left:
+                                totals[user_id] = left
+                            else:
+                                del totals[user_id]
+                self.buckets[new_hour % self.length] = None
+        self.hour = hour
+        self._sorted.clear()
+
+    def get(self, window: str, user_id: int) -> int:
+        """Get the karma a user received within a window."""
+        return self.totals[window].get(user_id, 0)
+
+    def top(self, window: str, limit: int) -> list[tuple[int, int]]:
+        """Get top users of a window as (user_id, karma), best first."""
+        ranked = self._sorted.get(window)
+        if ranked is None:
+            ranked = self._sorted[window] = sorted(
+                self.totals[window].items(), key=lambda item: item[1], reverse=True
+            )
+        return ranked[:limit]
+
+
+def epoch_hour(moment: Optional[datetime] = None) -> int:
+    """Get hours since the epoch of a naive UTC timestamp (now if not given)."""
+    if moment is None:
+        return int(time.time() // 3600)
+    return int(moment.replace(tzinfo=timezone.utc).timestamp() // 3600)
+
+
+Entry = TypeVar("Entry", ChatLeaderboard, ChatWindowCounts)
+
+
+class ChatCache(Generic[Entry]):
+    """
+    Per-chat entries of recently active chats.
+
+    Entries are loaded lazily on first access and updated in place on every
+    karma change. Entries unused for ``idle_seconds`` are evicted, and at most
+    ``max_chats`` entries are kept (least recently used go first).
+
+    Writers that apply their changes only after committing call
+    ``begin_write`` before writing and ``end_write`` after applying them (or
+    after a rollback). An entry loaded while a write to its chat is in
+    progress may or may not include it, so it is used once but not cached.
+    """
+
+    def __init__(self, max_chats: int, idle_seconds: float) -> None:
+        """Initialize chat cache."""
+        self.max_chats = max_chats
+        self.idle_seconds = idle_seconds
+        self._entries: OrderedDict[int, Entry] = OrderedDict()
+        # chat_id -> [active loads, updates seen while loading]
+        self._loading: dict[int, list[int]] = {}
+        # chat_id -> writes in progress
+        self._writing: dict[int, int] = {}
+
+    def get(self, chat_id: int) -> Optional[Entry]:
+        """Get a loaded entry, or None if it has to be loaded first."""
+        self._evict_idle()
+        entry = self._entries.get(chat_id)
+        if entry is not None:
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(chat_id)
+        return entry
+
+    def begin_load(self, chat_id: int) -> int:
+        """Mark an entry as being loaded. Returns a token for ``finish_load``."""
+        state = self._loading.setdefault(chat_id, [0, 0])
+        state[0] += 1
+        return state[1]
+
+    def cancel_load(self, chat_id: int) -> None:
+        """Forget a load that failed."""
+        self._end_load(chat_id)
+
+    def begin_write(self, chat_ids: Iterable[int]) -> None:
+        """Note that karma of these chats is being written."""
+        for chat_id in chat_ids:
+            self._writing[chat_id] = self._writing.get(chat_id, 0) + 1
+
+    def end_write(self, chat_ids: Iterable[int]) -> None:
+        """Note that a write has been applied (or rolled back)."""
+        for chat_id in chat_ids:
+            self._writing[chat_id] -= 1
+            if not self._writing[chat_id]:
+                del self._writing[chat_id]
+            # Loads that overlapped the write must not be cached
+            self._changed_while_loading(chat_id)
+
+    def _store(self, chat_id: int, token: int, entry: Entry) -> Entry:
+        """
+        Cache an entry loaded from the database.
+
+        The entry is not cached if the chat changed while it was being
+        loaded, or is being written to, since the loaded rows may predate
+        that change.
+        """
+        state = self._end_load(chat_id)
+        if state[1] == token and chat_id not in self._writing:
+            self._entries[chat_id] = entry
+            self._entries.move_to_end(chat_id)
+            while len(self._entries) > self.max_chats:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _end_load(self, chat_id: int) -> list[int]:
+        """Release one active load of an entry and return its loading state."""
+        state = self._loading[chat_id]
+        state[0] -= 1
+        if state[0] == 0:
+            del self._loading[chat_id]
+        return state
+
+    def _changed_while_loading(self, chat_id: int) -> None:
+        """Note a change to a chat whose entry is being loaded."""
+        if chat_id in self._loading:
+            self._loading[chat_id][1] += 1
+
+    def _evict_idle(self) -> None:
+        """Drop entries that have not been used recently."""
+        deadline = time.monotonic() - self.idle_seconds
+        while self._entries:
+            chat_id, entry = next(iter(self._entries.items()))
+            if entry.last_used >= deadline:
+                break
+            del self._entries[chat_id]
+
+
+class LeaderboardCache(ChatCache[ChatLeaderboard]):
+    """All-time leaderboards of recently active chats."""
+
+    def __init__(self, max_chats: int, idle_seconds: float, size: int = LEADERBOARD_SIZE) -> None:
+        """Initialize leaderboard cache."""
+        super().__init__(max_chats, idle_seconds)
+        self.size = size
+
+    def finish_load(self, chat_id: int, token: int, entries: list[tuple[int, int]]) -> ChatLeaderboard:
+        """Store a board loaded from the database as (user_id, karma) rows sorted by karma."""
+        return self._store(chat_id, token, ChatLeaderboard(self.size, entries))
+
+    def update(self, chat_id: int, user_id: int, score: int) -> None:
+        """Apply a new karma score to the chat's board if it is loaded."""
+        board = self._entries.get(chat_id)
+        if board is not None:
+            if not board.update(user_id, score):
+                del self._entries[chat_id]
+        else:
+            self._changed_while_loading(chat_id)
+
+
+class WindowLeaderboardCache(ChatCache[ChatWindowCounts]):
+    """Sliding-window karma counts (``/top week``, ``/top month``) of recently active chats."""
+
+    def __init__(self, max_chats: int, idle_seconds: float, windows: dict[str, int] = WINDOW_HOURS) -> None:
+        """Initialize window leaderboard cache."""
+        super().__init__(max_chats, idle_seconds)
+        self.windows = windows
+        self.length = max(windows.values())
+
+    def since(self) -> datetime:
+        """Get the naive UTC start of the longest window, for loading transactions."""
+        return datetime.fromtimestamp((epoch_hour() - self.length + 1) * 3600, timezone.utc).replace(tzinfo=None)
+
+    def finish_load(self, chat_id: int, token: int, rows: list[tuple[int, datetime]]) -> ChatWindowCounts:
+        """Store counts loaded from (to_user_id, created_at) transaction rows."""
+        counts = ChatWindowCounts(
+            self.windows, epoch_hour(), [(user_id, epoch_hour(created_at)) for user_id, created_at in rows]
+        )
+        return self._store(chat_id, token, counts)
+
+    def add(self, chat_id: int, user_id: int, hour: Optional[int] = None) -> None:
+        """Count one karma point a user received (now unless ``hour`` is given) if the chat is loaded."""
+        counts = self._entries.get(chat_id)
+        if counts is not None:
+            counts.add(user_id, epoch_hour() if hour is None else hour)
+        else:
+            self._changed_while_loading(chat_id)
+
+
+# Global leaderboard cache (will be initialized on first use)
+_leaderboards: Optional[LeaderboardCache] = None
+
+
+def get_leaderboards(settings: Settings) -> LeaderboardCache:
+    """Get or create the leaderboard cache."""
+    global _leaderboards
+    if _leaderboards is None:
+        _leaderboards = LeaderboardCache(
+            max_chats=settings.LEADERBOARD_MAX_CHATS,
+            idle_seconds=settings.LEADERBOARD_IDLE_MINUTES * 60,
+        )
+    return _leaderboards
+
+
+# Global window leaderboard cache (will be initialized on first use)
+_window_leaderboards: Optional[WindowLeaderboardCache] = None
+
+
+def get_window_leaderboards(settings: Settings) -> WindowLeaderboardCache:
+    """Get or create the window leaderboard cache."""
+    global _window_leaderboards
+    if _window_leaderboards is None:
+        _window_leaderboards = WindowLeaderboardCache(
+            max_chats=settings.LEADERBOARD_WINDOW_MAX_CHATS,
+            idle_seconds=settings.LEADERBOARD_IDLE_MINUTES * 60,
+        )
+    return _window_leaderboards
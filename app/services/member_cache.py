@@ -0,0 +1,116 @@
+"""TTL cache for chat member lookups."""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.types import ChatMember
+
+from app.core.settings import Settings
+
+MemberKey = tuple[int, int]
+
+
+class ChatMemberCache:
+    """
+    Cache of ``get_chat_member`` results keyed by (chat_id, user_id).
+
+    Entries expire after ``ttl`` seconds and at most ``max_size`` entries are
+    kept (least recently used go first). Concurrent lookups of the same key
+    share one request. Failed lookups are not cached.
+    """
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        """Initialize member cache."""
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self._entries: OrderedDict[MemberKey, tuple[float, ChatMember]] = OrderedDict()
+        self._inflight: dict[MemberKey, asyncio.Future] = {}
+
+    async def get(self, bot: Bot, chat_id: int, user_id: int) -> ChatMember:
+        """Get chat member, from cache if fresh."""
+        key = (chat_id, user_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, member = entry
+            if expires > time.monotonic():
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return member
+            del self._entries[key]
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.collapsed += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.ensure_future(bot.get_chat_member(chat_id, user_id))
+        self._inflight[key] = future
+        try:
+            member = await asyncio.shield(future)
+        finally:
+            # Only the request still registered may fill the cache; an
+            # invalidation while it was in flight unregisters it
+            current = self._inflight.get(key) is future
+            if current:
+                del self._inflight[key]
+        if current:
+            self._store(key, member)
+        return member
+
+    def invalidate(self, chat_id: int, user_id: int) -> None:
+        """Forget a member, including a lookup that is still in flight."""
+        key = (chat_id, user_id)
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        """Get cache counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "collapsed": self.collapsed,
+            "size": len(self._entries),
+        }
+
+    def _store(self, key: MemberKey, member: ChatMember) -> None:
+        """Put a member in the bounded cache."""
+        self._entries[key] = (time.monotonic() + self.ttl, member)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+# Global member cache (configured by init_member_cache, defaults otherwise)
+_member_cache: Optional[ChatMemberCache] = None
+
+
+def init_member_cache(settings: Settings) -> ChatMemberCache:
+    """Create the member cache from settings."""
+    global _member_cache
+    _member_cache = ChatMemberCache(
+        ttl=settings.MEMBER_CACHE_TTL_SECONDS,
+        max_size=settings.MEMBER_CACHE_MAX_SIZE,
+    )
+    return _member_cache
+
+
+def get_member_cache() -> ChatMemberCache:
+    """Get the member cache."""
+    global _member_cache
+    if _member_cache is None:
+        _member_cache = ChatMemberCache(
+            ttl=Settings.model_fields["MEMBER_CACHE_TTL_SECONDS"].default,
+            max_size=Settings.model_fields["MEMBER_CACHE_MAX_SIZE"].default,
+        )
+    return _member_cache
+
+
+async def get_chat_member(bot: Bot, chat_id: int, user_id: int) -> ChatMember:
+    """Get chat member through the shared cache."""
+    return await get_member_cache().get(bot, chat_id, user_id)
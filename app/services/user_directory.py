@@ -0,0 +1,135 @@
+"""Local directory of user profiles seen in chats."""
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from aiogram.types import User as TelegramUser
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.settings import Settings
+from app.db.base import chunk_rows, dialect_insert
+from app.db.models import User
+from app.services.write_behind import WriteBehindBuffer
+
+
+class UserProfile(NamedTuple):
+    """Profile fields stored in the users table."""
+
+    username: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+
+
+class UserDirectory(WriteBehindBuffer):
+    """
+    Cache of user profiles backed by the users table.
+
+    Profiles of message senders are observed on every update, but only
+    changed profiles are queued, and queued profiles are written with one
+    bulk UPSERT per flush.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        """Initialize user directory."""
+        super().__init__(
+            settings,
+            flush_interval=settings.USER_FLUSH_INTERVAL_SECONDS,
+            max_pending=settings.USER_FLUSH_MAX_PENDING,
+        )
+        self.cache_size = settings.USER_CACHE_SIZE
+        self._cache: OrderedDict[int, UserProfile] = OrderedDict()
+        self._dirty: dict[int, UserProfile] = {}
+
+    def observe(self, user: TelegramUser) -> None:
+        """Remember a user's profile, queueing a write if it changed."""
+        profile = UserProfile(user.username, user.first_name, user.last_name)
+        if self._cache.get(user.id) == profile:
+            self._cache.move_to_end(user.id)
+            return
+        self._remember(user.id, profile)
+        self._dirty[user.id] = profile
+        self._notify()
+
+    async def get_names(self, session: AsyncSession, user_ids: list[int]) -> dict[int, str]:
+        """
+        Resolve first names (or usernames) of users.
+
+        Cached profiles are served from memory, the rest is fetched with one
+        query. Users unknown to the directory are missing from the result.
+        """
+        names: dict[int, str] = {}
+        misses = []
+        for user_id in user_ids:
+            profile = self._cache.get(user_id)
+            if profile is None:
+                misses.append(user_id)
+            elif profile.first_name or profile.username:
+                names[user_id] = profile.first_name or profile.username
+
+        if misses:
+            result = await session.execute(
+                select(User.id, User.username, User.first_name, User.last_name).where(
+                    User.id.in_(misses)
+                )
+            )
+            for user_id, username, first_name, last_name in result.all():
+                self._remember(user_id, UserProfile(username, first_name, last_name))
+                if first_name or username:
+                    names[user_id] = first_name or username
+        return names
+
+    def _remember(self, user_id: int, profile: UserProfile) -> None:
+        """Put a profile in the bounded cache."""
+        self._cache[user_id] = profile
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _pending_count(self) -> int:
+        """Number of profiles waiting to be written."""
+        return len(self._dirty)
+
+    def _take(self) -> dict[int, UserProfile]:
+        """Detach queued profiles."""
+        batch, self._dirty = self._dirty, {}
+        return batch
+
+    async def _write(self, session: AsyncSession, batch: dict[int, UserProfile]) -> None:
+        """Write queued profiles with a bulk UPSERT."""
+        rows = [{"id": user_id, **profile._asdict()} for user_id, profile in batch.items()]
+        for chunk in chunk_rows(session, rows):
+            upsert = dialect_insert(session, User).values(chunk)
+            await session.execute(
+                upsert.on_conflict_do_update(
+                    index_elements=[User.id],
+                    set_={
+                        "username": upsert.excluded.username,
+                        "first_name": upsert.excluded.first_name,
+                        "last_name": upsert.excluded.last_name,
+                        "updated_at": func.now(),
+                    },
+                )
+            )
+
+    def _restore(self, batch: dict[int, UserProfile]) -> None:
+        """Re-queue profiles that failed to write, unless a newer one is queued."""
+        for user_id, profile in batch.items():
+            self._dirty.setdefault(user_id, profile)
+
+
+# Global user directory (will be initialized on first use)
+_user_directory: Optional[UserDirectory] = None
+
+
+def get_user_directory(settings: Settings) -> UserDirectory:
+    """Get or create the user directory."""
+    global _user_directory
+    if _user_directory is None:
+        _user_directory = UserDirectory(settings)
+    return _user_directory
+
+
+async def close_user_directory() -> None:
+    """Flush and stop the user directory if it was created."""
+    if _user_directory is not None:
+        await _user_directory.close()
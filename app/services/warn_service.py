@@ -1,13 +1,22 @@
 """Warning service."""
-from sqlalchemy import func, select
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.settings import Settings
-from app.db.models import Warning
+from app.db.base import dialect_insert
+from app.db.models import WarnCounter, Warning
 
 
 class WarnService:
-    """Service for managing warnings."""
+    """
+    Service for managing warnings.
+
+    Warning counts are read from ``warn_counters``, which is updated in the
+    same transaction as every warning insert or delete, so no path has to
+    count rows in ``warnings``.
+    """
 
     def __init__(self, settings: Settings) -> None:
         """Initialize warn service."""
@@ -19,9 +28,8 @@ class WarnService:
         self, session: AsyncSession, user_id: int, chat_id: int
     ) -> int:
         """Get warning count for user in chat."""
-        stmt = (
-            select(func.count(Warning.id))
-            .where(Warning.user_id == user_id, Warning.chat_id == chat_id)
+        stmt = select(WarnCounter.count).where(
+            WarnCounter.chat_id == chat_id, WarnCounter.user_id == user_id
         )
         result = await session.execute(stmt)
         return result.scalar() or 0
@@ -35,35 +43,50 @@ class WarnService:
         reason: str | None = None,
     ) -> int:
         """Add warning to user. Returns new warning count."""
-        warning = Warning(
-            user_id=user_id,
-            chat_id=chat_id,
-            admin_id=admin_id,
-            reason=reason,
+        await session.execute(
+            insert(Warning).values(
+                user_id=user_id,
+                chat_id=chat_id,
+                admin_id=admin_id,
+                reason=reason,
+            )
         )
-        session.add(warning)
-        await session.commit()
 
-        return await self.get_warn_count(session, user_id, chat_id)
+        upsert = dialect_insert(session, WarnCounter).values(
+            chat_id=chat_id, user_id=user_id, count=1
+        )
+        stmt = upsert.on_conflict_do_update(
+            index_elements=[WarnCounter.chat_id, WarnCounter.user_id],
+            set_={"count": WarnCounter.count + 1},
+        ).returning(WarnCounter.count)
+        result = await session.execute(stmt)
+        return result.scalar_one()
 
     async def remove_warning(
         self, session: AsyncSession, user_id: int, chat_id: int
     ) -> int:
         """Remove one warning from user. Returns new warning count."""
-        stmt = (
-            select(Warning)
+        latest = (
+            select(Warning.id)
             .where(Warning.user_id == user_id, Warning.chat_id == chat_id)
-            .order_by(Warning.created_at.desc())
+            .order_by(Warning.created_at.desc(), Warning.id.desc())
             .limit(1)
+            .scalar_subquery()
         )
-        result = await session.execute(stmt)
-        warning = result.scalar_one_or_none()
-
-        if warning:
-            await session.delete(warning)
-            await session.commit()
+        result = await session.execute(
+            delete(Warning).where(Warning.id == latest).returning(Warning.id)
+        )
+        if result.scalar() is None:
+            return await self.get_warn_count(session, user_id, chat_id)
 
-        return await self.get_warn_count(session, user_id, chat_id)
+        result = await session.execute(
+            update(WarnCounter)
+            .where(WarnCounter.chat_id == chat_id, WarnCounter.user_id == user_id)
+            .values(count=WarnCounter.count - 1)
+            .returning(WarnCounter.count)
+            .execution_options(synchronize_session=False)
+        )
+        return result.scalar() or 0
 
     async def should_mute(
         self, session: AsyncSession, user_id: int, chat_id: int
@@ -72,3 +95,29 @@ class WarnService:
         count = await self.get_warn_count(session, user_id, chat_id)
         return count >= self.warn_limit
 
+    async def rebuild_counters(
+        self, session: AsyncSession, chat_id: Optional[int] = None
+    ) -> int:
+        """
+        Recount warning counters from the warnings table.
+
+        Args:
+            session: Database session
+            chat_id: Chat to rebuild, or None for all chats
+
+        Returns:
+            Number of users with warnings
+        """
+        clear = delete(WarnCounter)
+        counts = select(Warning.chat_id, Warning.user_id, func.count(Warning.id)).group_by(
+            Warning.chat_id, Warning.user_id
+        )
+        if chat_id is not None:
+            clear = clear.where(WarnCounter.chat_id == chat_id)
+            counts = counts.where(Warning.chat_id == chat_id)
+
+        await session.execute(clear)
+        result = await session.execute(
+            insert(WarnCounter).from_select(["chat_id", "user_id", "count"], counts)
+        )
+        return result.rowcount
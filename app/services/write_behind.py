@@ -0,0 +1,112 @@
+"""Base class for write-behind buffers flushed to the database in bulk."""
+import asyncio
+import logging
+from typing import Any, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.settings import Settings
+from app.db.session import after_commit, get_db_session
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    In-memory buffer of pending writes with a background flusher.
+
+    Subclasses keep their own pending state and implement ``_take`` (detach the
+    pending state and return it as a batch), ``_write`` (persist a batch) and
+    ``_restore`` (merge a batch back after a failed write). The flusher runs
+    every ``flush_interval`` seconds, or earlier once ``max_pending`` writes
+    have accumulated.
+    """
+
+    def __init__(self, settings: Settings, flush_interval: float, max_pending: int) -> None:
+        """Initialize buffer."""
+        self.settings = settings
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._closed = False
+
+    def _pending_count(self) -> int:
+        """Number of buffered writes."""
+        raise NotImplementedError
+
+    def _take(self) -> Any:
+        """Detach pending state and return it as a batch (falsy if empty)."""
+        raise NotImplementedError
+
+    async def _write(self, session: AsyncSession, batch: Any) -> Any:
+        """Persist a batch in the given session. The return value is passed to ``_done``."""
+        raise NotImplementedError
+
+    def _restore(self, batch: Any) -> None:
+        """Merge a batch that failed to persist back into pending state."""
+        raise NotImplementedError
+
+    def _done(self, batch: Any, result: Any) -> None:
+        """Hook called as soon as a batch has been committed, before the flush session is closed."""
+
+    def _notify(self) -> None:
+        """Start the flusher if needed and wake it up when the buffer is full."""
+        if self._closed:
+            return
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name=f"{type(self).__name__}-flusher")
+        if self._pending_count() >= self.max_pending:
+            self._wakeup.set()
+
+    def _get_flush_lock(self) -> asyncio.Lock:
+        """Get the lock serializing flushes (created on the running loop)."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        return self._flush_lock
+
+    async def flush(self) -> None:
+        """Write all pending state to the database in one transaction."""
+        async with self._get_flush_lock():
+            batch = self._take()
+            if not batch:
+                return
+            try:
+                async with get_db_session(self.settings) as session:
+                    result = await self._write(session, batch)
+                    # Published by the commit itself, so a batch is never both pending and committed
+                    after_commit(session, lambda: self._done(batch, result))
+            except BaseException:
+                self._restore(batch)
+                raise
+
+    async def _run(self) -> None:
+        """Flush periodically or when woken up."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("%s flush failed: %s", type(self).__name__, e, exc_info=True)
+
+    async def close(self) -> None:
+        """Stop the flusher and write out everything still pending."""
+        self._closed = True
+        if self._task is not None:
+            # Wait for a running flush to finish so it is never cancelled mid-write
+            async with self._get_flush_lock():
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,193 @@
+"""
+Cold start benchmark: time from process start to the first processed update.
+
+Starts ``python -m app.main`` as a new process against a local fake Bot API
+server (``TELEGRAM_API_URL``) and a temporary SQLite database. The fake API
+hands out a single /start update on the first getUpdates call and records
+when polling started and when the reply to that update arrived. The bot's
+own startup report (per-phase timings) is printed alongside.
+
+Usage:
+    python -m benchmarks.cold_start [--runs 3] [--reuse-db]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from aiohttp import web
+
+TOKEN = "123456:cold-start"
+CHAT_ID = -1001
+REPORT_MARKERS = ("Startup took", "First update processed", "Warm-up finished")
+
+
+class FakeBotApi:
+    """HTTP stand-in for the Bot API that serves one update and records timings."""
+
+    def __init__(self) -> None:
+        """Initialize fake API."""
+        self.polling_started: Optional[float] = None
+        self.replied: Optional[float] = None
+        self._served = False
+
+    def reset(self) -> None:
+        """Prepare for the next run."""
+        self.polling_started = self.replied = None
+        self._served = False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Answer a Bot API call."""
+        method = request.match_info["method"].lower()
+        await request.post()
+        result: Any = True
+        if method == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "bot", "username": "cold_start_bot"}
+        elif method == "getupdates":
+            if self.polling_started is None:
+                self.polling_started = time.perf_counter()
+            if self._served:
+                await asyncio.sleep(0.5)
+                result = []
+            else:
+                self._served = True
+                result = [self._start_update()]
+        elif method == "sendmessage":
+            if self.replied is None:
+                self.replied = time.perf_counter()
+            result = {
+                "message_id": 2,
+                "date": int(time.time()),
+                "chat": {"id": CHAT_ID, "type": "supergroup", "title": "Chat"},
+                "text": "ok",
+            }
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def _start_update() -> dict[str, Any]:
+        """Build the /start update."""
+        return {
+            "update_id": 1,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": CHAT_ID, "type": "supergroup", "title": "Chat"},
+                "from": {"id": 1000, "is_bot": False, "first_name": "User"},
+                "text": "/start",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+            },
+        }
+
+
+async def run_once(api: FakeBotApi, base_url: str, database_url: str, timeout: float) -> dict[str, Any]:
+    """Start the bot, wait for the first reply and stop it."""
+    api.reset()
+    env = {
+        **os.environ,
+        "BOT_TOKEN": TOKEN,
+        "TELEGRAM_API_URL": base_url,
+        "DATABASE_URL": database_url,
+        "BOT_MODE": "polling",
+        "WORKER_PROCESSES": "0",
+        "ALLOWED_CHAT_IDS": "",
+        "METRICS_ENABLED": "false",
+        "RECORD_UPDATES": "false",
+    }
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "app.main",
+        env=env,
+        cwd=Path(__file__).resolve().parent.parent,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    report: list[str] = []
+
+    async def read_output() -> None:
+        assert process.stdout is not None
+        async for raw in process.stdout:
+            line = raw.decode(errors="replace").rstrip()
+            if any(marker in line for marker in REPORT_MARKERS):
+                report.append(line.split(" - ")[-1])
+
+    reader = asyncio.create_task(read_output())
+    try:
+        deadline = started + timeout
+        while api.replied is None:
+            if process.returncode is not None:
+                raise RuntimeError(f"Bot exited with code {process.returncode}")
+            if time.perf_counter() > deadline:
+                raise RuntimeError("Timed out waiting for the first reply")
+            await asyncio.sleep(0.005)
+        # Give the bot a moment to log its startup report
+        await asyncio.sleep(0.5)
+    finally:
+        if process.returncode is None:
+            process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(process.wait(), 15)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        await reader
+
+    return {
+        "polling_started": api.polling_started - started if api.polling_started else None,
+        "first_update": api.replied - started,
+        "report": report,
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    """Serve the fake API and measure the runs."""
+    api = FakeBotApi()
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    base_url = f"http://{host}:{port}"
+
+    workdir = tempfile.mkdtemp(prefix="cold-start-")
+    results = []
+    try:
+        for attempt in range(1, args.runs + 1):
+            database = "cold.db" if args.reuse_db else f"cold-{attempt}.db"
+            result = await run_once(api, base_url, f"sqlite+aiosqlite:///{workdir}/{database}", args.timeout)
+            results.append(result)
+            polling = result["polling_started"]
+            print(
+                f"run {attempt}: polling started {polling:.2f}s, first update processed {result['first_update']:.2f}s"
+            )
+            for line in result["report"]:
+                print(f"    {line}")
+    finally:
+        await runner.cleanup()
+
+    first_updates = [result["first_update"] for result in results]
+    print(f"time to first update, median of {len(results)}: {statistics.median(first_updates):.2f}s")
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="bot starts to measure")
+    parser.add_argument(
+        "--reuse-db", action="store_true", help="keep one database between runs (only the first run migrates)"
+    )
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for the first reply")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
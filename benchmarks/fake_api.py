@@ -0,0 +1,65 @@
+"""In-process stand-in for the Telegram Bot API."""
+import asyncio
+import itertools
+import time
+from collections import Counter
+from collections.abc import AsyncGenerator
+from typing import Any, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetChatMember, GetMe, SendMessage, TelegramMethod
+from aiogram.types import Chat, ChatMemberMember, ChatMemberOwner, Message, User
+
+BOT_ID = 1
+
+
+class FakeSession(BaseSession):
+    """
+    Bot session that answers API calls locally instead of calling Telegram.
+
+    ``sendMessage`` returns a message, ``getChatMember`` reports users from
+    ``admins`` as chat owners and everyone else as members, ``getMe`` returns
+    the bot and any other method returns True. Each call sleeps ``latency``
+    seconds to imitate the network round trip.
+    """
+
+    def __init__(self, admins: tuple[int, ...] = (), latency: float = 0.0) -> None:
+        """Initialize fake session."""
+        super().__init__()
+        self.admins = set(admins)
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[Any], timeout: Optional[int] = None
+    ) -> Any:
+        """Answer an API call."""
+        self.calls[method.__api_method__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if isinstance(method, SendMessage):
+            return Message(
+                message_id=next(self._message_ids),
+                date=int(time.time()),
+                chat=Chat(id=method.chat_id, type="supergroup"),
+                from_user=User(id=BOT_ID, is_bot=True, first_name="bot"),
+                text=method.text,
+            )
+        if isinstance(method, GetChatMember):
+            user = User(id=method.user_id, is_bot=False, first_name=f"User {method.user_id}")
+            if method.user_id in self.admins:
+                return ChatMemberOwner(user=user, is_anonymous=False)
+            return ChatMemberMember(user=user)
+        if isinstance(method, GetMe):
+            return User(id=BOT_ID, is_bot=True, first_name="bot", username="bench_bot")
+        return True
+
+    async def stream_content(self, *args: Any, **kwargs: Any) -> AsyncGenerator[bytes, None]:
+        """Files are never downloaded in benchmarks."""
+        yield b""
+
+    async def close(self) -> None:
+        """Nothing to close."""
@@ -0,0 +1,97 @@
+"""
+Micro-benchmark: compiled karma matcher vs the legacy keyword loop.
+
+Usage:
+    python -m benchmarks.karma_matcher [--messages 20000] [--repeat 5]
+"""
+import argparse
+import random
+import re
+import timeit
+
+from app.handlers.karma import KARMA_KEYWORDS, has_karma_keyword
+
+# Typical group chat traffic: mostly chatter, some thanks, some false-positive bait
+CHATTER = [
+    "привет всем, кто сегодня идёт на созвон?",
+    "у меня опять не собирается проект после обновления",
+    "посмотрите логи, там видно, что база отвалилась",
+    "кто-нибудь знает, как настроить вебхук для бота?",
+    "ок, понял, попробую вечером",
+    "ссылку на документацию скину чуть позже",
+    "а это точно работает на python 3.12?",
+    "lol that was a thankless job anyway",
+    "does anyone have the meeting notes from yesterday?",
+    "I pushed a fix, please review when you can",
+    "мне кажется, проблема в таймзоне",
+    "Уважаемые участники, напоминаю о правилах чата",
+    "😂😂😂",
+    "+",
+    "да",
+]
+THANKS = [
+    "спасибо!",
+    "Спасибо большое, помогло",
+    "спс",
+    "thx, works now",
+    "Thank you very much!!!",
+    "огромное спасибо за помощь 🙏",
+    "благодарю, коллега",
+    "дякую тобі",
+    "респект и уважуха",
+    "красава, всё завелось",
+]
+
+
+def legacy_has_keyword(text: str) -> bool:
+    """Keyword check as implemented before the compiled matcher."""
+    text_lower = text.lower()
+    text_normalized = re.sub(r"[^\w\s]", " ", text_lower)
+    text_normalized = " ".join(text_normalized.split())
+    for keyword in KARMA_KEYWORDS:
+        keyword_lower = keyword.lower()
+        if keyword_lower in text_lower or keyword_lower in text_normalized:
+            return True
+    return False
+
+
+def build_corpus(size: int, thanks_ratio: float, seed: int = 42) -> list[str]:
+    """Build a message corpus with the given share of thank-you messages."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        pool = THANKS if rng.random() < thanks_ratio else CHATTER
+        message = rng.choice(pool)
+        # Some messages are longer threads of thought
+        if rng.random() < 0.2:
+            message = " ".join([message] + rng.sample(CHATTER, 3))
+        corpus.append(message)
+    return corpus
+
+
+def bench(func, corpus: list[str], repeat: int) -> float:
+    """Return best per-message time in microseconds."""
+    timer = timeit.Timer(lambda: [func(text) for text in corpus])
+    best = min(timer.repeat(repeat=repeat, number=1))
+    return best / len(corpus) * 1_000_000
+
+
+def main() -> None:
+    """Run the benchmark and print a comparison table."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'corpus':<22}{'legacy, us':>12}{'compiled, us':>14}{'speedup':>10}{'diff':>7}")
+    for name, ratio in (("chatter (2% thanks)", 0.02), ("mixed (20% thanks)", 0.2), ("thank-you burst", 0.9)):
+        corpus = build_corpus(args.messages, ratio)
+        legacy = bench(legacy_has_keyword, corpus, args.repeat)
+        compiled = bench(has_karma_keyword, corpus, args.repeat)
+        # Messages where the matchers disagree (expected: word-boundary false positives)
+        diff = sum(legacy_has_keyword(t) != has_karma_keyword(t) for t in set(corpus))
+        print(f"{name:<22}{legacy:>12.2f}{compiled:>14.2f}{legacy / compiled:>9.1f}x{diff:>7}")
+
+
+if __name__ == "__main__":
+    main()
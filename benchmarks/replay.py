@@ -0,0 +1,132 @@
+"""
+Replay recorded updates through the dispatcher against a fake Bot API.
+
+Reads files written with RECORD_UPDATES=true (or bare updates, one JSON
+object per line), merges them by receive time and feeds them to
+``setup_dispatcher`` on a temporary SQLite database (or ``--database-url``).
+With ``--speed 1`` updates arrive with their recorded gaps, ``--speed N``
+compresses the gaps N times and ``--speed max`` feeds them as fast as
+``--concurrency`` allows. Reports throughput, update latency and how far
+behind schedule the replay fell.
+
+Usage:
+    python -m benchmarks.replay recordings/updates-*.jsonl.gz [--speed 1|N|max]
+        [--concurrency 100] [--api-latency 0.02] [--admins 123,456]
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from app.bot.dispatcher import close_services, create_bot, setup_dispatcher
+from app.core.settings import Settings
+from app.db.base import init_db
+from benchmarks.fake_api import FakeSession
+from benchmarks.updates import load_recording
+from benchmarks.webhook_load import percentile
+
+
+def parse_speed(value: str) -> Optional[float]:
+    """Parse --speed: a positive factor, or "max" for no pacing (None)."""
+    if value == "max":
+        return None
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive")
+    return speed
+
+
+async def run(args: argparse.Namespace) -> None:
+    """Replay the recordings and print results."""
+    records: list[tuple[float, dict[str, Any]]] = []
+    for path in args.files:
+        records.extend(load_recording(Path(path)))
+    records.sort(key=lambda record: record[0])
+    if not records:
+        print("No updates to replay")
+        return
+
+    url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='replay-')}/replay.db"
+    settings = Settings(
+        BOT_TOKEN="123456:replay",
+        DATABASE_URL=url,
+        ALLOWED_CHAT_IDS=None,
+        OUTBOUND_ENABLED=args.shape_outbound,
+        _env_file=None,
+    )
+    await init_db(settings)
+
+    admins = tuple(int(admin) for admin in args.admins.split(",")) if args.admins else ()
+    session = FakeSession(admins=admins, latency=args.api_latency)
+    bot = create_bot(settings, session=session)
+    dp = setup_dispatcher(bot, settings)
+
+    slots = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    lags: list[float] = []
+    errors = 0
+
+    async def feed(update: dict[str, Any]) -> None:
+        nonlocal errors
+        try:
+            started = time.perf_counter()
+            await dp.feed_raw_update(bot, update)
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            errors += 1
+        finally:
+            slots.release()
+
+    first_received = records[0][0]
+    tasks = []
+    started = time.perf_counter()
+    try:
+        for received, update in records:
+            if args.speed is not None:
+                due = started + (received - first_received) / args.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                lags.append(max(0.0, time.perf_counter() - due))
+            await slots.acquire()
+            tasks.append(asyncio.create_task(feed(update)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    finally:
+        await close_services()
+
+    latencies.sort()
+    lags.sort()
+    count = len(records)
+    print(f"updates:              {count}")
+    print(f"recorded span, s:     {records[-1][0] - first_received:.1f}")
+    print(f"replay time, s:       {elapsed:.1f}")
+    print(f"speed:                {'max' if args.speed is None else f'{args.speed:g}x'}")
+    print(f"updates/s:            {count / elapsed:.0f}")
+    if latencies:
+        print(f"latency p50 / p99, ms: {percentile(latencies, 0.5) * 1000:.2f} / {percentile(latencies, 0.99) * 1000:.2f}")
+    if lags:
+        print(f"behind schedule p99, ms: {percentile(lags, 0.99) * 1000:.2f}")
+    print(f"errors:               {errors}")
+    print(f"Bot API calls:        {dict(session.calls)}")
+
+
+def main() -> None:
+    """Parse arguments and replay."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="recordings (JSON lines, optionally .gz)")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help='replay speed factor or "max" (default 1)')
+    parser.add_argument("--concurrency", type=int, default=100, help="updates in flight at most")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="fake Bot API latency, s")
+    parser.add_argument("--admins", help="comma-separated (pseudonymous) user ids treated as chat admins")
+    parser.add_argument("--database-url", help="database to replay into (default: temporary SQLite)")
+    parser.add_argument(
+        "--shape-outbound", action="store_true", help="pace replies to Telegram rate limits (slow by design)"
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
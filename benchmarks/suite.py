@@ -0,0 +1,244 @@
+"""
+Throughput benchmark suite: synthetic update streams through the real dispatcher.
+
+Every scenario (see ``benchmarks.updates.build_scenario``) runs in a fresh
+process against a new database and the fake Bot API, feeding updates to
+``setup_dispatcher`` with ``--concurrency`` updates in flight. Reports
+updates/s, p50/p99 update latency and SQL statements per update (including
+buffered writes flushed on shutdown), stores the results in
+``benchmarks/results/<commit>.json`` and flags regressions against the
+previous results file.
+
+The database is a temporary SQLite file unless ``--database-url`` or
+``BENCH_DATABASE_URL`` points to a PostgreSQL database, which is wiped
+before every scenario.
+
+Usage:
+    python -m benchmarks.suite [--updates 3000] [--scenario thanks --scenario top]
+        [--concurrency 50] [--api-latency 0.0] [--database-url postgresql+asyncpg://...]
+        [--compare <commit>] [--threshold 0.1] [--fail-on-regression]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+from benchmarks.updates import ADMIN_ID, SCENARIOS, build_scenario
+from benchmarks.webhook_load import percentile
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# Metrics compared between runs: name -> True if higher is better
+COMPARED = {"updates_per_second": True, "p50_ms": False, "p99_ms": False, "queries_per_update": False}
+
+
+async def _reset_database(url: str) -> None:
+    """Drop every table of a shared benchmark database."""
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app.db import models  # noqa: F401 - registers the tables
+    from app.db.base import Base
+
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    await engine.dispose()
+
+
+async def _run_scenario(name: str, count: int, concurrency: int, api_latency: float, url: Optional[str]) -> dict:
+    """Run one scenario in this process and measure it."""
+    from sqlalchemy import event
+
+    from app.bot.dispatcher import close_services, create_bot, setup_dispatcher
+    from app.core.settings import Settings
+    from app.db.base import get_engine, init_db
+    from benchmarks.fake_api import FakeSession
+
+    if url:
+        await _reset_database(url)
+    else:
+        url = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"
+    settings = Settings(
+        BOT_TOKEN="123456:benchmark",
+        DATABASE_URL=url,
+        ALLOWED_CHAT_IDS=None,
+        OUTBOUND_ENABLED=False,
+        METRICS_ENABLED=False,
+        _env_file=None,
+    )
+    await init_db(settings)
+
+    queries = 0
+
+    def count_query(*args: Any) -> None:
+        nonlocal queries
+        queries += 1
+
+    event.listen(get_engine(settings).sync_engine, "before_cursor_execute", count_query)
+
+    session = FakeSession(admins=(ADMIN_ID,), latency=api_latency)
+    bot = create_bot(settings, session=session)
+    dp = setup_dispatcher(bot, settings)
+    warmup, updates = build_scenario(name, count)
+    slots = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def feed(update: dict, measure: bool) -> None:
+        async with slots:
+            started = time.perf_counter()
+            await dp.feed_raw_update(bot, update)
+            if measure:
+                latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(feed(update, False) for update in warmup))
+    session.calls.clear()
+    queries = 0
+
+    started = time.perf_counter()
+    await asyncio.gather(*(feed(update, True) for update in updates))
+    elapsed = time.perf_counter() - started
+    await close_services()
+
+    latencies.sort()
+    return {
+        "updates": len(updates),
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(len(updates) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "queries_per_update": round(queries / len(updates), 3),
+        "api_calls": dict(session.calls),
+    }
+
+
+def run_scenario(name: str, count: int, concurrency: int, api_latency: float, url: Optional[str]) -> dict:
+    """Process entry point for one scenario."""
+    return asyncio.run(_run_scenario(name, count, concurrency, api_latency, url))
+
+
+def get_commit() -> str:
+    """Get the short hash of HEAD, marked dirty if the tree has changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if status else commit
+
+
+def load_baseline(compare: Optional[str], current: Path) -> Optional[dict]:
+    """Load results to compare with: a given commit or file, or else the newest other results file."""
+    if compare:
+        path = Path(compare)
+        if not path.exists():
+            path = RESULTS_DIR / f"{compare}.json"
+        if not path.exists():
+            print(f"No results for {compare}", file=sys.stderr)
+            return None
+    else:
+        candidates = [p for p in RESULTS_DIR.glob("*.json") if p != current]
+        if not candidates:
+            return None
+        path = max(candidates, key=lambda p: p.stat().st_mtime)
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """List metrics that got worse by more than ``threshold`` (a share) than in the baseline."""
+    if results["database"] != baseline.get("database") or results["updates"] != baseline.get("updates"):
+        print("Baseline used a different database or stream size, comparing anyway", file=sys.stderr)
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = previous[metric], current[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+                regressions.append(f"{name}: {metric} {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main() -> None:
+    """Run the suite, store the results and compare them with the baseline."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=3000, help="measured updates per scenario")
+    parser.add_argument(
+        "--scenario", action="append", choices=SCENARIOS, help="scenario to run (repeatable, default: all)"
+    )
+    parser.add_argument("--concurrency", type=int, default=50, help="updates in flight")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="fake Bot API latency, s")
+    parser.add_argument(
+        "--database-url", default=os.environ.get("BENCH_DATABASE_URL"), help="PostgreSQL URL (wiped before each run)"
+    )
+    parser.add_argument("--compare", help="commit or results file to compare with (default: newest other results)")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on regressions")
+    parser.add_argument("--no-save", action="store_true", help="do not write benchmarks/results/<commit>.json")
+    args = parser.parse_args()
+
+    commit = get_commit()
+    results: dict[str, Any] = {
+        "commit": commit,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": args.database_url.split("://")[0] if args.database_url else "sqlite+aiosqlite",
+        "updates": args.updates,
+        "concurrency": args.concurrency,
+        "api_latency": args.api_latency,
+        "scenarios": {},
+    }
+
+    print(f"{'scenario':<12} {'updates/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'queries/upd':>12}")
+    # A fresh process per scenario, so module-level caches and buffers start empty
+    context = multiprocessing.get_context("spawn")
+    for name in args.scenario or SCENARIOS:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(
+                run_scenario, name, args.updates, args.concurrency, args.api_latency, args.database_url
+            ).result()
+        results["scenarios"][name] = result
+        print(
+            f"{name:<12} {result['updates_per_second']:>10.1f} {result['p50_ms']:>9.2f} "
+            f"{result['p99_ms']:>9.2f} {result['queries_per_update']:>12.3f}"
+        )
+
+    path = RESULTS_DIR / f"{commit}.json"
+    baseline = load_baseline(args.compare, path)
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path.write_text(json.dumps(results, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"Results saved to {path}")
+
+    if baseline is None:
+        print("No baseline to compare with")
+        return
+    regressions = find_regressions(results, baseline, args.threshold)
+    print(f"Compared with {baseline['commit']}: {len(regressions) or 'no'} regressions")
+    for line in regressions:
+        print(f"  REGRESSION {line}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
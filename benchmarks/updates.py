@@ -0,0 +1,166 @@
+"""Raw Telegram updates for load benchmarks."""
+import gzip
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from benchmarks.karma_matcher import CHATTER, THANKS
+
+
+def make_message(
+    update_id: int,
+    chat_id: int,
+    user_id: int,
+    text: str,
+    reply_to_user: Optional[int] = None,
+) -> dict[str, Any]:
+    """Build a raw message update as Telegram posts it."""
+    now = int(time.time())
+    message: dict[str, Any] = {
+        "message_id": update_id,
+        "date": now,
+        "chat": {"id": chat_id, "type": "supergroup", "title": f"Chat {chat_id}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    if reply_to_user is not None:
+        message["reply_to_message"] = {
+            "message_id": update_id - 1,
+            "date": now,
+            "chat": message["chat"],
+            "from": {"id": reply_to_user, "is_bot": False, "first_name": f"User {reply_to_user}"},
+            "text": "…",
+        }
+    return {"update_id": update_id, "message": message}
+
+
+def make_join(update_id: int, chat_id: int, user_id: int) -> dict[str, Any]:
+    """Build a raw chat_member update for a user joining a group."""
+    user = {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+    return {
+        "update_id": update_id,
+        "chat_member": {
+            "chat": {"id": chat_id, "type": "supergroup", "title": f"Chat {chat_id}"},
+            "from": user,
+            "date": int(time.time()),
+            "old_chat_member": {"status": "left", "user": user},
+            "new_chat_member": {"status": "member", "user": user},
+        },
+    }
+
+
+def build_updates(
+    count: int,
+    chats: int = 20,
+    users: int = 500,
+    thanks_ratio: float = 0.1,
+    top_ratio: float = 0.02,
+    seed: int = 42,
+) -> list[dict[str, Any]]:
+    """
+    Build a mixed group-chat stream: chatter, thank-you replies and /top.
+
+    Chat ids are negative like real groups; user ids start at 1000.
+    """
+    rng = random.Random(seed)
+    updates = []
+    for update_id in range(1, count + 1):
+        chat_id = -1000 - rng.randrange(chats)
+        user_id = 1000 + rng.randrange(users)
+        roll = rng.random()
+        if roll < top_ratio:
+            updates.append(make_message(update_id, chat_id, user_id, "/top"))
+        elif roll < top_ratio + thanks_ratio:
+            target = 1000 + rng.randrange(users)
+            if target == user_id:
+                target = 1000 + (target - 999) % users
+            updates.append(
+                make_message(update_id, chat_id, user_id, rng.choice(THANKS), reply_to_user=target)
+            )
+        else:
+            updates.append(make_message(update_id, chat_id, user_id, rng.choice(CHATTER)))
+    return updates
+
+
+# Synthetic streams run by the benchmark suite
+SCENARIOS = ("chatter", "thanks", "top", "warn", "join_raid", "mixed")
+
+# The first user of every chat is an admin in the /warn stream
+ADMIN_ID = 1000
+
+
+def build_scenario(
+    name: str, count: int, chats: int = 20, users: int = 500, seed: int = 42
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """
+    Build a named stream as (warm-up updates, measured updates).
+
+    - ``chatter``: plain messages that match no handler but the karma check
+    - ``thanks``: thank-you replies only
+    - ``top``: /top after a warm-up of thank-you replies that fills the boards
+    - ``warn``: admins replying /warn to random users
+    - ``join_raid``: many new users joining a few chats at once, some twice
+    - ``mixed``: the default mix of ``build_updates``
+    """
+    rng = random.Random(seed)
+    if name == "chatter":
+        return [], build_updates(count, chats, users, thanks_ratio=0, top_ratio=0, seed=seed)
+    if name == "thanks":
+        return [], build_updates(count, chats, users, thanks_ratio=1, top_ratio=0, seed=seed)
+    if name == "top":
+        warmup = build_updates(count, chats, users, thanks_ratio=1, top_ratio=0, seed=seed)
+        measured = [
+            make_message(count + update_id, -1000 - rng.randrange(chats), 1000 + rng.randrange(users), "/top")
+            for update_id in range(1, count + 1)
+        ]
+        return warmup, measured
+    if name == "warn":
+        updates = []
+        for update_id in range(1, count + 1):
+            target = ADMIN_ID + 1 + rng.randrange(users - 1)
+            updates.append(
+                make_message(update_id, -1000 - rng.randrange(chats), ADMIN_ID, "/warn", reply_to_user=target)
+            )
+        return [], updates
+    if name == "join_raid":
+        raid_chats = max(1, chats // 10)
+        updates = []
+        for update_id in range(1, count + 1):
+            # One in ten joins is a user rejoining within the greeting cooldown
+            user_id = 100_000 + (rng.randrange(update_id) if rng.random() < 0.1 else update_id)
+            updates.append(make_join(update_id, -1000 - rng.randrange(raid_chats), user_id))
+        return [], updates
+    if name == "mixed":
+        return [], build_updates(count, chats, users, seed=seed)
+    raise ValueError(f"Unknown scenario {name!r}, expected one of {SCENARIOS}")
+
+
+def load_recording(path: Path) -> list[tuple[float, dict[str, Any]]]:
+    """
+    Load (receive time, update) pairs, one JSON object per line (gzip if the name ends in .gz).
+
+    Lines are either recorder output (``{"t": ..., "update": {...}}``) or bare
+    updates, which get the receive time 0.
+    """
+    opener = gzip.open if path.suffix == ".gz" else open
+    records = []
+    with opener(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if "update" in item and "update_id" not in item:
+                records.append((item.get("t", 0.0), item["update"]))
+            else:
+                records.append((0.0, item))
+    return records
+
+
+def load_updates(path: Path) -> list[dict[str, Any]]:
+    """Load recorded updates in file order."""
+    return [update for _, update in load_recording(path)]
@@ -0,0 +1,128 @@
+"""
+Load test for webhook mode: POST updates to a local webhook server.
+
+The bot runs in-process on a temporary SQLite database with a fake Bot API,
+and the client imitates Telegram by keeping ``--connections`` requests in
+flight. Reports acknowledgement latency and end-to-end throughput (until the
+last update is processed).
+
+Usage:
+    python -m benchmarks.webhook_load [--updates 5000] [--connections 40]
+        [--concurrent 100] [--api-latency 0.02] [--file recorded.jsonl.gz]
+        [--shape-outbound]
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+from app.bot.dispatcher import close_services, create_bot, setup_dispatcher
+from app.bot.webhook import create_webhook_app
+from app.core.settings import Settings
+from app.db.base import init_db
+from benchmarks.fake_api import FakeSession
+from benchmarks.updates import build_updates, load_updates
+
+SECRET = "benchmark-secret"
+
+
+def percentile(values: list[float], share: float) -> float:
+    """Get a percentile of already sorted values."""
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+async def post_updates(url: str, updates: list[dict], connections: int) -> list[float]:
+    """POST updates over ``connections`` parallel connections. Returns ack latencies."""
+    queue = iter(updates)
+    latencies: list[float] = []
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+    async def connection(client: aiohttp.ClientSession) -> None:
+        for update in queue:
+            started = time.perf_counter()
+            async with client.post(url, json=update, headers=headers) as response:
+                await response.read()
+                if response.status != 200:
+                    raise RuntimeError(f"Webhook answered {response.status}")
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=connections)
+    async with aiohttp.ClientSession(connector=connector) as client:
+        await asyncio.gather(*(connection(client) for _ in range(connections)))
+    return sorted(latencies)
+
+
+async def run(args: argparse.Namespace) -> None:
+    """Start the webhook server, run the load and print results."""
+    if args.file:
+        updates = load_updates(Path(args.file))
+    else:
+        updates = build_updates(args.updates)
+
+    workdir = tempfile.mkdtemp(prefix="webhook-bench-")
+    settings = Settings(
+        BOT_TOKEN="123456:benchmark",
+        DATABASE_URL=f"sqlite+aiosqlite:///{workdir}/bench.db",
+        ALLOWED_CHAT_IDS=None,
+        BOT_MODE="webhook",
+        WEBHOOK_SECRET=SECRET,
+        WEBHOOK_MAX_CONCURRENT_UPDATES=args.concurrent,
+        WEBHOOK_MAX_PENDING_UPDATES=args.pending,
+        OUTBOUND_ENABLED=args.shape_outbound,
+    )
+    await init_db(settings)
+
+    session = FakeSession(latency=args.api_latency)
+    bot = create_bot(settings, session=session)
+    dp = setup_dispatcher(bot, settings)
+    app, handler = create_webhook_app(bot, dp, settings)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    url = f"http://{host}:{port}{settings.WEBHOOK_PATH}"
+
+    try:
+        started = time.perf_counter()
+        latencies = await post_updates(url, updates, args.connections)
+        acked = time.perf_counter() - started
+        while handler.pending:
+            await asyncio.sleep(0.005)
+        processed = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+        await close_services()
+
+    count = len(updates)
+    print(f"updates:            {count}")
+    print(f"connections:        {args.connections}")
+    print(f"concurrent updates: {args.concurrent}")
+    print(f"ack p50 / p99, ms:  {percentile(latencies, 0.5) * 1000:.2f} / {percentile(latencies, 0.99) * 1000:.2f}")
+    print(f"acks/s:             {count / acked:.0f}")
+    print(f"processed/s:        {count / processed:.0f}")
+    print(f"Bot API calls:      {dict(session.calls)}")
+
+
+def main() -> None:
+    """Parse arguments and run the load test."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=5000, help="synthetic updates to send")
+    parser.add_argument("--file", help="recorded updates, JSON lines (optionally .gz)")
+    parser.add_argument("--connections", type=int, default=40, help="parallel client connections")
+    parser.add_argument("--concurrent", type=int, default=100, help="WEBHOOK_MAX_CONCURRENT_UPDATES")
+    parser.add_argument("--pending", type=int, default=1000, help="WEBHOOK_MAX_PENDING_UPDATES")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="fake Bot API latency, s")
+    parser.add_argument(
+        "--shape-outbound", action="store_true", help="pace replies to Telegram rate limits (slow by design)"
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Shared fixtures."""
+import asyncio
+from collections.abc import Awaitable, Callable
+
+import pytest
+
+from app.core.settings import Settings
+from app.db import base, session
+from app.services import karma_buffer, leaderboard
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch) -> Settings:
+    """Settings with a fresh SQLite database and no process-wide state left from other tests."""
+    for module, name in [
+        (base, "_engine"),
+        (session, "_session_maker"),
+        (leaderboard, "_leaderboards"),
+        (leaderboard, "_window_leaderboards"),
+        (karma_buffer, "_karma_buffer"),
+    ]:
+        monkeypatch.setattr(module, name, None)
+    return Settings(BOT_TOKEN="1:test", DATABASE_URL=f"sqlite+aiosqlite:///{tmp_path}/test.db", _env_file=None)
+
+
+@pytest.fixture
+def run_db(settings) -> Callable[[Callable[[], Awaitable[None]]], None]:
+    """Run an async test against the migrated database, in one event loop."""
+    def run(test: Callable[[], Awaitable[None]]) -> None:
+        async def main() -> None:
+            await base.init_db(settings)
+            try:
+                await test()
+            finally:
+                await base.dispose_engine()
+
+        asyncio.run(main())
+
+    return run
@@ -0,0 +1,87 @@
+"""Tests for the per-update database session."""
+import pytest
+from sqlalchemy import event
+
+from app.bot.middlewares import DbSessionMiddleware
+from app.db.base import get_engine
+from app.services.karma_service import KarmaService
+from app.services.warn_service import WarnService
+
+CHAT = -100
+
+
+async def count_commits(settings, handler) -> int:
+    """Run a handler as one update through DbSessionMiddleware and count database commits."""
+    commits = []
+
+    def on_commit(conn):
+        commits.append(conn)
+
+    engine = get_engine(settings).sync_engine
+    event.listen(engine, "commit", on_commit)
+    try:
+        await DbSessionMiddleware(settings)(handler, object(), {})
+    finally:
+        event.remove(engine, "commit", on_commit)
+    return len(commits)
+
+
+def test_handler_that_commits_before_calling_telegram_commits_once(settings, run_db):
+    async def test():
+        warn_service = WarnService(settings)
+
+        async def cmd_warn(event, data):
+            session = data["session"]
+            await warn_service.add_warning(session, 1, CHAT, 99)
+            await session.commit()
+            # Stands in for the mute and the reply, which read the new count
+            assert await warn_service.get_warn_count(session, 1, CHAT) == 1
+
+        assert await count_commits(settings, cmd_warn) == 1
+
+        karma_service = KarmaService(settings)
+
+        async def handle_karma_message(event, data):
+            session = data["session"]
+            await karma_service.add_karma(session, 2, 1, CHAT)
+            await session.commit()
+
+        assert await count_commits(settings, handle_karma_message) == 1
+
+    run_db(test)
+
+
+def test_writes_are_committed_once_by_the_middleware(settings, run_db):
+    async def test():
+        warn_service = WarnService(settings)
+
+        async def write(event, data):
+            await warn_service.add_warning(data["session"], 1, CHAT, 99)
+            await warn_service.add_warning(data["session"], 2, CHAT, 99)
+
+        async def read(event, data):
+            assert await warn_service.get_warn_count(data["session"], 1, CHAT) == 1
+
+        assert await count_commits(settings, write) == 1
+        assert await count_commits(settings, read) == 0
+
+    run_db(test)
+
+
+def test_failed_handler_commits_nothing(settings, run_db):
+    async def test():
+        warn_service = WarnService(settings)
+
+        async def fail(event, data):
+            await warn_service.add_warning(data["session"], 1, CHAT, 99)
+            raise RuntimeError("Telegram is down")
+
+        with pytest.raises(RuntimeError):
+            await count_commits(settings, fail)
+
+        async def read(event, data):
+            assert await warn_service.get_warn_count(data["session"], 1, CHAT) == 0
+
+        assert await count_commits(settings, read) == 0
+
+    run_db(test)
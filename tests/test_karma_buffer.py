@@ -0,0 +1,125 @@
+"""Tests for the karma write-behind buffer."""
+import pytest
+from sqlalchemy import event, func, select
+
+from app.db import base
+from app.db.models import Karma, KarmaTransaction
+from app.db.session import get_db_session
+from app.services.karma_buffer import get_karma_buffer
+from app.services.karma_service import KarmaService
+
+CHAT = -100
+
+
+@pytest.fixture
+def settings(settings):
+    settings.KARMA_WRITE_BEHIND = True
+    # Flushes are triggered by the tests only
+    settings.KARMA_FLUSH_INTERVAL_SECONDS = 3600
+    settings.KARMA_FLUSH_MAX_PENDING = 10_000
+    return settings
+
+
+async def stored(settings) -> tuple[dict[int, int], int]:
+    """Get committed karma as {user_id: karma} and the number of transactions."""
+    async with get_db_session(settings) as session:
+        karma = dict((await session.execute(select(Karma.user_id, Karma.karma).where(Karma.chat_id == CHAT))).all())
+        transactions = await session.scalar(select(func.count()).select_from(KarmaTransaction))
+    return karma, transactions
+
+
+def test_deltas_are_coalesced_into_one_row(settings, run_db):
+    async def test():
+        buffer = get_karma_buffer(settings)
+        for _ in range(3):
+            buffer.add(1, 2, CHAT)
+        buffer.add(1, 3, CHAT)
+        await buffer.flush()
+        assert await stored(settings) == ({2: 3, 3: 1}, 4)
+
+        buffer.add(3, 2, CHAT)
+        await buffer.close()
+        assert await stored(settings) == ({2: 4, 3: 1}, 5)
+
+    run_db(test)
+
+
+def test_failed_flush_puts_deltas_back(settings, run_db):
+    async def test():
+        buffer = get_karma_buffer(settings)
+        for _ in range(3):
+            buffer.add(1, 2, CHAT)
+
+        write = buffer._write
+
+        async def fail(session, batch):
+            await write(session, batch)
+            raise RuntimeError("database is gone")
+
+        buffer._write = fail
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+        assert buffer.pending_karma(CHAT, 2) == 3
+        assert await stored(settings) == ({}, 0)
+
+        # Newer karma is kept and the restored batch is written exactly once
+        del buffer._write
+        buffer.add(1, 2, CHAT)
+        assert buffer.pending_for_chat(CHAT) == {2: 4}
+        await buffer.close()
+        assert buffer.pending_for_chat(CHAT) == {}
+        assert await stored(settings) == ({2: 4}, 4)
+
+    run_db(test)
+
+
+def test_unflushed_karma_is_visible(settings, run_db):
+    async def test():
+        service = KarmaService(settings)
+        async with get_db_session(settings) as session:
+            for _ in range(2):
+                await service.add_karma(session, 1, 2, CHAT)
+            await service.add_karma(session, 1, 3, CHAT)
+        await service.buffer.flush()
+
+        async with get_db_session(settings) as session:
+            # Warm the leaderboard, then buffer karma that overtakes user 2
+            assert await service.get_top_karma(session, CHAT) == [(2, 2), (3, 1)]
+            for _ in range(2):
+                await service.add_karma(session, 1, 3, CHAT)
+            await service.add_karma(session, 1, 4, CHAT)
+
+            assert service.buffer.pending_for_chat(CHAT) == {3: 2, 4: 1}
+            assert await service.get_karma(session, 3, CHAT) == 3
+            assert await service.get_top_karma(session, CHAT) == [(3, 3), (2, 2), (4, 1)]
+            assert await service.get_top_karma(session, CHAT, window="week") == [(3, 3), (2, 2), (4, 1)]
+
+        await service.buffer.close()
+        async with get_db_session(settings) as session:
+            assert await service.get_top_karma(session, CHAT) == [(3, 3), (2, 2), (4, 1)]
+
+    run_db(test)
+
+
+def test_large_flush_is_split_into_chunks(settings, run_db, monkeypatch):
+    # Three columns per karma row: ten rows per statement
+    monkeypatch.setitem(base.MAX_BOUND_PARAMETERS, "sqlite", 30)
+    upserts = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO karma "):
+            upserts.append(len(parameters))
+
+    async def test():
+        event.listen(base.get_engine(settings).sync_engine, "before_cursor_execute", count)
+        buffer = get_karma_buffer(settings)
+        for user_id in range(25):
+            buffer.add(1000, user_id, CHAT)
+        buffer.add(1000, 0, CHAT)
+        await buffer.close()
+        assert upserts == [30, 30, 15]
+        karma, transactions = await stored(settings)
+        assert karma == {0: 2, **{user_id: 1 for user_id in range(1, 25)}}
+        assert transactions == 26
+
+    run_db(test)
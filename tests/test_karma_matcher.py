@@ -0,0 +1,45 @@
+"""Tests for the karma keyword matcher."""
+import pytest
+
+from app.handlers.karma import compile_keyword_pattern, has_karma_keyword
+
+
+@pytest.mark.parametrize("text", ["thankless job", "спасибовать", "unthanked", "respectful", "thx2", "молодецкий"])
+def test_words_containing_a_keyword_do_not_match(text):
+    assert not has_karma_keyword(text)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Спасибо, большое!",
+        "thank you!",
+        "(thank you very much)",
+        "ну, респект и уважуха.",
+        "большое...спасибо",
+        "ok—thanks",
+    ],
+)
+def test_phrases_match_next_to_punctuation(text):
+    assert has_karma_keyword(text)
+
+
+@pytest.mark.parametrize("text", ["СПАСИБО", "Thanks", "THANK YOU", "Дякую"])
+def test_matching_ignores_case(text):
+    assert has_karma_keyword(text)
+
+
+def test_regex_metacharacters_are_escaped():
+    pattern = compile_keyword_pattern(["a.b", "c++", "(ok)", "спс!"])
+    assert pattern.search("a.b")
+    assert not pattern.search("axb")
+    assert pattern.search("I like c++")
+    assert pattern.search("say (ok)")
+    assert not pattern.search("ok")
+    assert pattern.search("спс!")
+    assert not pattern.search("спс")
+
+
+def test_longest_phrase_wins():
+    match = compile_keyword_pattern(["спасибо", "спасибо большое"]).search("спасибо большое")
+    assert match.group() == "спасибо большое"
@@ -0,0 +1,87 @@
+"""Tests for the in-memory sliding-window leaderboards."""
+import random
+
+from app.services.leaderboard import WINDOW_HOURS, ChatWindowCounts, WindowLeaderboardCache
+
+NOW = 500_000  # Hours since the epoch
+WEEK = WINDOW_HOURS["week"]
+MONTH = WINDOW_HOURS["month"]
+
+
+def brute_force(events: list[tuple[int, int]], hour: int, hours: int) -> dict[int, int]:
+    """Count (user_id, hour) events within the ``hours`` ending at ``hour``."""
+    totals: dict[int, int] = {}
+    for user_id, event_hour in events:
+        if hour - hours < event_hour <= hour:
+            totals[user_id] = totals.get(user_id, 0) + 1
+    return totals
+
+
+def test_rows_outside_the_windows_are_ignored():
+    rows = [(1, NOW), (1, NOW - WEEK + 1), (2, NOW - WEEK), (3, NOW - MONTH + 1), (4, NOW - MONTH), (5, NOW - 10_000)]
+    counts = ChatWindowCounts(WINDOW_HOURS, NOW, rows)
+    assert counts.totals["week"] == {1: 2}
+    assert counts.totals["month"] == {1: 2, 2: 1, 3: 1}
+    assert counts.top("month", 1) == [(1, 2)]
+
+    # Late karma older than the longest window changes nothing
+    counts.add(6, NOW - MONTH)
+    assert counts.get("month", 6) == 0
+
+
+def test_ring_wraps_around():
+    counts = ChatWindowCounts({"short": 2, "long": 3}, 10, [])
+    for hour in range(10, 20):
+        counts.add(hour, hour)
+        assert counts.totals["short"] == {hour - 1: 1, hour: 1} if hour > 10 else {10: 1}
+        assert counts.totals["long"] == {user: 1 for user in range(max(10, hour - 2), hour + 1)}
+
+
+def test_jump_longer_than_a_week_but_shorter_than_a_month():
+    counts = ChatWindowCounts(WINDOW_HOURS, NOW, [(1, NOW), (2, NOW - 5), (2, NOW - 100)])
+    counts.advance(NOW + WEEK + 5)
+    assert counts.totals["week"] == {}
+    assert counts.totals["month"] == {1: 1, 2: 2}
+
+    counts.add(3, NOW + WEEK + 5)
+    assert counts.top("week", 10) == [(3, 1)]
+
+    # A jump past the month empties everything
+    counts.advance(NOW + WEEK + 5 + MONTH)
+    assert counts.totals == {"week": {}, "month": {}}
+
+
+def test_matches_brute_force_over_random_events():
+    rng = random.Random(7)
+    events: list[tuple[int, int]] = []
+    hour = NOW
+    counts = ChatWindowCounts(WINDOW_HOURS, hour, [])
+    for _ in range(3000):
+        hour += rng.choice([0, 0, 0, 1, 5, 50, 200, 800])
+        event_hour = hour - rng.choice([0, 0, 1, 3, WEEK, MONTH - 1, MONTH])
+        user_id = rng.randrange(20)
+        events.append((user_id, event_hour))
+        counts.advance(hour)
+        counts.add(user_id, event_hour)
+        for name, hours in WINDOW_HOURS.items():
+            assert counts.totals[name] == brute_force(events, hour, hours)
+
+
+def test_loads_overlapping_a_write_are_not_cached():
+    cache = WindowLeaderboardCache(max_chats=10, idle_seconds=3600)
+
+    # Load started before the write and finished while it is in progress
+    token = cache.begin_load(1)
+    cache.begin_write([1])
+    cache.finish_load(1, token, [])
+    assert cache.get(1) is None
+
+    # Load started during the write and finished after it was applied
+    token = cache.begin_load(1)
+    cache.end_write([1])
+    cache.finish_load(1, token, [])
+    assert cache.get(1) is None
+
+    token = cache.begin_load(1)
+    cache.finish_load(1, token, [])
+    assert cache.get(1) is not None
@@ -0,0 +1,42 @@
+"""Tests for log rate limiting."""
+import logging
+import time
+
+from app.core.logging import RateLimitFilter
+
+
+def record(msg: str, *args, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.makeLogRecord({"name": "app.test", "levelno": level, "msg": msg, "args": args})
+
+
+def test_repeated_messages_are_limited_and_suppressed_ones_counted():
+    log_filter = RateLimitFilter(limit=3, interval=0.05)
+    passed = [log_filter.filter(record("Update %s dropped", update_id)) for update_id in range(10)]
+    assert passed == [True] * 3 + [False] * 7
+
+    # Other templates have their own budget
+    assert log_filter.filter(record("Chat %s filtered", 1))
+
+    time.sleep(0.06)
+    summary = record("Update %s dropped", 11)
+    assert log_filter.filter(summary)
+    assert summary.getMessage() == "Update 11 dropped (7 similar messages suppressed)"
+    follow_up = record("Update %s dropped", 12)
+    assert log_filter.filter(follow_up)
+    assert follow_up.getMessage() == "Update 12 dropped"
+
+
+def test_warnings_and_errors_are_never_limited():
+    log_filter = RateLimitFilter(limit=1, interval=60)
+    for level in (logging.WARNING, logging.ERROR, logging.CRITICAL):
+        assert all(log_filter.filter(record("Flush failed: %s", i, level=level)) for i in range(50))
+    assert log_filter.filter(record("Update %s dropped", 1, level=logging.DEBUG))
+    assert not log_filter.filter(record("Update %s dropped", 2, level=logging.DEBUG))
+
+
+def test_exempt_level_is_configurable():
+    log_filter = RateLimitFilter(limit=1, interval=60, exempt_level=logging.ERROR)
+    assert log_filter.filter(record("Slow update %s", 1, level=logging.WARNING))
+    assert not log_filter.filter(record("Slow update %s", 2, level=logging.WARNING))
+    assert log_filter.filter(record("Crash %s", 1, level=logging.ERROR))
+    assert log_filter.filter(record("Crash %s", 2, level=logging.ERROR))
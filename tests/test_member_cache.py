@@ -0,0 +1,124 @@
+"""Tests for the chat member cache."""
+import asyncio
+
+import pytest
+
+from app.services.member_cache import ChatMemberCache
+
+CHAT = -100
+
+
+class FakeBot:
+    """Answers get_chat_member with a new object per call, once ``release`` is set."""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[int, int]] = []
+        self.release = asyncio.Event()
+        self.release.set()
+        self.error: Exception | None = None
+
+    async def get_chat_member(self, chat_id: int, user_id: int):
+        self.calls.append((chat_id, user_id))
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return {"user_id": user_id, "call": len(self.calls)}
+
+
+def test_entries_expire_after_ttl():
+    async def test():
+        cache = ChatMemberCache(ttl=0.05, max_size=10)
+        bot = FakeBot()
+        first = await cache.get(bot, CHAT, 1)
+        assert await cache.get(bot, CHAT, 1) is first
+        await asyncio.sleep(0.06)
+        assert await cache.get(bot, CHAT, 1) is not first
+        assert len(bot.calls) == 2
+        assert cache.stats() == {"hits": 1, "misses": 2, "collapsed": 0, "size": 1}
+
+    asyncio.run(test())
+
+
+def test_least_recently_used_entries_are_evicted():
+    async def test():
+        cache = ChatMemberCache(ttl=60, max_size=2)
+        bot = FakeBot()
+        await cache.get(bot, CHAT, 1)
+        await cache.get(bot, CHAT, 2)
+        await cache.get(bot, CHAT, 1)
+        await cache.get(bot, CHAT, 3)
+        assert cache.stats()["size"] == 2
+
+        # User 2 was used least recently
+        await cache.get(bot, CHAT, 1)
+        await cache.get(bot, CHAT, 2)
+        assert bot.calls == [(CHAT, 1), (CHAT, 2), (CHAT, 3), (CHAT, 2)]
+
+    asyncio.run(test())
+
+
+def test_concurrent_lookups_share_one_request():
+    async def test():
+        cache = ChatMemberCache(ttl=60, max_size=10)
+        bot = FakeBot()
+        bot.release.clear()
+        lookups = [asyncio.create_task(cache.get(bot, CHAT, 1)) for _ in range(5)]
+        await asyncio.sleep(0)
+        bot.release.set()
+        members = await asyncio.gather(*lookups)
+        assert len(bot.calls) == 1
+        assert all(member is members[0] for member in members)
+        assert cache.stats()["collapsed"] == 4
+
+    asyncio.run(test())
+
+
+def test_cancelled_lookup_does_not_cancel_the_others():
+    async def test():
+        cache = ChatMemberCache(ttl=60, max_size=10)
+        bot = FakeBot()
+        bot.release.clear()
+        first = asyncio.create_task(cache.get(bot, CHAT, 1))
+        second = asyncio.create_task(cache.get(bot, CHAT, 1))
+        await asyncio.sleep(0)
+        first.cancel()
+        bot.release.set()
+        assert (await second)["call"] == 1
+        assert len(bot.calls) == 1
+
+    asyncio.run(test())
+
+
+def test_failed_lookups_are_not_cached():
+    async def test():
+        cache = ChatMemberCache(ttl=60, max_size=10)
+        bot = FakeBot()
+        bot.error = RuntimeError("Bad Request: user not found")
+        with pytest.raises(RuntimeError):
+            await cache.get(bot, CHAT, 1)
+        bot.error = None
+        await cache.get(bot, CHAT, 1)
+        assert len(bot.calls) == 2
+
+    asyncio.run(test())
+
+
+def test_invalidate_during_lookup_keeps_the_stale_result_out():
+    async def test():
+        cache = ChatMemberCache(ttl=60, max_size=10)
+        bot = FakeBot()
+        bot.release.clear()
+        lookup = asyncio.create_task(cache.get(bot, CHAT, 1))
+        await asyncio.sleep(0)
+        # The member was promoted while we were asking about them
+        cache.invalidate(CHAT, 1)
+        bot.release.set()
+        stale = await lookup
+        assert cache.stats()["size"] == 0
+
+        fresh = await cache.get(bot, CHAT, 1)
+        assert fresh is not stale
+        assert await cache.get(bot, CHAT, 1) is fresh
+        assert len(bot.calls) == 2
+
+    asyncio.run(test())
@@ -0,0 +1,181 @@
+"""Tests for the outbound request scheduler."""
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetMe, SendChatAction, SendMessage
+
+from app.bot.outbound import OutboundScheduler, Priority, outbound_priority
+
+GROUP = -100
+OTHER_GROUP = -200
+
+
+def make_scheduler(**limits) -> OutboundScheduler:
+    """Create a scheduler with generous limits unless overridden."""
+    params = {
+        "global_per_second": 1000,
+        "group_per_minute": 600,
+        "group_burst": 1,
+        "private_per_second": 1000,
+        "max_retries": 2,
+    }
+    params.update(limits)
+    return OutboundScheduler(**params)
+
+
+class FakeBot:
+    """Stands in for the bot session: every request goes through the scheduler."""
+
+    def __init__(self, scheduler: OutboundScheduler, fail: int = 0, retry_after: int = 1) -> None:
+        self.scheduler = scheduler
+        self.fail = fail
+        self.retry_after = retry_after
+        self.sent: list[tuple[float, object]] = []
+        self.calls = 0
+
+    async def make_request(self, bot, method):
+        self.calls += 1
+        if self.fail:
+            self.fail -= 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=self.retry_after)
+        self.sent.append((time.monotonic(), method))
+        return True
+
+    async def __call__(self, method):
+        return await self.scheduler(self.make_request, self, method)
+
+
+def message(chat_id, text: str = "hi") -> SendMessage:
+    return SendMessage(chat_id=chat_id, text=text)
+
+
+def test_high_priority_goes_first():
+    async def test():
+        scheduler = make_scheduler()
+        bot = FakeBot(scheduler)
+        # Use up the chat's only token so the next requests have to queue
+        await bot(message(GROUP, "first"))
+
+        async def send(text, priority):
+            outbound_priority.set(priority)
+            await bot(message(GROUP, text))
+
+        low = asyncio.create_task(send("low", Priority.LOW))
+        await asyncio.sleep(0)
+        high = asyncio.create_task(send("high", Priority.HIGH))
+        await asyncio.gather(low, high)
+        assert [method.text for _, method in bot.sent] == ["first", "high", "low"]
+        assert scheduler.stats()["sent"] == 3
+        await scheduler.close()
+
+    asyncio.run(test())
+
+
+def test_chat_limit_paces_the_chat_but_not_other_chats():
+    async def test():
+        # 10 messages per second per group, bursts of 2
+        scheduler = make_scheduler(group_burst=2)
+        bot = FakeBot(scheduler)
+        started = time.monotonic()
+        busy = asyncio.gather(*(bot(message(GROUP, str(i))) for i in range(5)))
+        await asyncio.sleep(0.01)
+        await bot(message(OTHER_GROUP))
+        assert time.monotonic() - started < 0.1
+        await busy
+
+        times = [at - started for at, method in bot.sent if method.chat_id == GROUP]
+        assert times[1] < 0.05
+        assert times[4] >= 0.28
+        assert all(later - earlier >= 0.08 for earlier, later in zip(times[1:], times[2:]))
+        await scheduler.close()
+
+    asyncio.run(test())
+
+
+def test_global_limit_applies_across_chats():
+    async def test():
+        scheduler = make_scheduler(global_per_second=10)
+        bot = FakeBot(scheduler)
+        started = time.monotonic()
+        await asyncio.gather(*(bot(message(user_id)) for user_id in range(1, 16)))
+        # A burst of 10, then 10 per second
+        assert time.monotonic() - started >= 0.45
+        await scheduler.close()
+
+    asyncio.run(test())
+
+
+def test_requests_that_post_nothing_are_not_paced():
+    async def test():
+        scheduler = make_scheduler(group_per_minute=1)
+        bot = FakeBot(scheduler)
+        await bot(message(GROUP))
+        started = time.monotonic()
+        await bot(SendChatAction(chat_id=GROUP, action="typing"))
+        await bot(GetMe())
+        assert time.monotonic() - started < 0.05
+        assert scheduler.pending == 0
+        await scheduler.close()
+
+    asyncio.run(test())
+
+
+def test_retry_after_pauses_the_chat_and_retries():
+    async def test():
+        scheduler = make_scheduler(group_burst=5)
+        bot = FakeBot(scheduler, fail=1, retry_after=1)
+        started = time.monotonic()
+        assert await bot(message(GROUP)) is True
+        assert time.monotonic() - started >= 0.95
+        assert bot.calls == 2
+        assert scheduler.retried == 1
+        assert scheduler.failed == 0
+        await scheduler.close()
+
+    asyncio.run(test())
+
+
+def test_retry_after_gives_up_after_max_retries():
+    async def test():
+        scheduler = make_scheduler(max_retries=0)
+        bot = FakeBot(scheduler, fail=1)
+        with pytest.raises(TelegramRetryAfter):
+            await bot(message(GROUP))
+        assert scheduler.failed == 1
+        assert scheduler.retried == 0
+        await scheduler.close()
+
+    asyncio.run(test())
+
+
+def test_drain_sends_queued_requests():
+    async def test():
+        scheduler = make_scheduler()
+        bot = FakeBot(scheduler)
+        for i in range(4):
+            scheduler.send_later(bot, message(GROUP, str(i)))
+        # The first one goes at once, then one every 0.1 seconds
+        assert scheduler.pending == 4
+        assert not await scheduler.drain(timeout=0.05)
+        assert await scheduler.drain(timeout=2)
+        assert scheduler.pending == 0
+        assert [method.text for _, method in bot.sent] == ["0", "1", "2", "3"]
+        await scheduler.close()
+
+    asyncio.run(test())
+
+
+def test_close_cancels_what_was_not_drained():
+    async def test():
+        scheduler = make_scheduler(group_per_minute=1)
+        bot = FakeBot(scheduler)
+        for i in range(3):
+            scheduler.send_later(bot, message(GROUP, str(i)))
+        assert not await scheduler.drain(timeout=0.1)
+        await scheduler.close()
+        assert [method.text for _, method in bot.sent] == ["0"]
+        assert scheduler.stats()["queued"] == 2
+
+    asyncio.run(test())
@@ -0,0 +1,92 @@
+"""Tests for the update scrubber."""
+import json
+
+from aiogram.types import Update
+
+from app.bot.recorder import UpdateScrubber
+
+USER = {"id": 1001, "is_bot": False, "first_name": "Ivan", "last_name": "Petrov", "username": "ivanp"}
+ADMIN = {"id": 1002, "is_bot": False, "first_name": "Olga"}
+GROUP = {"id": -100123, "type": "supergroup", "title": "Secret club"}
+PERSONAL = ["Ivan", "Petrov", "ivanp", "Olga", "Secret club", "+79990001122", "Anna", "Smirnova", "Boris", "Ksenia"]
+
+
+def scrub(update: dict) -> dict:
+    """Scrub an update and check that it still parses."""
+    scrubbed = UpdateScrubber(b"salt").scrub(update)
+    Update.model_validate(scrubbed)
+    return scrubbed
+
+
+def assert_no_personal_data(scrubbed: dict) -> None:
+    """Check that none of the personal strings made it through."""
+    dumped = json.dumps(scrubbed, ensure_ascii=False)
+    for value in PERSONAL:
+        assert value not in dumped
+
+
+def test_chat_member_joined_by_invite_link():
+    update = {
+        "update_id": 1,
+        "chat_member": {
+            "chat": GROUP,
+            "from": USER,
+            "date": 1700000000,
+            "old_chat_member": {"status": "left", "user": USER},
+            "new_chat_member": {"status": "member", "user": USER},
+            "invite_link": {
+                "invite_link": "https://t.me/+AbCdEf",
+                "creator": ADMIN,
+                "creates_join_request": False,
+                "is_primary": False,
+                "is_revoked": False,
+                "name": "Link for Boris",
+            },
+        },
+    }
+    scrubbed = scrub(update)
+    link = scrubbed["chat_member"]["invite_link"]
+    assert link["invite_link"] == ""
+    assert link["name"] == "x" * len("Link for Boris")
+    assert link["creator"]["id"] != ADMIN["id"]
+    assert "AbCdEf" not in json.dumps(scrubbed)
+    assert_no_personal_data(scrubbed)
+
+
+def test_forwarded_message_and_contact():
+    update = {
+        "update_id": 2,
+        "message": {
+            "message_id": 10,
+            "date": 1700000000,
+            "chat": GROUP,
+            "from": USER,
+            "forward_sender_name": "Anna Smirnova",
+            "forward_origin": {"type": "hidden_user", "date": 1690000000, "sender_user_name": "Anna Smirnova"},
+            "author_signature": "Ksenia",
+            "contact": {"phone_number": "+79990001122", "first_name": "Boris", "last_name": "Smirnova", "user_id": 5},
+        },
+    }
+    scrubbed = scrub(update)
+    message = scrubbed["message"]
+    assert message["forward_sender_name"] == "x" * len("Anna Smirnova")
+    assert message["contact"]["user_id"] != 5
+    assert message["chat"]["id"] < 0
+    assert_no_personal_data(scrubbed)
+
+
+def test_pseudonyms_are_stable_and_keep_commands():
+    scrubber = UpdateScrubber(b"salt")
+    message = {
+        "message_id": 11,
+        "date": 1700000000,
+        "chat": GROUP,
+        "from": USER,
+        "text": "/warn 3 spam",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+    }
+    first = scrubber.scrub({"update_id": 3, "message": message})
+    second = scrubber.scrub({"update_id": 4, "message": message})
+    assert first["message"]["from"]["id"] == second["message"]["from"]["id"] != USER["id"]
+    assert first["message"]["text"] == "/warn 3 xxxx"
+    Update.model_validate(first)
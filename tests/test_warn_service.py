@@ -0,0 +1,73 @@
+"""Tests for warning counters."""
+from sqlalchemy import delete, func, select, update
+
+from app.db.models import WarnCounter, Warning
+from app.db.session import get_db_session
+from app.services.warn_service import WarnService
+
+CHAT = -100
+OTHER_CHAT = -200
+
+
+async def counters_match(session) -> bool:
+    """Check that every counter equals the number of warning rows it counts."""
+    rows = await session.execute(
+        select(Warning.chat_id, Warning.user_id, func.count()).group_by(Warning.chat_id, Warning.user_id)
+    )
+    expected = {(chat_id, user_id): count for chat_id, user_id, count in rows}
+    counters = await session.execute(select(WarnCounter.chat_id, WarnCounter.user_id, WarnCounter.count))
+    actual = {(chat_id, user_id): count for chat_id, user_id, count in counters if count}
+    return actual == expected
+
+
+def test_warn_and_unwarn_keep_counters_exact(settings, run_db):
+    async def test():
+        service = WarnService(settings)
+        async with get_db_session(settings) as session:
+            # Nothing to remove: the counter must not go below zero
+            assert await service.remove_warning(session, 1, CHAT) == 0
+            assert await counters_match(session)
+
+            assert [await service.add_warning(session, 1, CHAT, 99, "spam") for _ in range(3)] == [1, 2, 3]
+            assert await service.add_warning(session, 2, CHAT, 99) == 1
+            assert await service.add_warning(session, 1, OTHER_CHAT, 99) == 1
+            assert await counters_match(session)
+
+        async with get_db_session(settings) as session:
+            assert [await service.remove_warning(session, 1, CHAT) for _ in range(4)] == [2, 1, 0, 0]
+            assert await service.get_warn_count(session, 1, CHAT) == 0
+            assert await service.get_warn_count(session, 1, OTHER_CHAT) == 1
+            assert await counters_match(session)
+
+            assert await service.add_warning(session, 1, CHAT, 99) == 1
+            assert await counters_match(session)
+
+    run_db(test)
+
+
+def test_rebuild_restores_counters(settings, run_db):
+    async def test():
+        service = WarnService(settings)
+        async with get_db_session(settings) as session:
+            for user_id, chat_id in [(1, CHAT), (1, CHAT), (2, CHAT), (1, OTHER_CHAT), (3, OTHER_CHAT)]:
+                await service.add_warning(session, user_id, chat_id, 99)
+
+        async with get_db_session(settings) as session:
+            await session.execute(update(WarnCounter).values(count=7))
+            await session.execute(delete(WarnCounter).where(WarnCounter.user_id == 2))
+            assert not await counters_match(session)
+
+            assert await service.rebuild_counters(session, CHAT) == 2
+            assert await service.get_warn_count(session, 1, CHAT) == 2
+            assert await service.get_warn_count(session, 2, CHAT) == 1
+            # Other chats are left alone
+            assert await service.get_warn_count(session, 1, OTHER_CHAT) == 7
+
+            assert await service.rebuild_counters(session) == 4
+            assert await counters_match(session)
+
+            assert await service.remove_warning(session, 3, OTHER_CHAT) == 0
+            assert await service.add_warning(session, 2, CHAT, 99) == 2
+            assert await counters_match(session)
+
+    run_db(test)